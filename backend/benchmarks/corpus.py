@@ -0,0 +1,261 @@
+"""Synthetic corpus generators for the pipeline benchmarks
+
+Run from the backend directory to write a corpus to disk:
+
+    python -m benchmarks.corpus --emails 10k --rows 100k --out /tmp/carma-corpus
+
+Everything is derived from data/demo_emails.json and is deterministic for a
+given seed, so runs on different machines measure the same inputs:
+
+- scaled_demo_emails: demo_emails.json with each project's emails repeated
+  and varied up to the requested total (for /api/data/emails and summarize)
+- synthetic_messages: Gmail-style messages in reply chains, spread over
+  CORPUS_DAYS days, as cleaned emails (emails_cleaned.json) or as Gmail API
+  message resources with HTML bodies (for the fake Gmail service)
+- write_procurement_workbook: a procurement log .xlsx with the requested
+  number of rows spread over vendors
+"""
+from benchmarks.html_clean import TEMPLATES
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+import argparse
+import base64
+import html
+import json
+import random
+
+DEMO_FILE = Path(__file__).parent.parent / "data" / "demo_emails.json"
+
+# Synthetic mail starts on this day and covers CORPUS_DAYS days
+CORPUS_START = datetime(2025, 9, 1, tzinfo=timezone.utc)
+CORPUS_DAYS = 84
+
+CATEGORIES = ["RFI", "Material Delay", "Schedule Update", "General", "Submittal", "Coordination"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+VENDOR_WORDS = ["Steel", "Concrete", "Glass", "Electric", "Mechanical", "Roofing", "Drywall", "Plumbing",
+                "Masonry", "Elevator", "Fire Protection", "Landscaping", "Paving", "HVAC", "Millwork"]
+VENDOR_SUFFIXES = ["Co", "Supply", "Works", "Partners", "Group", "Inc", "Fabricators", "Systems"]
+ITEMS = ["W12x26 beams", "Rebar #5", "Curtain wall panels", "Switchgear", "Air handling unit", "TPO membrane",
+         "Gypsum board", "Copper pipe", "CMU block", "Traction elevator", "Sprinkler heads", "Pavers"]
+STATUSES = ["Delivered", "Partially Delivered", "In Transit", "Backordered", "Not Ordered"]
+SUBMITTAL_STATUSES = ["Approved", "Approved as Noted", "Revise and Resubmit", "Pending", ""]
+
+
+def parse_size(value: str) -> int:
+    """'1k' -> 1000, '100k' -> 100000, '2m' -> 2000000, '250' -> 250"""
+    value = value.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    return int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+
+
+def format_size(count: int) -> str:
+    """Inverse of parse_size for round numbers"""
+    for suffix, multiplier in (("m", 1_000_000), ("k", 1_000)):
+        if count >= multiplier and count % multiplier == 0:
+            return f"{count // multiplier}{suffix}"
+    return str(count)
+
+
+def load_demo() -> dict:
+    return json.loads(DEMO_FILE.read_text(encoding="utf-8"))
+
+
+def scaled_demo_emails(count: int, seed: int = 0) -> dict:
+    """demo_emails.json scaled to `count` emails, spread evenly over its projects"""
+    rng = random.Random(seed)
+    demo = load_demo()
+    projects = [{**{k: v for k, v in p.items() if k != "emails"}, "emails": []} for p in demo["projects"]]
+    bodies = [e["body"] for p in demo["projects"] for e in p["emails"]]
+    for i in range(count):
+        project = projects[i % len(projects)]
+        source = demo["projects"][i % len(projects)]["emails"]
+        template = source[(i // len(projects)) % len(source)]
+        due = datetime.fromisoformat(template.get("due_date") or "2025-11-01") + timedelta(days=rng.randint(-20, 40))
+        project["emails"].append({
+            **template,
+            "id": f"{template['id']}-{i:06d}",
+            "subject": f"{'Re: ' if rng.random() < 0.3 else ''}{template['subject']} #{i}",
+            # The template body plus a sentence from another email, so bodies are not all identical
+            "body": f"{template['body']} {rng.choice(bodies).split('. ')[0]}.",
+            "priority": rng.choice(PRIORITIES),
+            "due_date": due.date().isoformat(),
+            "category": rng.choice(CATEGORIES)
+        })
+    return {"projects": projects}
+
+
+def synthetic_messages(count: int, seed: int = 0) -> list:
+    """Messages in reply chains of 1-8 emails, each mentioning its project in the subject
+
+    Returns dicts with id, project, from, to, subject, date (RFC 2822), text,
+    message_id, in_reply_to and references.
+    """
+    rng = random.Random(seed)
+    demo = load_demo()
+    templates = [(p["project_name"], e) for p in demo["projects"] for e in p["emails"]]
+    messages = []
+    while len(messages) < count:
+        project, template = rng.choice(templates)
+        subject = f"{project} - {template['subject']}"
+        people = [template["from"], template["to"]]
+        sent = CORPUS_START + timedelta(seconds=rng.randint(0, CORPUS_DAYS * 86400 - 1))
+        references = []
+        for depth in range(min(rng.randint(1, 8), count - len(messages))):
+            index = len(messages)
+            message_id = f"<synthetic-{seed}-{index}@mail.example.com>"
+            messages.append({
+                "id": f"msg{index:07d}",
+                "project": project,
+                "from": people[depth % 2],
+                "to": people[(depth + 1) % 2],
+                "subject": f"Re: {subject}" if depth else subject,
+                "date": format_datetime(sent),
+                "text": template["body"] if depth == 0 else f"{rng.choice(templates)[1]['body']} Following up on the {project} item above.",
+                "message_id": message_id,
+                "in_reply_to": references[-1] if references else "",
+                "references": list(references)
+            })
+            references.append(message_id)
+            sent += timedelta(minutes=rng.randint(5, 3 * 24 * 60))
+    return messages
+
+
+def cleaned_emails(messages: list) -> list:
+    """Messages in the emails_cleaned.json format written by /api/emails/fetch"""
+    return [{
+        "id": m["id"],
+        "from": m["from"],
+        "to": m["to"],
+        "subject": m["subject"],
+        "date": m["date"],
+        "snippet": m["text"][:200],
+        "body": m["text"],
+        "clean_status": "ok",
+        "message_id": m["message_id"],
+        "in_reply_to": m["in_reply_to"],
+        "references": m["references"]
+    } for m in messages]
+
+
+def raw_body(message: dict, previous_text: str = "") -> str:
+    """The message body wrapped in one of the Gmail/Outlook/newsletter/plain templates, quoting the previous one"""
+    names = sorted(TEMPLATES)
+    name = names[int(message["id"][3:]) % len(names)]
+    if name == "plain":
+        return TEMPLATES[name].format(reply=message["text"], quoted=previous_text)
+    return TEMPLATES[name].format(reply=html.escape(message["text"]), quoted=html.escape(previous_text))
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def gmail_message(message: dict, previous_text: str = "") -> dict:
+    """A Gmail API users.messages.get resource (format=full) with text and HTML parts"""
+    headers = [
+        {"name": "Subject", "value": message["subject"]},
+        {"name": "From", "value": f"{message['from'].split('@')[0].replace('.', ' ').title()} <{message['from']}>"},
+        {"name": "To", "value": message["to"]},
+        {"name": "Date", "value": message["date"]},
+        {"name": "Message-ID", "value": message["message_id"]}
+    ]
+    if message["in_reply_to"]:
+        headers.append({"name": "In-Reply-To", "value": message["in_reply_to"]})
+        headers.append({"name": "References", "value": " ".join(message["references"])})
+    return {
+        "id": message["id"],
+        "threadId": (message["references"][0] if message["references"] else message["message_id"]).strip("<>"),
+        "snippet": html.escape(message["text"][:150]),
+        "payload": {
+            "mimeType": "multipart/alternative",
+            "headers": headers,
+            "parts": [
+                {"mimeType": "text/plain", "body": {"data": _b64(message["text"])}},
+                {"mimeType": "text/html", "body": {"data": _b64(raw_body(message, previous_text))}}
+            ]
+        }
+    }
+
+
+def gmail_messages(messages: list) -> list:
+    """Gmail API resources for synthetic messages, newest first like messages.list"""
+    texts = {m["message_id"]: m["text"] for m in messages}
+    newest_first = sorted(messages, key=lambda m: parsedate_to_datetime(m["date"]), reverse=True)
+    return [gmail_message(m, texts.get(m["in_reply_to"], "")) for m in newest_first]
+
+
+def raw_bodies(messages: list) -> list:
+    """HTML/plain raw bodies as fetched from Gmail, for clean_email_body"""
+    texts = {m["message_id"]: m["text"] for m in messages}
+    return [raw_body(m, texts.get(m["in_reply_to"], "")) for m in messages]
+
+
+def vendor_names(count: int) -> list:
+    names = [f"{word} {suffix}" for suffix in VENDOR_SUFFIXES for word in VENDOR_WORDS]
+    return [names[i % len(names)] + (f" {i // len(names) + 1}" if i >= len(names) else "") for i in range(count)]
+
+
+def write_procurement_workbook(path: Path, rows: int, vendors: int = None, seed: int = 0) -> Path:
+    """A procurement log with `rows` line items spread over `vendors` vendors"""
+    from openpyxl import Workbook  # deferred like the app's own Excel handling
+
+    rng = random.Random(seed)
+    names = vendor_names(vendors or min(500, max(5, rows // 20)))
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Procurement Log")
+    sheet.append(["Vendor", "PO Number", "Item", "Quantity", "Unit Price", "Order Date",
+                  "Required Date", "Delivery Status", "Submittal Status", "Notes"])
+    for i in range(rows):
+        ordered = CORPUS_START.replace(tzinfo=None) + timedelta(days=rng.randint(0, CORPUS_DAYS))
+        status = rng.choice(STATUSES)
+        sheet.append([
+            names[i % len(names)],
+            f"PO-{10000 + i}",
+            rng.choice(ITEMS),
+            rng.randint(1, 500),
+            round(rng.uniform(5, 25000), 2),
+            ordered,
+            ordered + timedelta(days=rng.randint(7, 90)),
+            status,
+            rng.choice(SUBMITTAL_STATUSES),
+            "" if status == "Delivered" else rng.choice(["Awaiting shop drawings", "Vendor confirmed ship date",
+                                                          "Expedite requested", "Partial shipment received"])
+        ])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(path)
+    return path
+
+
+def write_corpus(directory: Path, emails: int, rows: int, seed: int = 0) -> None:
+    """Write a data directory: demo_emails.json, emails_cleaned.json and attachments/procurement_log.xlsx"""
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in ("categories.json", "roles.json"):
+        source = DEMO_FILE.parent / name
+        if source.exists():
+            (directory / name).write_text(source.read_text(encoding="utf-8"), encoding="utf-8")
+    (directory / "demo_emails.json").write_text(
+        json.dumps(scaled_demo_emails(emails, seed), ensure_ascii=False), encoding="utf-8"
+    )
+    (directory / "emails_cleaned.json").write_text(
+        json.dumps(cleaned_emails(synthetic_messages(emails, seed)), ensure_ascii=False), encoding="utf-8"
+    )
+    write_procurement_workbook(directory / "attachments" / "procurement_log.xlsx", rows, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--emails", default="1k", help="emails to generate, e.g. 1k, 10k, 100k")
+    parser.add_argument("--rows", default="10k", help="procurement workbook rows, e.g. 100k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, required=True, help="directory to write the corpus to")
+    args = parser.parse_args()
+
+    write_corpus(args.out, parse_size(args.emails), parse_size(args.rows), args.seed)
+    print(f"✅ Corpus written to {args.out} ({args.emails} emails, {args.rows} procurement rows)")
+    print(f"   Point the app at it with DATA_DIR={args.out}")
+
+
+if __name__ == "__main__":
+    main()
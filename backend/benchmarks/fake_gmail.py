@@ -0,0 +1,79 @@
+"""In-process stand-in for the Gmail API client returned by get_gmail_service
+
+Serves the users().messages() list/get/attachments calls the fetch routes
+make from a list of message resources (see benchmarks/corpus.py), with an
+optional per-request latency, so the fetch pipeline can be benchmarked
+without OAuth credentials or network access:
+
+    from services import email_service
+    email_service.get_gmail_service = lambda: FakeGmailService(messages)
+"""
+import time
+
+
+class _Request:
+    """What the client's methods return: a deferred call run by .execute()"""
+
+    def __init__(self, service, result):
+        self._service = service
+        self._result = result
+
+    def execute(self):
+        self._service.requests += 1
+        if self._service.latency:
+            time.sleep(self._service.latency)
+        return self._result()
+
+
+class _Messages:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId: str = "me", maxResults: int = 100, q: str = None, pageToken: str = None, **kwargs):
+        start = int(pageToken or 0)
+        page = self._service.messages[start:start + maxResults]
+        next_token = str(start + maxResults) if start + maxResults < len(self._service.messages) else None
+
+        def result():
+            listed = {"messages": [{"id": m["id"], "threadId": m.get("threadId", m["id"])} for m in page],
+                      "resultSizeEstimate": len(self._service.messages)}
+            if next_token:
+                listed["nextPageToken"] = next_token
+            return listed
+        return _Request(self._service, result)
+
+    def get(self, userId: str = "me", id: str = None, **kwargs):
+        return _Request(self._service, lambda: self._service.by_id[id])
+
+    def attachments(self):
+        return _Attachments(self._service)
+
+
+class _Attachments:
+    def __init__(self, service):
+        self._service = service
+
+    def get(self, userId: str = "me", messageId: str = None, id: str = None, **kwargs):
+        return _Request(self._service, lambda: self._service.attachments[id])
+
+
+class _Users:
+    def __init__(self, service):
+        self._service = service
+
+    def messages(self):
+        return _Messages(self._service)
+
+
+class FakeGmailService:
+    """Gmail v1 service over in-memory message resources, newest first"""
+
+    def __init__(self, messages: list, attachments: dict = None, latency: float = 0.0):
+        self.messages = messages
+        self.by_id = {m["id"]: m for m in messages}
+        self.attachments = attachments or {}
+        self.latency = latency
+        self.requests = 0
+
+    def users(self):
+        return _Users(self)
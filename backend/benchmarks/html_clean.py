@@ -0,0 +1,197 @@
+"""Benchmark: BeautifulSoup vs regex HTML-to-text cleaning of email bodies
+
+Run from the backend directory:
+
+    python -m benchmarks.html_clean [--corpus DIR] [--repeat N] [--json]
+
+--corpus points at a directory of real-world .html/.htm/.eml/.txt messages
+(e.g. exported newsletters and Outlook/Gmail replies). Without it, the sample
+email bodies are wrapped in Gmail, Outlook, newsletter and plain-text reply
+templates with quoted history, signatures, style blocks and tracking pixels.
+
+Reports throughput of the previous BeautifulSoup cleaner, the regex cleaner
+inline and on the process pool, how often the regex output matches the
+BeautifulSoup output exactly, and the tokens saved by quote stripping.
+"""
+from services.config import DATA_DIR
+from services.html_text import html_to_text, _get_pool, _clean_one
+from services.tokenizer import count_tokens, truncate_to_tokens
+from email import policy
+from email.parser import BytesParser
+from pathlib import Path
+import argparse
+import html
+import json
+import time
+
+MAX_TOKENS = 250
+
+GMAIL_REPLY = """<div dir="ltr"><div>{reply}</div><div><br></div><div>Thanks,</div><div>Sam</div>
+<div class="gmail_signature"><div>Sam Ortiz | Project Engineer<br>Carma Construction &amp; Co.</div></div>
+<br><div class="gmail_quote"><div dir="ltr" class="gmail_attr">On Mon, Oct 13, 2025 at 9:14 AM Lee &lt;lee@vendor.com&gt; wrote:<br></div>
+<blockquote class="gmail_quote" style="margin:0px 0px 0px 0.8ex;border-left:1px solid rgb(204,204,204)">{quoted}</blockquote></div></div>"""
+
+OUTLOOK_REPLY = """<html xmlns:o="urn:schemas-microsoft-com:office:office"><head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+<style><!-- @font-face {{font-family:"Cambria Math";}} p.MsoNormal, li.MsoNormal {{margin:0in;font-size:11.0pt;}} --></style>
+<!--[if gte mso 9]><xml><o:shapedefaults v:ext="edit" spidmax="1026" /></xml><![endif]--></head>
+<body lang="EN-US"><div class="WordSection1"><p class="MsoNormal">{reply}<o:p></o:p></p>
+<p class="MsoNormal"><o:p>&nbsp;</o:p></p><p class="MsoNormal">Regards,<br>Pat Kim<o:p></o:p></p>
+<div id="appendonsend"></div><hr style="display:inline-block;width:98%" tabindex="-1">
+<div id="divRplyFwdMsg" dir="ltr"><font face="Calibri" style="font-size:11pt"><b>From:</b> Lee &lt;lee@vendor.com&gt;<br>
+<b>Sent:</b> Monday, October 13, 2025 9:14 AM<br><b>Subject:</b> RE: Update</font></div>
+<div><p class="MsoNormal">{quoted}</p></div></div></body></html>"""
+
+NEWSLETTER = """<!DOCTYPE html><html><head><title>Supplier update</title>
+<style type="text/css">body{{margin:0;padding:0}} .btn a{{color:#fff!important}} @media only screen and (max-width:600px){{.col{{width:100%!important}}}}</style>
+<script type="text/javascript">window.dataLayer=window.dataLayer||[];function gtag(){{dataLayer.push(arguments);}}</script></head>
+<body><table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td align="center">
+<table class="col" width="600" style="max-width:600px;font-family:Arial,sans-serif"><tr><td style="padding:24px;font-size:16px">
+<h1 style="font-size:22px">Project materials bulletin</h1><p>{reply}</p>
+<table><tr><td class="btn" style="background:#0a66c2;border-radius:4px"><a href="https://example.com/track?u=1&amp;id=2" title="Open &gt; portal">View order status &rarr;</a></td></tr></table>
+<p style="color:#888;font-size:12px">{quoted}</p><p style="font-size:11px">&copy; 2025 Supplier Inc. &middot; <a href="#">Unsubscribe</a></p>
+</td></tr></table><img src="https://example.com/pixel.gif" width="1" height="1" alt=""></td></tr></table></body></html>"""
+
+PLAIN_REPLY = """{reply}
+
+Thanks,
+Jordan
+--
+Jordan Lee | Site Superintendent
+Sent from my iPhone
+
+On Mon, Oct 13, 2025 at 9:14 AM Lee <lee@vendor.com> wrote:
+> {quoted}
+> Please confirm by Friday."""
+
+TEMPLATES = {"gmail": GMAIL_REPLY, "outlook": OUTLOOK_REPLY, "newsletter": NEWSLETTER, "plain": PLAIN_REPLY}
+
+
+def legacy_clean(raw_body: str, max_tokens: int = MAX_TOKENS) -> str:
+    """The previous BeautifulSoup-based clean_email_body"""
+    from bs4 import BeautifulSoup
+    if not raw_body:
+        return ""
+    soup = BeautifulSoup(raw_body, "html.parser")
+    for tag in soup(["script", "style"]):
+        tag.extract()
+    text = soup.get_text(separator=" ", strip=True)
+    text = html.unescape(text)
+    text = " ".join(text.split())
+    return truncate_to_tokens(text, max_tokens, suffix="...")
+
+
+def _sample_bodies() -> list:
+    bodies = []
+    demo = json.loads((DATA_DIR / "demo_emails.json").read_text(encoding="utf-8"))
+    for project in demo.get("projects", []):
+        bodies.extend(e.get("body", "") for e in project.get("emails", []))
+    return [b for b in bodies if b]
+
+
+def synthetic_corpus() -> list:
+    """Sample bodies wrapped in each reply/newsletter template, quoting the previous body"""
+    bodies = _sample_bodies()
+    corpus = []
+    for i, body in enumerate(bodies):
+        quoted = bodies[i - 1]
+        for template in TEMPLATES.values():
+            if template is PLAIN_REPLY:
+                corpus.append(template.format(reply=body, quoted=quoted))
+            else:
+                corpus.append(template.format(reply=html.escape(body), quoted=html.escape(quoted)))
+    return corpus
+
+
+def load_corpus(directory: Path) -> list:
+    """Message bodies from .html/.htm/.txt files and the HTML (or text) part of .eml files"""
+    corpus = []
+    for path in sorted(directory.rglob("*")):
+        suffix = path.suffix.lower()
+        if suffix in (".html", ".htm", ".txt"):
+            corpus.append(path.read_text(encoding="utf-8", errors="ignore"))
+        elif suffix == ".eml":
+            message = BytesParser(policy=policy.default).parsebytes(path.read_bytes())
+            part = message.get_body(preferencelist=("html", "plain"))
+            if part is not None:
+                corpus.append(part.get_content())
+    return corpus
+
+
+def _throughput(fn, corpus: list, repeat: int) -> dict:
+    size = sum(len(body.encode("utf-8")) for body in corpus)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(corpus)
+    elapsed = time.perf_counter() - started
+    return {
+        "emails_per_second": round(len(corpus) * repeat / elapsed, 1),
+        "mb_per_second": round(size * repeat / elapsed / 1e6, 2),
+        "seconds": round(elapsed, 3)
+    }
+
+
+def run(corpus: list, repeat: int) -> dict:
+    """Throughput, output agreement and quote-stripping savings"""
+    results = {"emails": len(corpus), "bytes": sum(len(b.encode("utf-8")) for b in corpus)}
+    try:
+        legacy = [legacy_clean(body) for body in corpus]
+        results["beautifulsoup"] = _throughput(lambda c: [legacy_clean(b) for b in c], corpus, repeat)
+    except ImportError:
+        legacy = None
+        results["beautifulsoup"] = None
+
+    fast = [_clean_one((body, MAX_TOKENS, False)) for body in corpus]
+    results["regex_inline"] = _throughput(lambda c: [_clean_one((b, MAX_TOKENS, False)) for b in c], corpus, repeat)
+
+    # Warm the pool first so worker start-up is not counted
+    _get_pool().submit(_clean_one, ("", MAX_TOKENS, False)).result()
+    pool = _get_pool()
+    results["regex_pool"] = _throughput(
+        lambda c: list(pool.map(_clean_one, [(b, MAX_TOKENS, False) for b in c], chunksize=max(1, len(c) // 16))),
+        corpus, repeat
+    )
+
+    if legacy is not None:
+        results["identical_to_beautifulsoup"] = round(sum(a == b for a, b in zip(legacy, fast)) / len(corpus), 3)
+        results["speedup_inline"] = round(
+            results["regex_inline"]["emails_per_second"] / results["beautifulsoup"]["emails_per_second"], 1
+        )
+
+    full_tokens = sum(count_tokens(html_to_text(body)) for body in corpus)
+    stripped_tokens = sum(count_tokens(html_to_text(body, strip_quotes=True)) for body in corpus)
+    results["avg_tokens_full"] = round(full_tokens / len(corpus), 1)
+    results["avg_tokens_quotes_stripped"] = round(stripped_tokens / len(corpus), 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, help="directory of .html/.htm/.eml/.txt messages")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the corpus per cleaner")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not corpus:
+        parser.error("no messages found in the corpus")
+    results = run(corpus, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Corpus: {results['emails']} emails, {results['bytes'] / 1e6:.2f} MB  |  repeat: {args.repeat}")
+    print(f"{'cleaner':<16}{'emails/s':>12}{'MB/s':>9}")
+    for name in ("beautifulsoup", "regex_inline", "regex_pool"):
+        r = results[name]
+        if r is None:
+            print(f"{name:<16}{'(bs4 not installed)':>21}")
+        else:
+            print(f"{name:<16}{r['emails_per_second']:>12}{r['mb_per_second']:>9}")
+    if "identical_to_beautifulsoup" in results:
+        print(f"Identical output: {results['identical_to_beautifulsoup']:.1%}  |  speedup (inline): {results['speedup_inline']}x")
+    print(f"Avg tokens: {results['avg_tokens_full']} full → {results['avg_tokens_quotes_stripped']} quotes stripped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark: cold-start import time and memory of the FastAPI app
+
+Run from the backend directory:
+
+    python -m benchmarks.import_time [--runs N] [--check] [--update-baseline] [--json]
+
+Imports main in fresh interpreters with `python -X importtime`, and reports
+the median import time, peak RSS, the heaviest modules and whether any of the
+dependencies that are meant to load on first use (OpenAI SDK, pandas, Google
+client libraries, BeautifulSoup) were imported at startup.
+
+--check compares against benchmarks/import_baseline.json and exits non-zero
+when a deferred dependency is imported eagerly again or import time / RSS
+grow past the tolerance, so it can run as a regression check in CI.
+--update-baseline records the current numbers.
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = Path(__file__).parent.parent
+BASELINE_FILE = Path(__file__).parent / "import_baseline.json"
+
+# Must not be imported by `import main`
+DEFERRED_MODULES = ["openai", "pandas", "googleapiclient", "google_auth_oauthlib", "bs4", "tiktoken"]
+
+# Allowed growth over the baseline before --check fails
+IMPORT_TIME_TOLERANCE = 0.5
+RSS_TOLERANCE = 0.25
+
+_PROBE = (
+    "import json, resource, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - started\n"
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "rss_mb = rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024\n"
+    f"deferred = [m for m in {DEFERRED_MODULES!r} if m in sys.modules]\n"
+    "print(json.dumps({'import_ms': elapsed * 1000, 'rss_mb': rss_mb, 'deferred_loaded': deferred}))\n"
+)
+
+
+def _parse_importtime(stderr: str) -> dict:
+    """Cumulative microseconds per top-level package from -X importtime output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        package = parts[2].strip().split(".")[0]
+        cumulative[package] = max(cumulative.get(package, 0), int(parts[1]))
+    return cumulative
+
+
+def measure_once() -> dict:
+    """Import main in a fresh interpreter"""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    # config needs an API key only to build the client, which is now deferred
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    measurement["packages"] = _parse_importtime(result.stderr)
+    return measurement
+
+
+def run(runs: int) -> dict:
+    """Median import time and RSS over several cold starts"""
+    measurements = [measure_once() for _ in range(runs)]
+    packages = measurements[-1]["packages"]
+    heaviest = sorted(
+        ((name, us) for name, us in packages.items() if name not in ("main", "site", "encodings")),
+        key=lambda item: -item[1]
+    )[:10]
+    return {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "import_ms": round(statistics.median(m["import_ms"] for m in measurements), 1),
+        "rss_mb": round(statistics.median(m["rss_mb"] for m in measurements), 1),
+        "deferred_loaded": sorted({name for m in measurements for name in m["deferred_loaded"]}),
+        "heaviest_packages_ms": {name: round(us / 1000, 1) for name, us in heaviest}
+    }
+
+
+def check(results: dict, baseline: dict) -> list:
+    """Regressions against the baseline"""
+    problems = []
+    if results["deferred_loaded"]:
+        problems.append(f"deferred modules imported at startup: {', '.join(results['deferred_loaded'])}")
+    limit = baseline["import_ms"] * (1 + IMPORT_TIME_TOLERANCE)
+    if results["import_ms"] > limit:
+        problems.append(f"import time {results['import_ms']} ms > {limit:.1f} ms (baseline {baseline['import_ms']} ms)")
+    limit = baseline["rss_mb"] * (1 + RSS_TOLERANCE)
+    if results["rss_mb"] > limit:
+        problems.append(f"RSS {results['rss_mb']} MB > {limit:.1f} MB (baseline {baseline['rss_mb']} MB)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to measure")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="record these results as the baseline")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Python {results['python']}  |  cold starts: {results['runs']}")
+        print(f"import main: {results['import_ms']} ms  |  peak RSS: {results['rss_mb']} MB")
+        print(f"Deferred modules loaded at startup: {', '.join(results['deferred_loaded']) or 'none'}")
+        print("Heaviest packages (cumulative ms):")
+        for name, ms in results["heaviest_packages_ms"].items():
+            print(f"  {name:<24}{ms:>8}")
+
+    if args.update_baseline:
+        BASELINE_FILE.write_text(json.dumps(
+            {k: results[k] for k in ("python", "import_ms", "rss_mb")}, indent=2
+        ) + "\n", encoding="utf-8")
+        print(f"Baseline written to {BASELINE_FILE}")
+
+    if args.check:
+        if not BASELINE_FILE.exists():
+            parser.error("no baseline; run with --update-baseline first")
+        problems = check(results, json.loads(BASELINE_FILE.read_text(encoding="utf-8")))
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ No import-time regressions")
+
+
+if __name__ == "__main__":
+    main()
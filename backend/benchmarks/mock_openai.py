@@ -0,0 +1,104 @@
+"""Local mock of the OpenAI chat completions API for exercising the client layer
+
+Run from the backend directory, then point the app at it:
+
+    python -m benchmarks.mock_openai --port 8001 --error-rate 0.2 --slow-rate 0.1
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 uvicorn main:app
+
+Responses are delayed by --latency seconds (--slow-latency for a --slow-rate
+share of requests, to trigger hedging), and an --error-rate share fail with
+--error-status (429 responses carry a Retry-After header). Use --down to fail
+every request and watch the circuit breaker open.
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import argparse
+import asyncio
+import json
+import random
+import time
+
+# Generic content that satisfies the reply schemas; other schemas will go
+# through the repair path and then their local fallbacks
+DEFAULT_CONTENT = {
+    "replies": [
+        "Thanks for the update. We will review and respond by end of day.",
+        "Received. Could you confirm the revised delivery date?",
+        "Thank you. I have shared this with the project team for action."
+    ],
+    "subject": "Re: Follow-up",
+    "body": "Hello, following up on our earlier request. Please send an update at your earliest convenience."
+}
+
+
+def create_app(latency: float = 0.2, slow_rate: float = 0.0, slow_latency: float = 5.0,
+               error_rate: float = 0.0, error_status: int = 503, down: bool = False) -> FastAPI:
+    """Mock API app with the given latency and failure profile"""
+    app = FastAPI(title="Mock OpenAI")
+    stats = {"requests": 0, "errors": 0, "slow": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        delay = latency
+        if random.random() < slow_rate:
+            stats["slow"] += 1
+            delay = slow_latency
+        await asyncio.sleep(delay)
+
+        if down or random.random() < error_rate:
+            stats["errors"] += 1
+            headers = {"retry-after": "1"} if error_status == 429 else {}
+            return JSONResponse(
+                {"error": {"message": "mock failure", "type": "server_error"}},
+                status_code=error_status,
+                headers=headers
+            )
+
+        content = json.dumps(DEFAULT_CONTENT)
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+        return {
+            "id": f"chatcmpl-mock-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4,
+                "prompt_tokens_details": {"cached_tokens": 0}
+            }
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--down", action="store_true")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(args.latency, args.slow_rate, args.slow_latency, args.error_rate, args.error_status, args.down)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Benchmark: the backend pipelines on a synthetic corpus at 1k/10k/100k scale
+
+Run from the backend directory:
+
+    python -m benchmarks.pipelines [--sizes 1k,10k,100k] [--workloads NAMES] [--repeat N]
+                                   [--check] [--update-baseline] [--json]
+
+Each size gets a generated corpus (see benchmarks/corpus.py) in a scratch
+DATA_DIR/OUTPUT_DIR, so the real data/ and output/ trees are never touched.
+LLM calls go to the in-process fake backend with zero latency, and rate
+limits and the cross-worker LLM cache are off, so the numbers measure the
+app's own work: prompt building, parsing, indexing, file I/O. Gmail calls go
+to benchmarks/fake_gmail.py.
+
+Workloads (the size is the number of emails, or of workbook rows for procurement):
+    data_emails            GET /api/data/emails with four filter combinations
+    clean_email_body       raw Gmail/Outlook/newsletter HTML bodies to text
+    group_threads          group_emails_into_threads over the cleaned mailbox
+    gmail_fetch            GET /api/emails/fetch against the fake Gmail service (10 messages)
+    summarize              _summarize_emails for one project, end to end
+    procurement_analyze    procurement analysis of a fresh workbook (parse + classify every vendor)
+    procurement_reparse    the same analysis again with every vendor unchanged (parse only)
+    weekly_report          weekly report for one project's fourth week, nothing cached
+    weekly_report_cached   the same report served from the stored copy
+
+Each workload runs once to warm up and then --repeat times; the median and
+best times are reported. --check compares best times against
+benchmarks/pipelines_baseline.json and exits non-zero past the tolerance;
+--update-baseline records this run.
+The 100k size takes several minutes, mostly in summarize (one LLM call per email).
+"""
+from contextlib import redirect_stdout
+from datetime import timedelta
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BASELINE_FILE = Path(__file__).parent / "pipelines_baseline.json"
+
+# Allowed slowdown over the baseline's best time before --check fails, and the
+# smallest absolute change that counts (timer noise on very fast workloads).
+# Loose on purpose: shared machines vary by tens of percent between runs, and
+# the regressions worth failing on (a lost index, a quadratic loop) are larger
+TOLERANCE = 1.0
+MIN_REGRESSION_SECONDS = 0.05
+
+SEED = 0
+PROJECT = "Hospital Expansion"
+
+
+def configure_environment(workdir: Path, llm_latency: float) -> None:
+    """Point the app at the scratch directories and the fake LLM; must run before services are imported"""
+    if "services.config" in sys.modules:
+        raise RuntimeError("configure_environment must run before any services module is imported")
+    os.environ.update({
+        "DATA_DIR": str(workdir / "data"),
+        "OUTPUT_DIR": str(workdir / "output"),
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(llm_latency),
+        "FAKE_LLM_JITTER": "0",
+        "FAKE_LLM_ERROR_RATE": "0",
+        "FAKE_LLM_SEED": str(SEED),
+        "LLM_RPM_LIMIT": "0",
+        "LLM_TPM_LIMIT": "0",
+        # Repeated runs send identical prompts; a shared cache hit would skip the work being measured
+        "LLM_SHARED_CACHE_TTL": "0"
+    })
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+
+def _write_json(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+def _data_dir() -> Path:
+    from services.config import DATA_DIR
+    return DATA_DIR
+
+
+def _client():
+    from fastapi.testclient import TestClient
+    from main import app
+    # Not entered as a context manager, so startup jobs (scheduler, batch polling) stay off
+    return TestClient(app)
+
+
+# Each workload prepares its inputs for a size and returns (items, run, reset):
+# run() is timed, reset() (optional) restores the starting state before each run
+
+def bench_data_emails(size: int):
+    from benchmarks import corpus
+    _write_json(_data_dir() / "demo_emails.json", corpus.scaled_demo_emails(size, SEED))
+    client = _client()
+    queries = [
+        {},
+        {"project": PROJECT},
+        {"project": PROJECT, "category": "RFI"},
+        {"priority": "High", "role": "Project Manager"}
+    ]
+
+    def run():
+        for params in queries:
+            client.get("/api/data/emails", params=params).raise_for_status()
+    return size * len(queries), run, None
+
+
+def bench_clean_email_body(size: int):
+    from benchmarks import corpus
+    from services.email_service import clean_email_body
+    bodies = corpus.raw_bodies(corpus.synthetic_messages(size, SEED))
+    return size, lambda: [clean_email_body(body) for body in bodies], None
+
+
+def bench_group_threads(size: int):
+    from benchmarks import corpus
+    from services.email_service import group_emails_into_threads
+    emails = corpus.cleaned_emails(corpus.synthetic_messages(size, SEED))
+    return size, lambda: group_emails_into_threads(emails), None
+
+
+def bench_gmail_fetch(size: int):
+    from benchmarks import corpus
+    from benchmarks.fake_gmail import FakeGmailService
+    from services import email_service
+    messages = corpus.gmail_messages(corpus.synthetic_messages(size, SEED))
+    email_service.get_gmail_service = lambda: FakeGmailService(messages)
+    client = _client()
+
+    def run():
+        client.get("/api/emails/fetch").raise_for_status()
+    return 10, run, None  # the route fetches the 10 newest messages
+
+
+def bench_summarize(size: int):
+    from benchmarks import corpus
+    from routes.emails import _summarize_emails
+    demo = corpus.scaled_demo_emails(size, SEED)
+    _write_json(_data_dir() / "demo_emails.json", demo)
+    project = next(p for p in demo["projects"] if p["project_name"] == PROJECT)
+    return len(project["emails"]), lambda: asyncio.run(_summarize_emails(PROJECT)), None
+
+
+def _procurement(size: int, cold: bool):
+    from benchmarks import corpus
+    from routes.procurement_analyze import _analyze_procurement_logs
+    from services import procurement_store
+    attachments = _data_dir() / "attachments"
+    shutil.rmtree(attachments, ignore_errors=True)
+    corpus.write_procurement_workbook(attachments / "procurement_log.xlsx", size, seed=SEED)
+    procurement_store.STORE_FILE.unlink(missing_ok=True)
+    reset = (lambda: procurement_store.STORE_FILE.unlink(missing_ok=True)) if cold else None
+    return size, lambda: _analyze_procurement_logs(None), reset
+
+
+def bench_procurement_analyze(size: int):
+    return _procurement(size, cold=True)
+
+
+def bench_procurement_reparse(size: int):
+    return _procurement(size, cold=False)
+
+
+def _weekly_report(size: int, cold: bool):
+    from benchmarks import corpus
+    from services import report_service
+    messages = corpus.synthetic_messages(size, SEED)
+    _write_json(_data_dir() / "emails_cleaned.json", corpus.cleaned_emails(messages))
+    start = corpus.CORPUS_START + timedelta(days=21)
+    start_date, end_date = start.date().isoformat(), (start + timedelta(days=6)).date().isoformat()
+    items = len(report_service.select_window_emails(PROJECT, start_date, end_date))
+
+    def reset():
+        # Stored reports and cached day summaries of the previous run (or size)
+        shutil.rmtree(report_service.WEEKLY_REPORTS_DIR, ignore_errors=True)
+    reset()
+    run = lambda: report_service.get_or_generate_weekly_report(PROJECT, start_date, end_date)
+    return items, run, reset if cold else None
+
+
+def bench_weekly_report(size: int):
+    return _weekly_report(size, cold=True)
+
+
+def bench_weekly_report_cached(size: int):
+    return _weekly_report(size, cold=False)
+
+
+WORKLOADS = {
+    "data_emails": bench_data_emails,
+    "clean_email_body": bench_clean_email_body,
+    "group_threads": bench_group_threads,
+    "gmail_fetch": bench_gmail_fetch,
+    "summarize": bench_summarize,
+    "procurement_analyze": bench_procurement_analyze,
+    "procurement_reparse": bench_procurement_reparse,
+    "weekly_report": bench_weekly_report,
+    "weekly_report_cached": bench_weekly_report_cached
+}
+
+# Workloads whose input does not grow with the size; run once, at the smallest size
+FIXED_SIZE = {"gmail_fetch"}
+
+
+def measure(workload: str, size: int, repeat: int, verbose: bool = False) -> dict:
+    """Median and best time of `repeat` runs after one warm-up run"""
+    # The pipelines print progress for every email and LLM call
+    sink = sys.stdout if verbose else open(os.devnull, "w")
+    try:
+        with redirect_stdout(sink):
+            items, run, reset = WORKLOADS[workload](size)
+            timings = []
+            for attempt in range(repeat + 1):
+                if reset:
+                    reset()
+                started = time.perf_counter()
+                run()
+                if attempt:  # the first run is the warm-up
+                    timings.append(time.perf_counter() - started)
+    finally:
+        if sink is not sys.stdout:
+            sink.close()
+    median = statistics.median(timings)
+    return {
+        "items": items,
+        "median_s": round(median, 4),
+        "min_s": round(min(timings), 4),
+        "items_per_second": round(items / median, 1) if median else None
+    }
+
+
+def run(sizes: list, workloads: list, repeat: int, verbose: bool = False) -> dict:
+    """Results keyed by "<workload>@<size>" """
+    from benchmarks.corpus import format_size
+    results = {}
+    for size in sizes:
+        for workload in workloads:
+            if workload in FIXED_SIZE and size != sizes[0]:
+                continue
+            key = workload if workload in FIXED_SIZE else f"{workload}@{format_size(size)}"
+            print(f"⏱️  {key}", file=sys.stderr)
+            results[key] = measure(workload, size, repeat, verbose)
+    return {"python": sys.version.split()[0], "repeat": repeat, "results": results}
+
+
+def check(results: dict, baseline: dict) -> list:
+    """Workloads slower than the baseline by more than the tolerance"""
+    problems = []
+    for key, result in results["results"].items():
+        expected = baseline.get("results", {}).get(key)
+        if not expected:
+            continue
+        # Best runs are compared: they vary far less between runs than medians
+        limit = expected["min_s"] * (1 + TOLERANCE)
+        if result["min_s"] > limit and result["min_s"] - expected["min_s"] > MIN_REGRESSION_SECONDS:
+            problems.append(f"{key}: best {result['min_s']} s > {limit:.4f} s (baseline {expected['min_s']} s)")
+    return problems
+
+
+def _print_table(results: dict, baseline: dict) -> None:
+    print(f"Python {results['python']}  |  repeat: {results['repeat']}  |  LLM: fake backend")
+    print(f"{'workload':<30}{'items':>8}{'median s':>11}{'items/s':>12}{'vs baseline':>13}")
+    for key, r in results["results"].items():
+        expected = (baseline or {}).get("results", {}).get(key)
+        change = f"{(r['median_s'] / expected['median_s'] - 1):+.0%}" if expected and expected["median_s"] else "-"
+        print(f"{key:<30}{r['items']:>8}{r['median_s']:>11}{r['items_per_second'] or '-':>12}{change:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,10k", help="comma-separated corpus sizes, e.g. 1k,10k,100k")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma-separated workloads to run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per workload and size")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the fake LLM takes per call")
+    parser.add_argument("--workdir", type=Path, help="scratch directory (default: a temporary one, removed afterwards)")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="record these results as the baseline")
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    parser.add_argument("--verbose", action="store_true", help="show the pipelines' own output")
+    args = parser.parse_args()
+
+    workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    unknown = [w for w in workloads if w not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)} (choose from {', '.join(WORKLOADS)})")
+    if args.check and not BASELINE_FILE.exists():
+        parser.error("no baseline; run with --update-baseline first")
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="carma-bench-"))
+    configure_environment(workdir, args.llm_latency)
+    from benchmarks.corpus import parse_size
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    try:
+        results = run(sizes, workloads, args.repeat, args.verbose)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = json.loads(BASELINE_FILE.read_text(encoding="utf-8")) if BASELINE_FILE.exists() else None
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results, baseline)
+
+    if args.update_baseline:
+        # Keep baseline entries for workloads and sizes this run did not cover
+        merged = {**((baseline or {}).get("results", {})), **results["results"]}
+        BASELINE_FILE.write_text(json.dumps(
+            {"python": results["python"], "repeat": results["repeat"], "results": merged}, indent=2
+        ) + "\n", encoding="utf-8")
+        print(f"Baseline written to {BASELINE_FILE}")
+
+    if args.check:
+        problems = check(results, baseline)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("✅ No pipeline regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Benchmark: character slicing vs token-budget truncation at each prompt call site
+
+Run from the backend directory:
+
+    python -m benchmarks.token_budget [--json]
+
+For every email in the sample data, the body is cut the old way (character
+slice) and the new way (token budget) and compared on tokens sent and on the
+share of key facts (numbers, dates, IDs, names, acronyms) that survive the cut.
+
+Not every budget is meant to send fewer tokens. semantic_filter only needs
+the opening of an email and sends less than the old slice; ai_reply's budget
+is a ceiling so the email being answered arrives whole, and the extra tokens
+there are the text the 500-character slice used to drop (often mid-word).
+"""
+from services.config import DATA_DIR
+from services.tokenizer import count_tokens, truncate_to_tokens, tokenizer_name
+import argparse
+import json
+import re
+
+# call site -> (old character limit, new token budget)
+CALL_SITES = {
+    "semantic_filter": (500, 100),
+    "ai_reply": (500, 300),
+    "clean_email_body": (1000, 250),
+}
+
+_FACT_RE = re.compile(r"#?\d[\d,./:-]*|\b[A-Z]{2,}\b|\b[A-Z][a-z]+(?: [A-Z][a-z]+)+")
+
+
+def load_corpus() -> list:
+    """Email bodies from every bundled sample data file"""
+    bodies = []
+    demo = json.loads((DATA_DIR / "demo_emails.json").read_text(encoding="utf-8"))
+    for project in demo.get("projects", []):
+        bodies.extend(e.get("body", "") for e in project.get("emails", []))
+    for path in DATA_DIR.glob("*.json"):
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(data, list):
+            bodies.extend(e.get("body", "") for e in data if isinstance(e, dict) and e.get("body"))
+    return [b for b in bodies if b]
+
+
+def facts(text: str) -> set:
+    """Key facts a summary depends on"""
+    return set(_FACT_RE.findall(text))
+
+
+def retained(full: str, cut: str) -> float:
+    """Share of the full text's key facts still present after truncation"""
+    expected = facts(full)
+    if not expected:
+        return 1.0
+    return len(expected & facts(cut)) / len(expected)
+
+
+def run(bodies: list) -> dict:
+    """Compare both truncation strategies for each call site"""
+    results = {}
+    for site, (char_limit, token_budget) in CALL_SITES.items():
+        old_tokens = new_tokens = 0
+        old_quality = new_quality = 0.0
+        old_cut = new_cut = mid_word = 0
+        for body in bodies:
+            old = body[:char_limit]
+            new = truncate_to_tokens(body, token_budget)
+            old_tokens += count_tokens(old)
+            new_tokens += count_tokens(new)
+            old_quality += retained(body, old)
+            new_quality += retained(body, new)
+            if len(body) > char_limit:
+                old_cut += 1
+                if body[char_limit - 1].isalnum() and body[char_limit].isalnum():
+                    mid_word += 1
+            if new != body:
+                new_cut += 1
+        n = len(bodies)
+        results[site] = {
+            "char_limit": char_limit,
+            "token_budget": token_budget,
+            "avg_tokens_char_slice": round(old_tokens / n, 1),
+            "avg_tokens_token_budget": round(new_tokens / n, 1),
+            "token_change_pct": round(100 * (new_tokens - old_tokens) / max(old_tokens, 1), 1),
+            "facts_retained_char_slice": round(old_quality / n, 3),
+            "facts_retained_token_budget": round(new_quality / n, 3),
+            "truncated_char_slice": old_cut,
+            "truncated_token_budget": new_cut,
+            "char_slice_cut_mid_word": mid_word,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="print raw JSON results")
+    args = parser.parse_args()
+
+    bodies = load_corpus()
+    results = run(bodies)
+    if args.json:
+        print(json.dumps({"tokenizer": tokenizer_name(), "emails": len(bodies), "results": results}, indent=2))
+        return
+
+    print(f"Tokenizer: {tokenizer_name()}  |  emails: {len(bodies)}")
+    print(f"{'call site':<18}{'tokens old→new':>18}{'change':>9}{'facts old→new':>17}{'cut old/new':>13}{'mid-word':>10}")
+    for site, r in results.items():
+        print(
+            f"{site:<18}"
+            f"{r['avg_tokens_char_slice']:>8} → {r['avg_tokens_token_budget']:<7}"
+            f"{r['token_change_pct']:>8}%"
+            f"{r['facts_retained_char_slice']:>8} → {r['facts_retained_token_budget']:<6}"
+            f"{r['truncated_char_slice']:>7}/{r['truncated_token_budget']:<5}"
+            f"{r['char_slice_cut_mid_word']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 """Main FastAPI application"""
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from services.config import DATA_DIR
+from services.config import OUTPUT_DIR, WEEKLY_REPORT_SCHEDULER, PROFILING_ENABLED, LOOP_WATCHDOG
+from services.storage import file_lock
+from services.report_scheduler import scheduler as weekly_report_scheduler
+from services.batch_service import resume_pending_jobs
+from services import responsiveness, tracing
+from services.metrics import HTTP_REQUESTS, HTTP_REQUEST_SECONDS
+from services.profiling import SamplingProfiler, save_profile, loop_watchdog
+from typing import Optional
 from routes import (
     emails,
     emails_with_attachments,
@@ -11,9 +18,15 @@ from routes import (
     procurement_analyze,
     vendors,
     dashboard,
-    auth
+    auth,
+    llm,
+    batch,
+    metrics,
+    debug
 )
-import json
+from contextlib import ExitStack
+import asyncio
+import time
 
 app = FastAPI(
     title="CARMA AI Backend",
@@ -30,6 +43,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Scrapes and trace lookups would crowd real requests out of the trace buffers
+UNTRACED_PATHS = ("/metrics", "/api/debug/")
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count and time requests per route template (not per raw path, to keep label values bounded), and trace them"""
+    started = time.perf_counter()
+    status = 500
+    attributes = {"http.method": request.method, "http.target": request.url.path}
+    traced = not request.url.path.startswith(UNTRACED_PATHS)
+    with tracing.span(f"{request.method} {request.url.path}", root=traced,
+                      parent_header=request.headers.get("traceparent"), **attributes) as span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            if span:
+                response.headers["traceparent"] = tracing.traceparent(span)
+            return response
+        finally:
+            route = request.scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            if span:
+                span.name = f"{request.method} {path}"
+                span.set_attribute("http.route", path)
+                span.set_attribute("http.status_code", status)
+            HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path)
+
 # Include all modular routes
 app.include_router(emails.router)
 app.include_router(emails_with_attachments.router)
@@ -40,6 +83,59 @@ app.include_router(procurement_analyze.router)
 app.include_router(vendors.router)
 app.include_router(dashboard.router)
 app.include_router(auth.router)
+app.include_router(llm.router)
+app.include_router(batch.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """With PROFILING=1, run requests sent with `X-Profile: 1` or `?profile=1` under the sampling profiler"""
+    if not PROFILING_ENABLED or not (
+        request.headers.get("x-profile") == "1" or request.query_params.get("profile") == "1"
+    ):
+        return await call_next(request)
+    profiler = SamplingProfiler(f"{request.method} {request.url.path}").start()
+    try:
+        response = await call_next(request)
+    finally:
+        profile_id = save_profile(profiler.stop())
+        print(f"🔬 Profiled {request.method} {request.url.path}: /api/debug/profiles/{profile_id}")
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+# Held by the one worker that runs background jobs when uvicorn runs several
+background_jobs_lock = ExitStack()
+
+
+@app.on_event("startup")
+async def start_loop_watchdog():
+    """Watch this worker's event loop for blocking calls"""
+    if LOOP_WATCHDOG:
+        loop_watchdog.start(asyncio.get_running_loop())
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    """Start the off-peak weekly report pre-generation and resume polling unfinished batch jobs"""
+    # With --workers N only the worker that gets the lock runs them; the lock
+    # is released when that process exits
+    if not background_jobs_lock.enter_context(file_lock(OUTPUT_DIR / "background_jobs", blocking=False)):
+        print("⏭️ Background jobs run in another worker")
+        return
+    if WEEKLY_REPORT_SCHEDULER:
+        weekly_report_scheduler.start()
+    resume_pending_jobs()
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    """Stop background jobs on shutdown"""
+    loop_watchdog.stop()
+    weekly_report_scheduler.stop()
+    background_jobs_lock.close()
 
 
 @app.get("/")
@@ -53,22 +149,21 @@ async def root():
 
 
 @app.get("/api/non-responsive-subcontractors")
-async def get_non_responsive_subcontractors():
-    """Get non-responsive subcontractors data"""
-    data_file = DATA_DIR / "non_responsive_subcontractors.json"
-    
-    if not data_file.exists():
+def get_non_responsive_subcontractors(project: Optional[str] = None):
+    """Threads waiting on a subcontractor's reply, computed from the indexed mailbox"""
+    if responsiveness.ensure_built():
+        return responsiveness.non_responsive_threads(project)
+
+    # No mail indexed yet: fall back to the bundled sample data
+    return responsiveness.sample_threads(project)
+
+
+@app.get("/api/non-responsive-subcontractors/vendors")
+def get_non_responsive_vendors(project: Optional[str] = None):
+    """Per-vendor follow-up and unanswered email counters"""
+    if not responsiveness.ensure_built():
         return []
-    
-    with open(data_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Filter by project if specified
-    # project: Optional[str] = None
-    # if project:
-    #     data = [item for item in data if item.get("project_guess", "").lower() == project.lower()]
-    
-    return data
+    return responsiveness.vendor_summary(project)
 
 
 @app.get("/health")
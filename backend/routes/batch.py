@@ -0,0 +1,51 @@
+"""Batch job routes for bulk summarization and thread analysis"""
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+from services import batch_service
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Batch"]
+)
+
+
+class BatchSummarizeRequest(BaseModel):
+    projects: Optional[List[str]] = None
+
+
+class BatchThreadsRequest(BaseModel):
+    thread_ids: Optional[List[str]] = None
+
+
+@router.post("/batch/summarize")
+def submit_summary_batch(request: BatchSummarizeRequest):
+    """Re-summarize every email of the given projects (all projects by default) as one batch job"""
+    job = batch_service.create_job("summaries", projects=request.projects)
+    if job["status"] != "empty":
+        batch_service.start_polling(job["job_id"])
+    return job
+
+
+@router.post("/batch/analyze-threads")
+def submit_thread_batch(request: BatchThreadsRequest):
+    """Re-analyze indexed email threads (all by default) as one batch job"""
+    job = batch_service.create_job("thread_analyses", thread_ids=request.thread_ids)
+    if job["status"] != "empty":
+        batch_service.start_polling(job["job_id"])
+    return job
+
+
+@router.get("/batch/jobs")
+def list_batch_jobs():
+    """All batch jobs, newest first"""
+    return batch_service.list_jobs()
+
+
+@router.get("/batch/jobs/{job_id}")
+def get_batch_job(job_id: str):
+    """Current state of a batch job (polls the provider and merges results once finished)"""
+    job = batch_service.refresh_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Batch job not found: {job_id}")
+    return job
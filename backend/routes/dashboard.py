@@ -1,10 +1,100 @@
-"""Dashboard-related routes (placeholder)"""
+"""Dashboard-related routes"""
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from datetime import date
+from typing import Optional
+from services import dashboard_rollups, responsiveness
+from services.config import DATA_DIR
+from services.storage import read_json
+import time
 
 router = APIRouter(
     prefix="/api",
     tags=["Dashboard"]
 )
 
-# TODO: Implement dashboard summary endpoints
+# Due dates within this many days count as due soon
+DUE_SOON_DAYS = 7
 
+
+def _project_name(project: Optional[str]) -> Optional[str]:
+    """Project name for a project id or name as passed by the frontend"""
+    if not project:
+        return None
+    demo_data = read_json(DATA_DIR / "demo_emails.json", default={}) or {}
+    for p in demo_data.get("projects", []):
+        if project in (p.get("project_id"), p.get("project_name")):
+            return p.get("project_name")
+    return project
+
+
+def _build_summary(project: Optional[str], role: Optional[str]) -> dict:
+    dashboard_rollups.ensure_built()
+    emails = dashboard_rollups.email_totals(project, role)
+    threads = dashboard_rollups.thread_totals(project)
+
+    # Step 1: Due dates relative to today
+    today = date.today()
+    overdue = due_soon = 0
+    for due_date, count in emails["due_dates"].items():
+        try:
+            days_left = (date.fromisoformat(due_date) - today).days
+        except ValueError:
+            continue
+        if days_left < 0:
+            overdue += count
+        elif days_left <= DUE_SOON_DAYS:
+            due_soon += count
+
+    # Step 2: Risk of the threads still awaiting a reply
+    now = time.time()
+    by_risk = {"HIGH": 0, "MEDIUM": 0, "LOW": 0}
+    waiting_days = []
+    for unanswered, waiting_since in threads["awaiting"].values():
+        days_waiting = responsiveness.days_waiting_since(waiting_since, now)
+        by_risk[responsiveness.risk_level(unanswered, days_waiting)] += 1
+        waiting_days.append(days_waiting)
+
+    histogram = threads["response_histogram"]
+    return {
+        "project": project,
+        "role": role,
+        "emails": {
+            "total": emails["total"],
+            "by_category": emails["by_category"],
+            "by_priority": emails["by_priority"],
+            "overdue": overdue,
+            "due_soon": due_soon
+        },
+        "responsiveness": {
+            "threads": threads["threads"],
+            "awaiting_reply": len(threads["awaiting"]),
+            "by_risk": by_risk,
+            "follow_up_count": threads["follow_up_count"],
+            "unanswered_emails": threads["unanswered_emails"],
+            "avg_gap_days": round(threads["gap_days_sum"] / threads["gap_days_count"], 1) if threads["gap_days_count"] else 0.0,
+            "max_days_waiting": max(waiting_days, default=0.0),
+            "response_time_hours": {
+                "replies": sum(histogram),
+                "p50": dashboard_rollups.histogram_percentile(histogram, 50),
+                "p90": dashboard_rollups.histogram_percentile(histogram, 90),
+                "p95": dashboard_rollups.histogram_percentile(histogram, 95)
+            }
+        },
+        # Shape of the ProjectStatusPie props
+        "project_status": {
+            "onTrack": 1 if project and not threads["awaiting"] else 0,
+            "atRisk": by_risk["MEDIUM"],
+            "delayed": by_risk["HIGH"]
+        }
+    }
+
+
+@router.get("/dashboard/summary")
+async def get_dashboard_summary(project: Optional[str] = None, role: Optional[str] = None):
+    """
+    Counts by category/priority/risk, overdue due dates and response-time
+    percentiles for the dashboard cards, read from precomputed rollups.
+    The role filter applies to email counts; thread counters are per project.
+    """
+    return await run_in_threadpool(_build_summary, _project_name(project), role)
@@ -0,0 +1,76 @@
+"""Debug routes for request traces, profiles and event loop stalls"""
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from services import tracing
+from services.config import PROFILING_ENABLED
+from services.profiling import SamplingProfiler, save_profile, list_profiles, get_profile, loop_watchdog
+import asyncio
+
+router = APIRouter(
+    prefix="/api",
+    tags=["Debug"]
+)
+
+
+@router.get("/debug/traces/slow")
+async def get_slow_traces(limit: int = Query(20, ge=1, le=1000)):
+    """Slowest recent requests kept by this worker, slowest first"""
+    return tracing.slowest_traces(limit)
+
+
+@router.get("/debug/traces/recent")
+async def get_recent_traces(limit: int = Query(20, ge=1, le=1000)):
+    """Most recent requests traced by this worker, newest first"""
+    return tracing.recent_traces(limit)
+
+
+@router.get("/debug/traces/{trace_id}")
+async def get_trace(trace_id: str, format: str = Query("tree", pattern="^(tree|otlp)$")):
+    """Span tree of one trace, or format=otlp for OTLP/JSON to send to an OpenTelemetry collector"""
+    trace = tracing.get_trace(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace not found: {trace_id}")
+    return tracing.to_otlp(trace) if format == "otlp" else tracing.to_tree(trace)
+
+
+def _require_profiling():
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled; start the server with PROFILING=1")
+
+
+@router.post("/debug/profile")
+async def profile_worker(seconds: float = Query(5, gt=0, le=60)):
+    """Sample everything this worker runs for the given number of seconds"""
+    _require_profiling()
+    profiler = SamplingProfiler(f"worker {seconds:g}s").start()
+    await asyncio.sleep(seconds)
+    profile = await asyncio.to_thread(profiler.stop)
+    return {"id": save_profile(profile), **profile}
+
+
+@router.get("/debug/profiles")
+async def get_profiles():
+    """Profiles kept by this worker, newest first"""
+    _require_profiling()
+    return list_profiles()
+
+
+@router.get("/debug/profiles/{profile_id}")
+async def get_profile_by_id(profile_id: str, format: str = Query("json", pattern="^(json|folded)$")):
+    """One profile, or format=folded for folded stacks to feed flamegraph.pl or speedscope"""
+    _require_profiling()
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    if format == "folded":
+        return PlainTextResponse(profile["folded"] + "\n")
+    return profile
+
+
+@router.get("/debug/event-loop/blocking")
+async def get_event_loop_blocking(limit: int = Query(50, ge=1, le=1000)):
+    """Times this worker's event loop was blocked, with the stack that blocked it, newest first"""
+    return {
+        "threshold_ms": round(loop_watchdog.threshold * 1000, 1),
+        "events": loop_watchdog.blocking_events(limit)
+    }
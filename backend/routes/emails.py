@@ -1,24 +1,61 @@
 """Email-related routes"""
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
 from services.email_service import (
     fetch_gmail_emails_internal,
-    group_emails_into_threads,
     ai_semantic_filter
 )
-from services.openai_service import openai_client
-from services.prompts import SYSTEM_PROMPT
-from services.config import DATA_DIR, OUTPUT_DIR
+from services.thread_index import index_new_emails
+from services.openai_service import structured_completion, StructuredOutputError, CircuitOpenError
+from services.llm_scheduler import INTERACTIVE
+from services.single_flight import SingleFlight, request_key
+from services.llm_schemas import EmailSummary, ReplySuggestions, ThreadAnalysis
+from services.tokenizer import truncate_to_tokens
+from services.email_analysis import (
+    SUMMARY_PARAMS,
+    THREAD_ANALYSIS_PARAMS,
+    THREAD_PROMPT_TOKEN_BUDGET,
+    load_project_emails,
+    summary_prompt,
+    summary_fallback,
+    summary_record,
+    merge_summaries,
+    summaries_file_for,
+    ANALYSIS_FILE,
+    thread_analysis_prompt,
+    thread_analysis_fallback,
+    merge_thread_analyses
+)
+from services.prompts import EMAIL_SUMMARY_TEMPLATE, AI_REPLY_TEMPLATE, THREAD_ANALYSIS_TEMPLATE
+from services.config import (
+    DATA_DIR,
+    OUTPUT_DIR,
+    ANALYZE_CONCURRENCY,
+    LLM_HEDGE_AFTER_SECONDS,
+    LLM_INTERACTIVE_TIMEOUT
+)
+from services.storage import append_text
+from services.metrics import stage_timer
+from services import tracing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
-from pathlib import Path
 
 router = APIRouter(
     prefix="/api",
     tags=["Emails"]
 )
 
+# Token budget for the email body in the reply prompt: a ceiling for unusually
+# long emails, not a cut; a reply needs the whole message it answers
+REPLY_BODY_TOKENS = 300
+
+# Concurrent identical summarize / email-list requests share one computation
+summarize_flight = SingleFlight("summarize")
+data_flight = SingleFlight("data_emails")
+
 
 class SummarizeRequest(BaseModel):
     project: str
@@ -41,6 +78,7 @@ class SendEmailRequest(BaseModel):
 def fetch_gmail_emails():
     """Fetch 10 recent Gmail messages and save to JSON file"""
     emails = fetch_gmail_emails_internal()
+    index_new_emails(emails)
     
     return JSONResponse({
         "status": "success",
@@ -52,24 +90,9 @@ def fetch_gmail_emails():
 
 async def _summarize_emails(project: str, category: str = "All", priority: str = None, role: str = None):
     """Core summarization logic with AI-based semantic filtering"""
-    # Load emails from demo_emails.json
-    demo_file = DATA_DIR / "demo_emails.json"
-    emails = []
-    
-    if demo_file.exists():
-        with open(demo_file, 'r', encoding='utf-8') as f:
-            demo_data = json.load(f)
-        
-        project_data = next((p for p in demo_data.get("projects", []) if p.get("project_name") == project), None)
-        if project_data:
-            emails = project_data.get("emails", [])
-    
-    # Fallback to project-specific JSON file
-    if not emails:
-        project_file = DATA_DIR / f"{project.lower().replace(' ', '_')}.json"
-        if project_file.exists():
-            with open(project_file, 'r', encoding='utf-8') as f:
-                emails = json.load(f)
+    # Load emails from demo_emails.json, falling back to the project-specific JSON file
+    with stage_timer("summarize", "load"):
+        emails = load_project_emails(project)
     
     if not emails:
         raise HTTPException(status_code=404, detail=f"Project data not found: {project}")
@@ -86,11 +109,15 @@ async def _summarize_emails(project: str, category: str = "All", priority: str =
     
     # AI-based semantic category filtering
     if category and norm(category) != "all":
-        filtered_emails = []
-        for email in emails:
-            if await ai_semantic_filter(email, category):
-                filtered_emails.append(email)
-        emails = filtered_emails
+        with stage_timer("summarize", "semantic_filter"):
+            filtered_emails = []
+            for email in emails:
+                with tracing.span("summarize.filter_email", **{"email.id": email.get("id", "")}):
+                    matched = await ai_semantic_filter(email, category)
+                    tracing.set_attribute("filter.matched", matched)
+                if matched:
+                    filtered_emails.append(email)
+            emails = filtered_emails
     
     if not emails:
         return JSONResponse({
@@ -103,82 +130,32 @@ async def _summarize_emails(project: str, category: str = "All", priority: str =
     
     # Process each email through OpenAI
     summaries = []
-    for email in emails:
-        try:
-            completion = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": f"Subject: {email['subject']}\n\nBody: {email['body']}"}
-                ],
-                temperature=0.3,
-                max_tokens=300
-            )
-            
-            ai_response = completion.choices[0].message.content
-            
-            try:
-                clean_response = ai_response.replace("```json", "").replace("```", "").strip()
-                clean_response = clean_response.lstrip().lstrip('{').rstrip().rstrip('}')
-                if not clean_response.startswith('{'):
-                    clean_response = '{' + clean_response
-                if not clean_response.endswith('}'):
-                    clean_response = clean_response + '}'
-                ai_data = json.loads(clean_response)
-            except json.JSONDecodeError as e:
-                ai_data = {
-                    "category": "General",
-                    "summary": ai_response[:200] if ai_response else "Unable to generate summary",
-                    "action_required": "Review required",
-                    "priority": email.get("priority", "Medium"),
-                    "due_date": email.get("due_date", "")
-                }
-            
-            summaries.append({
-                "id": email.get("id", ""),
-                "from": email.get("from", ""),
-                "to": email.get("to", ""),
-                "subject": email.get("subject", ""),
-                "body": email.get("body", ""),
-                **ai_data
-            })
-        except Exception as e:
-            summaries.append({
-                "id": email.get("id", ""),
-                "from": email.get("from", ""),
-                "to": email.get("to", ""),
-                "subject": email.get("subject", ""),
-                "body": email.get("body", ""),
-                "category": "General",
-                "summary": f"Error processing: {str(e)[:100]}",
-                "action_required": "Manual review needed",
-                "priority": email.get("priority", "Medium"),
-                "due_date": email.get("due_date", "")
-            })
-    
-    # Save to output file
-    output_file = OUTPUT_DIR / f"{project.lower().replace(' ', '_')}_summarized.json"
-    
-    # Load existing summaries to merge
-    existing_summaries = []
-    if output_file.exists():
-        try:
-            with open(output_file, 'r', encoding='utf-8') as f:
-                existing_summaries = json.load(f)
-        except:
-            existing_summaries = []
-    
-    existing_dict = {}
-    for s in existing_summaries:
-        email_id = s.get("id") or s.get("from", "") + s.get("subject", "")
-        existing_dict[email_id] = s
-    
-    for s in summaries:
-        email_id = s.get("id") or s.get("from", "") + s.get("subject", "")
-        existing_dict[email_id] = s
+    with stage_timer("summarize", "llm"):
+        for email in emails:
+            with tracing.span("summarize.email", **{"email.id": email.get("id", "")}):
+                try:
+                    try:
+                        ai_data = (await run_in_threadpool(
+                            structured_completion,
+                            EMAIL_SUMMARY_TEMPLATE,
+                            summary_prompt(email),
+                            EmailSummary,
+                            **SUMMARY_PARAMS
+                        )).model_dump()
+                    except StructuredOutputError as e:
+                        ai_data = summary_fallback(email)
+                        tracing.set_attribute("summary.fallback", True)
+                    
+                    summaries.append(summary_record(email, ai_data))
+                except Exception as e:
+                    tracing.set_attribute("summary.fallback", True)
+                    summaries.append(summary_record(email, summary_fallback(
+                        email, f"Error processing: {str(e)[:100]}", "Manual review needed"
+                    )))
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(list(existing_dict.values()), f, indent=2, ensure_ascii=False)
+    # Save to output file, merged with existing summaries
+    with stage_timer("summarize", "save"):
+        merge_summaries(project, summaries)
     
     return JSONResponse({
         "success": True,
@@ -189,6 +166,11 @@ async def _summarize_emails(project: str, category: str = "All", priority: str =
     })
 
 
+def _summarize_key(project: str, category: str, priority: str, role: str) -> str:
+    """Single-flight key for a summarize request (category and priority match case-insensitively)"""
+    return request_key(project, (category or "All").lower(), (priority or "").lower(), role)
+
+
 @router.get("/summarize")
 async def summarize_inbox_get(
     project: str = Query(..., description="Project name to summarize emails for"),
@@ -197,19 +179,25 @@ async def summarize_inbox_get(
     role: Optional[str] = Query(None, description="Filter by role visibility")
 ):
     """Summarize emails for a specific project with optional filters (GET endpoint)"""
-    return await _summarize_emails(project, category or "All", priority, role)
+    return await summarize_flight.do_async(
+        _summarize_key(project, category, priority, role),
+        _summarize_emails, project, category or "All", priority, role
+    )
 
 
 @router.post("/summarize")
 async def summarize_inbox_post(request: SummarizeRequest):
     """Summarize emails for a specific project with optional filters (POST endpoint)"""
-    return await _summarize_emails(request.project, request.category or "All", request.priority, request.role)
+    return await summarize_flight.do_async(
+        _summarize_key(request.project, request.category, request.priority, request.role),
+        _summarize_emails, request.project, request.category or "All", request.priority, request.role
+    )
 
 
 @router.get("/data")
 async def get_summarized_data(project: str, category: str = "All"):
     """Get summarized data for a project, optionally filtered by category"""
-    output_file = OUTPUT_DIR / f"{project.lower().replace(' ', '_')}_summarized.json"
+    output_file = summaries_file_for(project)
     
     if not output_file.exists():
         return []
@@ -255,6 +243,12 @@ async def get_roles():
 @router.get("/data/emails")
 async def get_emails(project: str | None = None, category: str | None = None, priority: str | None = None, role: str | None = None):
     """Return filtered emails from demo_emails.json."""
+    key = request_key(project, (category or "").lower(), (priority or "").lower(), role)
+    return await data_flight.do_async(key, run_in_threadpool, _load_demo_emails, project, category, priority, role)
+
+
+def _load_demo_emails(project: str = None, category: str = None, priority: str = None, role: str = None) -> list:
+    """Read demo_emails.json and apply the project/category/priority/role filters"""
     demo_file = DATA_DIR / "demo_emails.json"
     if not demo_file.exists():
         return []
@@ -296,66 +290,31 @@ async def generate_ai_reply(request: AIReplyRequest):
         from_email = email.get("from", "")
         category = email.get("category", "")
         
-        prompt = f"""You are an AI assistant for a construction company project management team.
-        
-Based on the following email, generate 3 professional, concise reply options that are contextually appropriate for construction project management.
-
-Email Details:
+        email_details = f"""Email Details:
 - From: {from_email}
 - Subject: {subject}
 - Category: {category}
 - Summary: {summary}
-- Body: {body[:500]}
-
-Generate 3 reply options that:
-1. Are professional and appropriate for construction project communication
-2. Address the key points or questions in the email
-3. Are concise (2-4 sentences each)
-4. Vary in tone (professional, helpful, action-oriented)
-
-Return ONLY a JSON array of 3 reply strings, like this:
-["Reply option 1", "Reply option 2", "Reply option 3"]
-
-Do not include any markdown formatting, just the JSON array."""
+- Body: {truncate_to_tokens(body, REPLY_BODY_TOKENS)}"""
         
-        completion = openai_client.chat.completions.create(
+        suggestions = await run_in_threadpool(
+            structured_completion,
+            AI_REPLY_TEMPLATE,
+            email_details,
+            ReplySuggestions,
+            hedge_after=LLM_HEDGE_AFTER_SECONDS or None,
+            priority=INTERACTIVE,
+            timeout=LLM_INTERACTIVE_TIMEOUT,
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that generates professional email replies for construction project management."},
-                {"role": "user", "content": prompt}
-            ],
             temperature=0.7,
             max_tokens=400
         )
         
-        ai_response = completion.choices[0].message.content
-        
-        try:
-            clean_response = ai_response.strip()
-            if clean_response.startswith("```"):
-                clean_response = clean_response.split("```")[1]
-                if clean_response.startswith("json"):
-                    clean_response = clean_response[4:]
-            clean_response = clean_response.strip()
-            
-            replies = json.loads(clean_response)
-            
-            if isinstance(replies, list) and len(replies) > 0:
-                return JSONResponse({"replies": replies[:3]})
-            else:
-                if isinstance(replies, str):
-                    replies = [replies]
-        except json.JSONDecodeError:
-            lines = [line.strip() for line in ai_response.split('\n') if line.strip()]
-            replies = [line for line in lines if line and not line.startswith('#') and len(line) > 20][:3]
-            
-            if not replies:
-                replies = [ai_response[:300]]
-        
-        return JSONResponse({"replies": replies})
+        return JSONResponse({"replies": suggestions.replies[:3]})
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate AI replies: {str(e)}")
+        status_code = 503 if isinstance(e, CircuitOpenError) else 500
+        raise HTTPException(status_code=status_code, detail=f"Failed to generate AI replies: {str(e)}")
 
 
 @router.post("/sendEmail")
@@ -378,9 +337,7 @@ async def send_email(request: SendEmailRequest):
         print(f"Body:\n{request.body}")
         print(f"{'='*60}\n")
         
-        log_file = OUTPUT_DIR / "sent_emails.log"
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(f"\n{json.dumps(email_data, ensure_ascii=False, indent=2)}\n")
+        append_text(OUTPUT_DIR / "sent_emails.log", f"\n{json.dumps(email_data, ensure_ascii=False, indent=2)}\n")
         
         return JSONResponse({
             "status": "sent",
@@ -399,24 +356,21 @@ def analyze_emails():
     
     try:
         # Step 1: Fetch emails
-        emails = fetch_gmail_emails_internal()
-        
-        # Step 2: Group emails into threads
-        threads = group_emails_into_threads(emails)
+        with stage_timer("analyze_emails", "fetch"):
+            emails = fetch_gmail_emails_internal()
         
-        # Step 3: Analyze each thread with AI
-        analyses = []
-        for thread_key, thread_emails in threads.items():
-            if thread_emails:
-                analysis = analyze_email_thread_with_ai(thread_emails)
-                analyses.append(analysis)
+        # Step 2: Add new mail to the persistent thread index and get the affected threads
+        with stage_timer("analyze_emails", "index"):
+            threads = index_new_emails(emails)
         
-        # Step 4: Save analysis results
-        analysis_file = OUTPUT_DIR / "ai_inbox_analysis.json"
-        with open(analysis_file, "w", encoding="utf-8") as f:
-            json.dump(analyses, f, indent=2, ensure_ascii=False)
+        # Step 3: Analyze threads concurrently, merging results into the store as each one finishes
+        analysis_file = ANALYSIS_FILE
+        with stage_timer("analyze_emails", "llm"):
+            analyses = _analyze_threads_concurrently(
+                {thread_id: thread_emails for thread_id, thread_emails in threads.items() if thread_emails}
+            )
         
-        # Step 5: Return results
+        # Step 4: Return results
         return JSONResponse({
             "status": "success",
             "thread_count": len(analyses),
@@ -429,138 +383,61 @@ def analyze_emails():
         raise HTTPException(status_code=500, detail=f"Email analysis failed: {str(e)}")
 
 
+def _analyze_threads_concurrently(threads: dict) -> list:
+    """Run thread analyses on a bounded pool, merging each completed result into the store
+
+    Results are merged by thread id, so concurrent runs (and batch jobs)
+    only replace the threads they analyzed.
+    """
+    thread_ids = list(threads)
+    results = [None] * len(thread_ids)
+    
+    def analyze(thread_id):
+        thread_emails = threads[thread_id]
+        attributes = {
+            "thread.subject": thread_emails[0].get("subject", ""),
+            "thread.emails": len(thread_emails),
+            "email.ids": ",".join(e.get("id", "") for e in thread_emails)
+        }
+        with tracing.span("analyze_emails.thread", **attributes):
+            analysis = analyze_email_thread_with_ai(thread_emails)
+        return {**analysis, "thread_id": thread_id, "thread_subject": thread_emails[0].get("subject", "")}
+    
+    with ThreadPoolExecutor(max_workers=max(1, ANALYZE_CONCURRENCY)) as executor:
+        futures = {
+            executor.submit(tracing.in_current_context(analyze), thread_id): position
+            for position, thread_id in enumerate(thread_ids)
+        }
+        for future in as_completed(futures):
+            # analyze_email_thread_with_ai returns a fallback dict on failure, so one
+            # thread's error never affects the others
+            results[futures[future]] = future.result()
+            merge_thread_analyses([results[futures[future]]])
+    
+    return results
+
+
 def analyze_email_thread_with_ai(thread_emails: list) -> dict:
     """Analyze an email thread using AI with few-shot chain-of-thought reasoning"""
     
-    system_prompt = """You are an AI analyst that reviews construction project email threads and identifies communication patterns, responsiveness issues, and schedule risks.
-
-Think step-by-step internally but output only valid JSON matching the schema provided. Do not include explanations or reasoning in your response."""
-
-    user_prompt = """You will receive a single email thread as an array of objects. Each object has: id, from, subject, date, snippet, body.
-
-TASK:
-1. Group all related emails.
-2. Determine if follow-up behavior exists (repeated requests from same sender).
-3. Check if there is any reply from the recipient.
-4. Infer project context and risk level.
-5. Output structured JSON ONLY matching the schema below.
-
-FEW-SHOT EXAMPLES:
-
-EXAMPLE 1 INPUT:
-[
-  {"from":"pm@builder.com","subject":"RFI #205 - Ceiling Type Confirmation","date":"2025-09-10 10:00","body":"Please confirm ceiling type for Corridor A."},
-  {"from":"architect@consultant.com","subject":"Re: RFI #205 - Ceiling Type Confirmation","date":"2025-09-11 12:00","body":"Confirmed: ACT ceiling as per Section 095123."}
-]
-
-EXAMPLE 1 OUTPUT:
-{
-  "thread_subject": "RFI #205 - Ceiling Type Confirmation",
-  "project_guess": "Corridor A",
-  "participants": {
-    "from_domain": "builder.com",
-    "to_domain": "consultant.com",
-    "senders": ["pm@builder.com"],
-    "receivers": ["architect@consultant.com"]
-  },
-  "counts": { "total_emails": 2, "follow_up_count": 1, "unanswered_emails": 0 },
-  "timeline": { "first_email_date": "2025-09-10", "last_email_date": "2025-09-11", "days_between_first_and_last": 1 },
-  "response_detected": true,
-  "issue_detected": "RFI answered promptly",
-  "impact_area": "Design Clarification",
-  "risk_level": "LOW",
-  "reason": "Consultant responded within 1 day.",
-  "recommended_action": "Close RFI in project log.",
-  "kpis": { "avg_gap_days": 1.0, "last_gap_days": 1.0 }
-}
-
-EXAMPLE 2 INPUT:
-[
-  {"from":"sarah.chen@carma-build.com","subject":"Ship Date Needed for Penthouse A Custom Casework","date":"2025-10-18 10:42","body":"Requesting ship date for Penthouse A cabinetry."},
-  {"from":"sarah.chen@carma-build.com","subject":"Follow-Up – Ship Date for Penthouse A Casework","date":"2025-10-21 09:05","body":"Following up on ship date request."},
-  {"from":"sarah.chen@carma-build.com","subject":"URGENT – Penthouse A Casework Ship Date Required","date":"2025-10-24 08:14","body":"Third request. Coordination meeting on Friday; need confirmation."}
-]
-
-EXAMPLE 2 OUTPUT:
-{
-  "thread_subject": "Ship Date Needed for Penthouse A Custom Casework",
-  "project_guess": "Penthouse A",
-  "participants": {
-    "from_domain": "carma-build.com",
-    "to_domain": "elitemillwork.com",
-    "senders": ["sarah.chen@carma-build.com"],
-    "receivers": []
-  },
-  "counts": { "total_emails": 3, "follow_up_count": 3, "unanswered_emails": 3 },
-  "timeline": { "first_email_date": "2025-10-18", "last_email_date": "2025-10-24", "days_between_first_and_last": 6 },
-  "response_detected": false,
-  "issue_detected": "Non-responsive subcontractor",
-  "impact_area": "Procurement/Schedule",
-  "risk_level": "HIGH",
-  "reason": "Multiple follow-ups with no reply from vendor; possible delay.",
-  "recommended_action": "Escalate to vendor leadership and PM; mark procurement risk.",
-  "kpis": { "avg_gap_days": 2.0, "last_gap_days": 3.0 }
-}
-
-NOW ANALYZE THIS THREAD:
-"""
-
-    thread_data = json.dumps(thread_emails, indent=2)
-    full_prompt = user_prompt + thread_data
-
     try:
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": full_prompt}
-            ],
-            temperature=0.2,
-            max_tokens=1000
+        return structured_completion(
+            THREAD_ANALYSIS_TEMPLATE,
+            thread_analysis_prompt(thread_emails),
+            ThreadAnalysis,
+            max_input_tokens=THREAD_PROMPT_TOKEN_BUDGET,
+            **THREAD_ANALYSIS_PARAMS
+        ).model_dump()
+    
+    except StructuredOutputError as e:
+        print(f"AI analysis parse error: {str(e)}")
+        return thread_analysis_fallback(
+            thread_emails, "AI parsing error", "Failed to parse AI response", "Manual review required"
         )
-        
-        ai_response = completion.choices[0].message.content
-        
-        try:
-            clean_response = ai_response.strip()
-            if clean_response.startswith("```"):
-                clean_response = clean_response.split("```")[1]
-                if clean_response.startswith("json"):
-                    clean_response = clean_response[4:]
-            clean_response = clean_response.strip()
-            
-            analysis = json.loads(clean_response)
-            return analysis
-        except json.JSONDecodeError:
-            return {
-                "thread_subject": thread_emails[0].get("subject", "") if thread_emails else "",
-                "project_guess": "Unknown",
-                "participants": {},
-                "counts": {"total_emails": len(thread_emails), "follow_up_count": 0, "unanswered_emails": 0},
-                "timeline": {},
-                "response_detected": False,
-                "issue_detected": "AI parsing error",
-                "impact_area": "Unknown",
-                "risk_level": "UNKNOWN",
-                "reason": "Failed to parse AI response",
-                "recommended_action": "Manual review required",
-                "kpis": {"avg_gap_days": 0, "last_gap_days": 0}
-            }
     
     except Exception as e:
         print(f"AI analysis error: {str(e)}")
-        return {
-            "thread_subject": thread_emails[0].get("subject", "") if thread_emails else "",
-            "project_guess": "Unknown",
-            "participants": {},
-            "counts": {"total_emails": len(thread_emails), "follow_up_count": 0, "unanswered_emails": 0},
-            "timeline": {},
-            "response_detected": False,
-            "issue_detected": f"AI call failed: {str(e)}",
-            "impact_area": "Unknown",
-            "risk_level": "UNKNOWN",
-            "reason": "OpenAI API error",
-            "recommended_action": "Retry or manual review",
-            "kpis": {"avg_gap_days": 0, "last_gap_days": 0}
-        }
+        return thread_analysis_fallback(
+            thread_emails, f"AI call failed: {str(e)}", "OpenAI API error", "Retry or manual review"
+        )
 
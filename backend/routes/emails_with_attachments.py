@@ -1,10 +1,19 @@
 """Email routes with attachment handling"""
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
-from services.email_service import get_gmail_service, clean_email_body, extract_email_address
-from services.config import DATA_DIR
+from fastapi.responses import JSONResponse, FileResponse
+from services.email_service import (
+    get_gmail_service,
+    gmail_execute,
+    clean_email_body,
+    extract_email_address,
+    extract_message_headers
+)
+from services.thread_index import index_new_emails
+from services import attachment_store
+from services.config import DATA_DIR, EMAIL_STRIP_QUOTES
+from services.storage import write_json
+from services.metrics import record_cache
 import html
-import json
 import base64
 from pathlib import Path
 
@@ -18,24 +27,27 @@ router = APIRouter(
 def fetch_gmail_emails_with_attachments():
     """
     Fetch the latest Gmail emails (max 10) and download attachments if present.
-    Save attachments to /data/attachments/.
+    Attachments are stored by SHA-256 under /data/attachments/blobs/; ones
+    already in the store are not downloaded again.
     """
     service = get_gmail_service()
 
     try:
         # Fetch recent messages
-        results = service.users().messages().list(userId="me", maxResults=10).execute()
+        results = gmail_execute(service.users().messages().list(userId="me", maxResults=10), "messages.list")
         messages = results.get("messages", [])
 
         emails = []
+        attachment_index = attachment_store.load_index()
 
         # Parse each email
         for msg in messages:
-            msg_data = service.users().messages().get(userId="me", id=msg["id"]).execute()
+            msg_data = gmail_execute(service.users().messages().get(userId="me", id=msg["id"]), "messages.get")
             payload = msg_data.get("payload", {})
             headers = payload.get("headers", [])
             subject = next((h["value"] for h in headers if h["name"] == "Subject"), "")
             sender = next((h["value"] for h in headers if h["name"] == "From"), "")
+            recipients = next((h["value"] for h in headers if h["name"] == "To"), "")
             date = next((h["value"] for h in headers if h["name"] == "Date"), "")
             snippet = msg_data.get("snippet", "")
 
@@ -62,7 +74,7 @@ def fetch_gmail_emails_with_attachments():
                     raw_body = base64.urlsafe_b64decode(body_data).decode("utf-8", errors="ignore")
 
             # Clean the email body
-            cleaned_body = clean_email_body(raw_body)
+            cleaned_body = clean_email_body(raw_body, strip_quotes=EMAIL_STRIP_QUOTES)
             
             # Clean sender email address
             clean_sender = extract_email_address(sender)
@@ -70,7 +82,7 @@ def fetch_gmail_emails_with_attachments():
             # Clean snippet
             clean_snippet = html.unescape(snippet)
 
-            # Process attachments
+            # Process attachments (downloads only those not already in the store)
             attachments_list = []
             try:
                 for part in payload.get("parts", []):
@@ -78,61 +90,65 @@ def fetch_gmail_emails_with_attachments():
                         filename = part.get("filename")
                         attachment_id = part.get("body", {}).get("attachmentId")
                         mime_type = part.get("mimeType", "")
-                        
-                        # Download attachment
-                        attachment = service.users().messages().attachments().get(
-                            userId="me",
-                            messageId=msg["id"],
-                            id=attachment_id
-                        ).execute()
-                        
-                        # Decode Base64 data
-                        file_data = base64.urlsafe_b64decode(attachment["data"].encode("UTF-8"))
-                        
-                        # Save file
-                        attachments_dir = DATA_DIR / "attachments"
-                        attachments_dir.mkdir(parents=True, exist_ok=True)
-                        file_path = attachments_dir / filename
-                        
-                        with open(file_path, "wb") as f:
-                            f.write(file_data)
-                        
+
+                        entry = attachment_store.find_attachment(attachment_index, msg["id"], filename, attachment_id)
+                        downloaded = entry is None
+                        record_cache("attachment", not downloaded)
+                        if downloaded:
+                            # Download attachment
+                            attachment = gmail_execute(service.users().messages().attachments().get(
+                                userId="me",
+                                messageId=msg["id"],
+                                id=attachment_id
+                            ), "messages.attachments.get")
+
+                            # Decode Base64 data in chunks into the content-addressed store
+                            entry = attachment_store.save_attachment(
+                                attachment_index, msg["id"], attachment_id, filename, mime_type, attachment.pop("data", "")
+                            )
+                            del attachment
+
                         # Add to attachments list
                         attachments_list.append({
                             "filename": filename,
-                            "path": str(file_path),
+                            "path": str(attachment_store.blob_path(entry["sha256"])),
+                            "sha256": entry["sha256"],
                             "mimeType": mime_type,
-                            "size_kb": round(len(file_data) / 1024, 2)
+                            "size_kb": round(entry["size"] / 1024, 2),
+                            "downloaded": downloaded
                         })
-                        
-                        print(f"📎 Attachment saved: {filename} ({len(file_data)} bytes)")
-                
+
                 if attachments_list:
                     print(f"📎 {len(attachments_list)} attachments fetched for email: {subject}")
-            
+
             except Exception as e:
                 print(f"Warning: Failed to process attachments for email {subject}: {str(e)}")
                 # Continue processing even if attachment download fails
+            finally:
+                attachment_store.save_index(attachment_index)
 
             # Format and add to emails list
             email_obj = {
                 "id": msg["id"],
                 "from": clean_sender,
+                "to": recipients,
                 "subject": subject,
                 "date": date,
                 "snippet": clean_snippet,
                 "body": cleaned_body,
                 "clean_status": "ok",
                 "attachments": attachments_list,
-                "has_attachments": len(attachments_list) > 0
+                "has_attachments": len(attachments_list) > 0,
+                **extract_message_headers(headers)
             }
             
             emails.append(email_obj)
 
         # Save emails with attachments to JSON file
         emails_file = DATA_DIR / "emails_with_attachments.json"
-        with open(emails_file, "w", encoding="utf-8") as f:
-            json.dump(emails, f, indent=2, ensure_ascii=False)
+        write_json(emails_file, emails)
+        
+        index_new_emails(emails)
 
         return JSONResponse({
             "status": "success",
@@ -145,3 +161,14 @@ def fetch_gmail_emails_with_attachments():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch Gmail messages with attachments: {str(e)}")
 
+
+
+@router.get("/attachments/{sha256}")
+def get_attachment(sha256: str, download: bool = False):
+    """Metadata of a stored attachment by SHA-256, or the file itself with ?download=true"""
+    blob = attachment_store.get_blob(sha256)
+    if blob is None:
+        raise HTTPException(status_code=404, detail=f"Attachment not found: {sha256}")
+    if download:
+        return FileResponse(blob["path"], media_type=blob.get("mime_type") or None, filename=blob["filenames"][0])
+    return {**blob, "path": str(blob["path"])}
@@ -0,0 +1,49 @@
+"""LLM usage routes"""
+from fastapi import APIRouter
+from services.llm_metrics import get_llm_metrics
+from services.openai_service import circuit_breaker, get_llm_backend
+from services.llm_scheduler import llm_scheduler
+from services.shared_cache import shared_cache
+from services.prompts import TEMPLATES, PROMPT_CACHE_MIN_TOKENS
+
+router = APIRouter(
+    prefix="/api",
+    tags=["LLM"]
+)
+
+
+@router.get("/llm/metrics")
+async def llm_metrics():
+    """Per-call-site LLM call counts, token usage (including cached prompt tokens) and latency"""
+    return get_llm_metrics()
+
+
+@router.get("/llm/prompt-prefixes")
+def llm_prompt_prefixes():
+    """Static prefix size of each prompt template and whether it is long enough for the provider's prompt cache"""
+    return [
+        {
+            "template": template.name,
+            "prefix_tokens": template.prefix_tokens(),
+            "provider_cacheable": template.prefix_tokens() >= PROMPT_CACHE_MIN_TOKENS
+        }
+        for template in TEMPLATES
+    ]
+
+
+@router.get("/llm/health")
+async def llm_health():
+    """Active LLM backend and circuit breaker state"""
+    return {"backend": get_llm_backend().name, **circuit_breaker.status()}
+
+
+@router.get("/llm/scheduler")
+async def llm_scheduler_status():
+    """Rate-limit scheduler queue depth, wait times and remaining capacity per priority class"""
+    return llm_scheduler.status()
+
+
+@router.get("/llm/shared-cache")
+async def llm_shared_cache_status():
+    """Cross-worker LLM cache counters for this worker: hits, calls made, and calls that waited on another worker"""
+    return shared_cache.stats()
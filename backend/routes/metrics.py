@@ -0,0 +1,47 @@
+"""Prometheus metrics route"""
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services import metrics
+from services.llm_scheduler import llm_scheduler
+from services.openai_service import circuit_breaker
+from services.shared_cache import shared_cache
+from services.single_flight import flights
+
+# Served at /metrics (not under /api), where Prometheus scrapes by default
+router = APIRouter(
+    tags=["Metrics"]
+)
+
+
+def _collect_llm() -> list:
+    """Scheduler queue depth, circuit breaker state and request coalescing counters"""
+    scheduler = llm_scheduler.status()
+    circuit = circuit_breaker.status()
+    flight_stats = [(flight.name, flight.stats()) for flight in flights]
+    return [
+        ("llm_scheduler_queue_depth", "gauge", "LLM calls waiting for rate-limit capacity",
+         [({"priority": name}, c["queue_depth"]) for name, c in scheduler["classes"].items()]),
+        ("llm_scheduler_admitted_total", "counter", "LLM calls admitted by the rate-limit scheduler",
+         [({"priority": name}, c["admitted"]) for name, c in scheduler["classes"].items()]),
+        ("llm_scheduler_capacity", "gauge", "Remaining rate-limit capacity",
+         [({"resource": "requests"}, scheduler["requests_available"]),
+          ({"resource": "tokens"}, scheduler["tokens_available"])]),
+        ("llm_circuit_state", "gauge", "1 for the circuit breaker's current state",
+         [({"state": state}, 1 if circuit["state"] == state else 0) for state in ("closed", "open", "half_open")]),
+        ("single_flight_calls_total", "counter", "Calls that ran vs joined an identical in-flight call",
+         [({"flight": name, "result": result}, stats[result])
+          for name, stats in flight_stats for result in ("executed", "coalesced")]),
+        ("single_flight_in_flight", "gauge", "Computations currently in flight",
+         [({"flight": name}, stats["in_flight"]) for name, stats in flight_stats]),
+        ("llm_shared_cache_requests_total", "counter", "Cross-worker LLM cache: hits, computed here, or waited on another worker",
+         [({"result": result}, count) for result, count in shared_cache.stats().items()])
+    ]
+
+
+metrics.register_collector(_collect_llm)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request latency, LLM usage, cache hit/miss, Gmail API and pipeline stage metrics in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
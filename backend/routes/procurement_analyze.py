@@ -1,10 +1,19 @@
 """Procurement analysis routes"""
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
-from services.openai_service import openai_client
+from services.openai_service import structured_completion, StructuredOutputError
+from services.llm_schemas import ProcurementAnalysis
+from services.prompts import PROCUREMENT_TEMPLATE
+from services.prompt_encoding import encode_records, estimate_tokens
+from services.tokenizer import pack_to_budget
 from services.config import DATA_DIR, OUTPUT_DIR
-import json
-import pandas as pd
+from services.storage import write_json, file_lock
+from services.metrics import stage_timer, record_cache, EXCEL_PARSE_SECONDS
+from services import tracing
+from services import procurement_store, attachment_store
+from collections import Counter
+from datetime import datetime
+from typing import Optional
 from pathlib import Path
 
 router = APIRouter(
@@ -13,21 +22,50 @@ router = APIRouter(
 )
 
 
+# Estimated input tokens of vendor data per classification call
+VENDOR_BATCH_TOKENS = 3000
+
+
 def get_procurement_attachments_dir():
     """Get the attachments directory path"""
     return DATA_DIR / "attachments"
 
 
+def get_procurement_files(sha256: Optional[str] = None) -> dict:
+    """Excel logs to analyze by filename: files placed in /data/attachments/ plus the
+    latest stored version of each fetched attachment, or just the blob with this SHA-256"""
+    if sha256:
+        blob = attachment_store.get_blob(sha256)
+        if blob is None:
+            raise HTTPException(status_code=404, detail=f"Attachment not found: {sha256}")
+        return {blob["filenames"][0]: (blob["path"], blob["sha256"])}
+
+    files = {f.name: (f, None) for f in get_procurement_attachments_dir().glob("*.xlsx")}
+    for filename, entry in attachment_store.latest_files(".xlsx").items():
+        files[filename] = (attachment_store.blob_path(entry["sha256"]), entry["sha256"])
+    return files
+
+
 @router.post("/procurement/analyze")
-def analyze_procurement_logs():
+def analyze_procurement_logs(sha256: Optional[str] = None):
     """
     Analyze all procurement log Excel attachments using AI.
     Classify vendors as Complete, Partial, or Incomplete.
+    Only vendors whose rows changed since the last run are sent to the AI.
+    Pass sha256 to analyze a single stored attachment.
     """
-    attachments_dir = get_procurement_attachments_dir()
-    
+    # One run at a time across workers: a second run waits and then finds the
+    # vendors already classified instead of sending them to the AI again
+    with file_lock(procurement_store.STORE_FILE):
+        return _analyze_procurement_logs(sha256)
+
+
+def _analyze_procurement_logs(sha256: Optional[str]):
+    import pandas as pd  # deferred: only this endpoint needs it
+
     # Step 1: Find all Excel files
-    excel_files = list(attachments_dir.glob("*.xlsx"))
+    with stage_timer("procurement", "find_files"):
+        excel_files = get_procurement_files(sha256)
     
     if not excel_files:
         raise HTTPException(
@@ -35,141 +73,212 @@ def analyze_procurement_logs():
             detail="No Excel files (.xlsx) found in /data/attachments/"
         )
     
-    # Step 2: Parse all Excel files
-    parsed_data = []
-    for file in excel_files:
-        try:
-            df = pd.read_excel(file)
-            df = df.fillna("")  # Replace NaN with empty string
-            df = df.replace({None: ""})  # Replace None with empty string
+    # Step 2: Parse all Excel files and group rows per vendor
+    with stage_timer("procurement", "parse"):
+        store = procurement_store.load_store()
+        parsed_files = []
+        pending = []  # (filename, vendor_name, rows, rows_hash) needing classification
+        unchanged = 0
+        for filename, (path, file_sha256) in excel_files.items():
+            try:
+                with EXCEL_PARSE_SECONDS.time(), tracing.span("procurement.read_excel", **{"file.name": filename}):
+                    df = pd.read_excel(path, engine="openpyxl")
+                df = df.fillna("")  # Replace NaN with empty string
+                df = df.replace({None: ""})  # Replace None with empty string
             
-            # Convert datetime/timestamp columns to strings for JSON serialization
-            for col in df.columns:
-                if pd.api.types.is_datetime64_any_dtype(df[col]):
-                    df[col] = df[col].astype(str)
+                # Convert datetime/timestamp columns to strings for JSON serialization
+                for col in df.columns:
+                    if pd.api.types.is_datetime64_any_dtype(df[col]):
+                        df[col] = df[col].astype(str)
             
-            parsed_data.append({
-                "filename": file.name,
-                "row_count": len(df),
-                "columns": list(df.columns),
-                "records": df.to_dict(orient="records")[:50]  # Limit to first 50 rows for AI processing
-            })
-        except Exception as e:
-            print(f"Error reading {file.name}: {str(e)}")
-            # Continue processing other files
+                columns = list(df.columns)
+                vendor_column = procurement_store.detect_vendor_column(columns)
+                vendor_rows = procurement_store.group_rows_by_vendor(df.to_dict(orient="records"), vendor_column)
+                changed = procurement_store.find_changed_vendors(store, filename, vendor_rows)
+                record_cache("procurement_vendor", True, len(vendor_rows) - len(changed))
+                record_cache("procurement_vendor", False, len(changed))
+                unchanged += len(vendor_rows) - len(changed)
+            
+                procurement_store.update_file(store, filename, columns, vendor_column, vendor_rows, file_sha256)
+                parsed_files.append(filename)
+                for vendor_name, rows_hash in changed.items():
+                    pending.append((filename, vendor_name, vendor_rows[vendor_name], rows_hash))
+            except Exception as e:
+                print(f"Error reading {filename}: {str(e)}")
+                # Continue processing other files
     
-    if not parsed_data:
+    if not parsed_files:
         raise HTTPException(
             status_code=500,
             detail="Failed to parse any Excel files"
         )
+
+    if not sha256:
+        # Logs that are no longer present drop out of the store and the aggregated analysis
+        for filename in procurement_store.prune_files(store, excel_files):
+            print(f"🗑️ Dropped vendors of removed procurement file {filename}")
     
-    # Step 3: Prepare AI prompt with few-shot examples
-    system_prompt = """You are an AI Procurement Data Analyst specializing in construction project procurement.
-Analyze vendor records from Excel files and classify their completeness.
-Think step-by-step, but output only valid JSON matching the schema."""
-
-    few_shot_example = """EXAMPLE OUTPUT:
-{
-  "vendors": [
-    {
-      "vendor_name": "ABC Electrical",
-      "completeness": "Complete",
-      "missing_fields": [],
-      "remarks": "All required fields filled correctly."
-    },
-    {
-      "vendor_name": "Summit HVAC",
-      "completeness": "Partial",
-      "missing_fields": ["Delivery Date", "Lead Time"],
-      "remarks": "Missing critical delivery information for 2 items."
-    },
-    {
-      "vendor_name": "Elite Millwork",
-      "completeness": "Incomplete",
-      "missing_fields": ["Item Description", "Lead Time", "Status", "Contact"],
-      "remarks": "Incomplete record – missing multiple critical fields."
+    # Step 3: Classify changed vendors in prompt-sized batches
+    with stage_timer("procurement", "classify"):
+        reclassified = 0
+        for batch in _batch_vendors(pending):
+            with tracing.span("procurement.classify_batch", **{"procurement.vendors": len(batch)}):
+                ai_output = _classify_vendors(batch)
+            confidence = ai_output.get("ai_metadata", {}).get("confidence_score")
+            results = _match_classifications(batch, ai_output.get("vendors", []))
+            for filename, vendor_name, rows, rows_hash in batch:
+                classification = results.get(vendor_name)
+                if classification is None:
+                    # Leave the stored hash untouched so the vendor is retried next run
+                    continue
+                procurement_store.record_classification(
+                    store, filename, vendor_name, rows, rows_hash, classification, confidence
+                )
+                reclassified += 1
+            procurement_store.save_store(store)
+    
+        procurement_store.save_store(store)
+    
+    # Step 4: Save aggregated results
+    with stage_timer("procurement", "save"):
+        ai_output = procurement_store.build_analysis(procurement_store.list_vendors(store))
+        output_file = OUTPUT_DIR / "procurement_analysis.json"
+        write_json(output_file, {
+            "input_files": parsed_files,
+            "analyzed_at": datetime.now().isoformat(),
+            "analysis": ai_output
+        })
+    
+    print(f"✅ Procurement analysis saved to: {output_file}")
+    print(f"📊 Reclassified {reclassified} of {ai_output['ai_metadata']['total_vendors']} vendors")
+    
+    # Step 5: Return results
+    return JSONResponse({
+        "status": "success",
+        "file_saved": str(output_file),
+        "files_analyzed": len(parsed_files),
+        "vendors_reclassified": reclassified,
+        "vendors_unchanged": unchanged,
+        "vendors_pending_retry": len(pending) - reclassified,
+        "result": ai_output
+    })
+
+
+@router.get("/procurement/vendors")
+def get_procurement_vendors(file: Optional[str] = None):
+    """Latest stored classification for every vendor, optionally for one file"""
+    store = procurement_store.load_store()
+    return procurement_store.list_vendors(store, file)
+
+
+@router.get("/procurement/vendors/{vendor_name}")
+def get_procurement_vendor(vendor_name: str):
+    """Latest classification for a vendor across all procurement files"""
+    store = procurement_store.load_store()
+    entries = [
+        e for e in procurement_store.list_vendors(store)
+        if e.get("vendor_name", "").lower() == vendor_name.lower()
+    ]
+    if not entries:
+        raise HTTPException(status_code=404, detail=f"Vendor not found: {vendor_name}")
+    return entries
+
+
+@router.get("/procurement/files/{filename}")
+def get_procurement_file(filename: str):
+    """File metadata plus the latest classification of each vendor in it"""
+    store = procurement_store.load_store()
+    file_info = store["files"].get(filename)
+    if not file_info:
+        raise HTTPException(status_code=404, detail=f"Procurement file not analyzed: {filename}")
+    entries = procurement_store.list_vendors(store, filename)
+    return {
+        **file_info,
+        "analysis": procurement_store.build_analysis(entries)
     }
-  ],
-  "ai_metadata": {
-    "total_vendors": 3,
-    "complete": 1,
-    "partial": 1,
-    "incomplete": 1,
-    "confidence_score": 0.91
-  }
-}"""
 
-    user_prompt = f"""PROCUREMENT DATA FROM EXCEL FILES:
-{json.dumps(parsed_data, indent=2)[:15000]}...
 
-TASK:
-1. Analyze each vendor record from the Excel data
-2. Classify completeness as: Complete, Partial, or Incomplete
-3. Identify missing fields for each vendor
-4. Provide remarks explaining the classification
-5. Return summary statistics
+def _batch_vendors(pending: list, max_tokens: int = VENDOR_BATCH_TOKENS) -> list:
+    """Split pending vendors into batches that fit in a single prompt"""
+    batches = []
+    current = []
+    current_size = 0
+    for item in pending:
+        size = estimate_tokens(_encode_vendor(*item[:3]))
+        if current and current_size + size > max_tokens:
+            batches.append(current)
+            current = []
+            current_size = 0
+        current.append(item)
+        current_size += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _match_classifications(batch: list, ai_vendors: list) -> dict:
+    """AI results keyed by the batch's vendor names: exact name first, then a case-insensitive
+    match when it is unambiguous (vendors differing only by case are never mixed up)"""
+    exact = {}
+    folded = {}
+    for vendor in ai_vendors:
+        if isinstance(vendor, dict):
+            name = str(vendor.get("vendor_name", "")).strip()
+            exact.setdefault(name, vendor)
+            folded.setdefault(name.lower(), []).append(vendor)
+
+    names = {vendor_name for _, vendor_name, _, _ in batch}
+    name_counts = Counter(name.lower() for name in names)
+    matched = {}
+    for name in names:
+        if name in exact:
+            matched[name] = exact[name]
+        elif name_counts[name.lower()] == 1 and len(folded.get(name.lower(), [])) == 1:
+            matched[name] = folded[name.lower()][0]
+    return matched
+
+
+def _encode_vendor(filename: str, vendor_name: str, rows: list) -> str:
+    """One vendor's rows as a compact CSV block, keeping as many rows as fit one batch"""
+    shown = pack_to_budget(rows, VENDOR_BATCH_TOKENS, render=lambda row: encode_records([row], drop_empty=False))
+    return (
+        f"FILE: {filename} | VENDOR: {vendor_name} | ROWS: {len(rows)} ({len(shown)} shown)\n"
+        f"{encode_records(shown, drop_empty=False)}"
+    )
 
-{few_shot_example}
+
+def _classify_vendors(batch: list) -> dict:
+    """Ask the AI to classify one batch of vendors"""
+    procurement_data = "\n\n".join(
+        _encode_vendor(filename, vendor_name, rows) for filename, vendor_name, rows, _ in batch
+    )
+
+    # Static instructions and few-shot example come first; the vendor data is appended last
+    user_prompt = f"""PROCUREMENT DATA FROM EXCEL FILES:
+{procurement_data}
 
 NOW ANALYZE THE PROVIDED DATA AND OUTPUT JSON:"""
 
-    # Step 4: Call OpenAI API
+    # Call OpenAI API
     try:
-        response = openai_client.chat.completions.create(
+        ai_output = structured_completion(
+            PROCUREMENT_TEMPLATE,
+            user_prompt,
+            ProcurementAnalysis,
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
             temperature=0.2,
             max_tokens=2000
-        )
-        
-        ai_response = response.choices[0].message.content
-        
-        # Parse AI response
-        try:
-            clean_response = ai_response.strip()
-            # Remove markdown code blocks if present
-            if clean_response.startswith("```"):
-                clean_response = clean_response.split("```")[1]
-                if clean_response.startswith("json"):
-                    clean_response = clean_response[4:]
-            clean_response = clean_response.strip()
-            
-            ai_output = json.loads(clean_response)
-        except json.JSONDecodeError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to parse AI response: {str(e)}\nAI Response: {ai_response[:500]}"
-            )
+        ).model_dump()
     
+    except StructuredOutputError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to parse AI response: {str(e)[:500]}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"OpenAI API error: {str(e)}"
         )
     
-    # Step 5: Save results
-    output_file = OUTPUT_DIR / "procurement_analysis.json"
-    output_file.parent.mkdir(parents=True, exist_ok=True)
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump({
-            "input_files": [f["filename"] for f in parsed_data],
-            "analyzed_at": pd.Timestamp.now().isoformat(),
-            "analysis": ai_output
-        }, f, indent=2, ensure_ascii=False)
-    
-    print(f"✅ Procurement analysis saved to: {output_file}")
-    print(f"📊 Classified {ai_output.get('ai_metadata', {}).get('total_vendors', 0)} vendors")
-    
-    # Step 6: Return results
-    return JSONResponse({
-        "status": "success",
-        "file_saved": str(output_file),
-        "files_analyzed": len(excel_files),
-        "result": ai_output
-    })
-
+    return ai_output
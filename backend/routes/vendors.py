@@ -1,9 +1,13 @@
 """Vendor-related routes"""
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from services.openai_service import openai_client
-import json
+from services.openai_service import structured_completion, StructuredOutputError, CircuitOpenError
+from services.llm_scheduler import INTERACTIVE
+from services.config import LLM_HEDGE_AFTER_SECONDS, LLM_INTERACTIVE_TIMEOUT
+from services.llm_schemas import VendorReply
+from services.prompts import VENDOR_REPLY_TEMPLATE
 
 router = APIRouter(
     prefix="/api",
@@ -21,55 +25,36 @@ async def generate_subcontractor_reply(request: SubcontractorReplyRequest):
     row_data = request.subcontractor_data
     
     try:
-        prompt = f"""You are an AI Assistant for construction project management.
-Compose a professional and context-aware email reply for the subcontractor conversation below.
-
-DETAILS:
+        details = f"""DETAILS:
 - Project: {row_data.get('project_guess', 'Unknown')}
 - Subject: {row_data.get('thread_subject', 'Follow-up')}
 - Issue: {row_data.get('issue_detected', '')}
 - Impact Area: {row_data.get('impact_area', '')}
 - Risk Level: {row_data.get('risk_level', '')}
-- Recommended Action: {row_data.get('recommended_action', '')}
-
-Tone: Polite, professional, collaborative. The goal is to follow up clearly while maintaining good vendor relationships.
-
-OUTPUT FORMAT:
-Return ONLY a valid JSON object (no markdown, no code blocks) with this structure:
-{{
-  "subject": "Reply Subject",
-  "body": "AI-generated reply email content"
-}}"""
-        
-        completion = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a professional construction project email assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=500
-        )
-        
-        ai_response = completion.choices[0].message.content
+- Recommended Action: {row_data.get('recommended_action', '')}"""
         
         try:
-            clean_response = ai_response.strip()
-            if clean_response.startswith("```"):
-                clean_response = clean_response.split("```")[1]
-                if clean_response.startswith("json"):
-                    clean_response = clean_response[4:]
-            clean_response = clean_response.strip()
-            
-            ai_reply = json.loads(clean_response)
-            return JSONResponse(ai_reply)
+            ai_reply = await run_in_threadpool(
+                structured_completion,
+                VENDOR_REPLY_TEMPLATE,
+                details,
+                VendorReply,
+                hedge_after=LLM_HEDGE_AFTER_SECONDS or None,
+                priority=INTERACTIVE,
+                timeout=LLM_INTERACTIVE_TIMEOUT,
+                model="gpt-4o-mini",
+                temperature=0.7,
+                max_tokens=500
+            )
+            return JSONResponse(ai_reply.model_dump())
         
-        except json.JSONDecodeError:
+        except StructuredOutputError:
             return JSONResponse({
                 "subject": f"Re: {row_data.get('thread_subject', 'Follow-up')}",
-                "body": ai_response[:500]
+                "body": "Unable to generate a reply. Please follow up manually."
             })
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate AI reply: {str(e)}")
+        status_code = 503 if isinstance(e, CircuitOpenError) else 500
+        raise HTTPException(status_code=status_code, detail=f"Failed to generate AI reply: {str(e)}")
 
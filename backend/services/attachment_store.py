@@ -0,0 +1,164 @@
+"""Content-addressed attachment store
+
+Attachment bytes are stored once per SHA-256 under
+data/attachments/blobs/<first two hex chars>/<sha256>, so the same file sent
+in several emails takes the space of one copy and same-named files from
+different emails no longer overwrite each other. index.json maps each
+message id/filename (and Gmail attachment id) to its blob, which lets a
+re-fetch skip attachments it already has without downloading them.
+
+Base64 payloads are decoded and hashed in fixed-size chunks straight into a
+temporary file that is renamed into place, so no second full-size copy of
+the attachment is held in memory.
+"""
+from datetime import datetime
+from services.config import DATA_DIR
+from services.storage import read_json, write_json, file_lock
+import base64
+import hashlib
+import os
+import tempfile
+
+ATTACHMENTS_DIR = DATA_DIR / "attachments"
+BLOBS_DIR = ATTACHMENTS_DIR / "blobs"
+INDEX_FILE = ATTACHMENTS_DIR / "index.json"
+
+# Base64 characters decoded per chunk (a multiple of 4; ~768 KB of output)
+DECODE_CHUNK_CHARS = 4 * 256 * 1024
+
+
+def blob_path(sha256: str):
+    """Where the blob with this digest lives"""
+    return BLOBS_DIR / sha256[:2] / sha256
+
+
+def attachment_key(message_id: str, filename: str) -> str:
+    return f"{message_id}/{filename}"
+
+
+def load_index() -> dict:
+    """Index of stored attachments, blobs and Gmail attachment ids"""
+    index = read_json(INDEX_FILE, default=None)
+    if not isinstance(index, dict):
+        index = {}
+    index.setdefault("attachments", {})  # message_id/filename -> entry
+    index.setdefault("blobs", {})  # sha256 -> {size, mime_type, filenames, first_seen}
+    index.setdefault("attachment_ids", {})  # Gmail attachmentId -> message_id/filename
+    return index
+
+
+def save_index(index: dict) -> None:
+    """Merge this index into the one on disk and save it
+
+    Another worker may have stored attachments since `index` was loaded, so
+    entries are merged under the index file lock instead of overwriting it.
+    `index` is updated in place with the merged result.
+    """
+    with file_lock(INDEX_FILE):
+        merged = load_index()
+        merged["attachments"].update(index["attachments"])
+        merged["attachment_ids"].update(index["attachment_ids"])
+        for sha256, blob in index["blobs"].items():
+            current = merged["blobs"].setdefault(sha256, blob)
+            if current is not blob:
+                current["filenames"] += [f for f in blob["filenames"] if f not in current["filenames"]]
+        write_json(INDEX_FILE, merged)
+    index.update(merged)
+
+
+def find_attachment(index: dict, message_id: str, filename: str, attachment_id: str = None):
+    """Stored entry for this attachment if its blob is on disk, else None"""
+    key = attachment_key(message_id, filename)
+    if key not in index["attachments"] and attachment_id:
+        key = index["attachment_ids"].get(attachment_id, key)
+    entry = index["attachments"].get(key)
+    if entry and blob_path(entry["sha256"]).exists():
+        return entry
+    return None
+
+
+def _write_blob(data_b64: str) -> tuple:
+    """Decode base64url data chunk by chunk into the blob store; return (sha256, size, deduplicated)"""
+    BLOBS_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=BLOBS_DIR, prefix=".incoming-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for start in range(0, len(data_b64), DECODE_CHUNK_CHARS):
+                chunk = data_b64[start:start + DECODE_CHUNK_CHARS]
+                # Gmail omits trailing padding; only the last chunk can be short
+                chunk += "=" * (-len(chunk) % 4)
+                decoded = base64.urlsafe_b64decode(chunk)
+                digest.update(decoded)
+                f.write(decoded)
+                size += len(decoded)
+
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+        if path.exists():
+            os.unlink(tmp_name)
+            return sha256, size, True
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, path)
+        return sha256, size, False
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+
+
+def save_attachment(index: dict, message_id: str, attachment_id: str, filename: str,
+                    mime_type: str, data_b64: str) -> dict:
+    """Store a downloaded attachment and record it in the index (call save_index afterwards)"""
+    sha256, size, deduplicated = _write_blob(data_b64)
+    now = datetime.now().isoformat()
+
+    blob = index["blobs"].setdefault(sha256, {"size": size, "mime_type": mime_type, "filenames": [], "first_seen": now})
+    if filename not in blob["filenames"]:
+        blob["filenames"].append(filename)
+
+    key = attachment_key(message_id, filename)
+    entry = {
+        "message_id": message_id,
+        "filename": filename,
+        "mime_type": mime_type,
+        "sha256": sha256,
+        "size": size,
+        "stored_at": now
+    }
+    index["attachments"][key] = entry
+    if attachment_id:
+        index["attachment_ids"][attachment_id] = key
+
+    if deduplicated:
+        print(f"📎 Attachment deduplicated: {filename} ({sha256[:12]})")
+    else:
+        print(f"📎 Attachment saved: {filename} ({size} bytes, {sha256[:12]})")
+    return entry
+
+
+def get_blob(sha256: str, index: dict = None):
+    """Metadata and path of a stored blob by digest, or None"""
+    sha256 = sha256.lower()
+    index = index or load_index()
+    blob = index["blobs"].get(sha256)
+    path = blob_path(sha256)
+    if blob is None or not path.exists():
+        return None
+    return {"sha256": sha256, "path": path, **blob}
+
+
+def latest_files(extension: str, index: dict = None) -> dict:
+    """Most recently stored blob for each attachment filename with this extension"""
+    index = index or load_index()
+    latest = {}
+    for entry in index["attachments"].values():
+        if not entry["filename"].lower().endswith(extension.lower()):
+            continue
+        if not blob_path(entry["sha256"]).exists():
+            continue
+        current = latest.get(entry["filename"])
+        if current is None or entry["stored_at"] > current["stored_at"]:
+            latest[entry["filename"]] = entry
+    return latest
@@ -0,0 +1,381 @@
+"""Batch mode for bulk summarization and thread analysis
+
+Pending requests are written to a JSONL file in the OpenAI Batch API format
+(one chat completion per line, identified by custom_id), submitted, polled
+until the batch finishes, and the results are validated and merged into the
+same output files the synchronous routes write. With BATCH_BACKEND=local a
+stand-in runs the file through the configured LLM backend in the background
+instead of the Batch API, for tests and non-OpenAI backends.
+
+Failed or invalid results are not merged, so a re-run never replaces a good
+stored result with a placeholder; their custom_ids are kept on the job.
+"""
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from pathlib import Path
+from pydantic import ValidationError
+from services.config import OUTPUT_DIR, BATCH_BACKEND, BATCH_POLL_SECONDS, BATCH_COMPLETION_WINDOW, ANALYZE_CONCURRENCY
+from services.openai_service import get_openai_client, chat_completion
+from services.prompts import EMAIL_SUMMARY_TEMPLATE, THREAD_ANALYSIS_TEMPLATE
+from services.llm_schemas import EmailSummary, ThreadAnalysis
+from services.llm_scheduler import BATCH
+from services.email_analysis import (
+    SUMMARY_PARAMS,
+    THREAD_ANALYSIS_PARAMS,
+    demo_project_names,
+    load_project_emails,
+    summary_prompt,
+    summary_record,
+    merge_summaries,
+    thread_analysis_prompt,
+    merge_thread_analyses
+)
+from services.storage import read_json, write_json, write_text_atomic, file_lock
+import json
+import threading
+import time
+import uuid
+
+BATCHES_DIR = OUTPUT_DIR / "batches"
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Provider statuses after which a batch will not change any more
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+JOB_KINDS = {
+    "summaries": (EMAIL_SUMMARY_TEMPLATE, EmailSummary),
+    "thread_analyses": (THREAD_ANALYSIS_TEMPLATE, ThreadAnalysis)
+}
+
+
+def _request_line(custom_id: str, template, user_prompt: str, params: dict) -> dict:
+    """One Batch API request: the same JSON-mode call the synchronous path makes"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            **params,
+            "messages": template.messages(user_prompt),
+            "response_format": {"type": "json_object"}
+        }
+    }
+
+
+def build_summary_requests(projects: list = None) -> tuple:
+    """Request lines and per-request context for summarizing every email of the projects"""
+    lines = []
+    context = {}
+    for project in projects or demo_project_names():
+        for email in load_project_emails(project):
+            custom_id = f"summary-{len(lines)}"
+            lines.append(_request_line(custom_id, EMAIL_SUMMARY_TEMPLATE, summary_prompt(email), SUMMARY_PARAMS))
+            context[custom_id] = {"project": project, "email": email}
+    return lines, context
+
+
+def build_thread_requests(thread_ids: list = None) -> tuple:
+    """Request lines and per-request context for analyzing indexed threads (all by default)"""
+    from services.thread_index import get_thread_index
+    index = get_thread_index()
+    lines = []
+    context = {}
+    for thread_id, thread_emails in index.threads_for(thread_ids or list(index.threads)).items():
+        if not thread_emails:
+            continue
+        custom_id = f"thread-{len(lines)}"
+        lines.append(_request_line(
+            custom_id, THREAD_ANALYSIS_TEMPLATE, thread_analysis_prompt(thread_emails), THREAD_ANALYSIS_PARAMS
+        ))
+        context[custom_id] = {"thread_id": thread_id, "thread_subject": thread_emails[0].get("subject", "")}
+    return lines, context
+
+
+def _write_jsonl(path, lines: list) -> None:
+    write_text_atomic(path, "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines))
+
+
+def _read_jsonl(text: str) -> list:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class OpenAIBatchClient:
+    """OpenAI Batch API: upload the JSONL file, create the batch, poll, download results"""
+
+    name = "openai"
+
+    def submit(self, input_file, metadata: dict) -> str:
+        with open(input_file, "rb") as f:
+            uploaded = get_openai_client().files.create(file=f, purpose="batch")
+        batch = get_openai_client().batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata=metadata
+        )
+        return batch.id
+
+    def retrieve(self, batch_id: str) -> dict:
+        batch = get_openai_client().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            "status": batch.status,
+            "completed": counts.completed if counts else 0,
+            "failed": counts.failed if counts else 0,
+            "output_file_id": batch.output_file_id,
+            "error_file_id": batch.error_file_id
+        }
+
+    def results(self, batch_id: str, status: dict) -> list:
+        lines = []
+        for file_id in (status.get("output_file_id"), status.get("error_file_id")):
+            if file_id:
+                lines.extend(_read_jsonl(get_openai_client().files.content(file_id).text))
+        return lines
+
+
+class LocalBatchClient:
+    """Stand-in for the Batch API that runs the JSONL file through the configured LLM backend
+
+    Progress is written to a shared file under BATCHES_DIR/local, so any
+    worker can report a run another worker started. The running worker
+    refreshes it at least every HEARTBEAT_SECONDS; a run whose file has not
+    been touched for STALE_SECONDS died with its process and is reported as
+    expired.
+    """
+
+    name = "local"
+    HEARTBEAT_SECONDS = 5.0
+    STALE_SECONDS = 120.0
+
+    def __init__(self, concurrency: int = ANALYZE_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+
+    def _progress_file(self, batch_id: str):
+        return BATCHES_DIR / "local" / f"{batch_id}.json"
+
+    def _save_progress(self, batch_id: str, progress: dict) -> None:
+        write_json(self._progress_file(batch_id), {**progress, "updated_at": time.time()})
+
+    def submit(self, input_file, metadata: dict) -> str:
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        self._save_progress(batch_id, {
+            "status": "in_progress", "completed": 0, "failed": 0,
+            "output_file": str(input_file.with_name("output.jsonl"))
+        })
+        threading.Thread(
+            target=self._run, args=(batch_id, input_file), name=f"batch-{batch_id}", daemon=True
+        ).start()
+        return batch_id
+
+    def _run(self, batch_id: str, input_file) -> None:
+        requests = _read_jsonl(input_file.read_text(encoding="utf-8"))
+        progress = read_json(self._progress_file(batch_id))
+
+        def run_one(request: dict) -> dict:
+            try:
+                completion = chat_completion(f"batch_{request['custom_id'].split('-')[0]}", priority=BATCH, **request["body"])
+                body = completion.model_dump() if hasattr(completion, "model_dump") else {
+                    "choices": [{"message": {"content": completion.choices[0].message.content}}]
+                }
+                return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+            except Exception as e:
+                return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(run_one, request) for request in requests]
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=self.HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    progress["completed" if future.result()["error"] is None else "failed"] += 1
+                self._save_progress(batch_id, progress)
+        _write_jsonl(Path(progress["output_file"]), [f.result() for f in futures])
+        self._save_progress(batch_id, {**progress, "status": "completed"})
+
+    def retrieve(self, batch_id: str) -> dict:
+        progress = read_json(self._progress_file(batch_id))
+        if progress is None:
+            return {"status": "expired", "completed": 0, "failed": 0}
+        if progress["status"] == "in_progress" and time.time() - progress.get("updated_at", 0) > self.STALE_SECONDS:
+            # The worker running it was restarted mid-run
+            return {**progress, "status": "expired"}
+        return progress
+
+    def results(self, batch_id: str, status: dict) -> list:
+        output_file = Path(status["output_file"]) if status.get("output_file") else None
+        if output_file is None or not output_file.exists():
+            return []
+        return _read_jsonl(output_file.read_text(encoding="utf-8"))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_batch_client():
+    """Batch client for BATCH_BACKEND (created once)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAIBatchClient() if BATCH_BACKEND == "openai" and get_openai_client() is not None else LocalBatchClient()
+        return _client
+
+
+def _job_dir(job_id: str):
+    return BATCHES_DIR / job_id
+
+
+def load_job(job_id: str):
+    """Stored job state, or None"""
+    return read_json(_job_dir(job_id) / "job.json")
+
+
+def _save_job(job: dict) -> None:
+    write_json(_job_dir(job["job_id"]) / "job.json", job)
+
+
+def list_jobs() -> list:
+    """All batch jobs, newest first"""
+    jobs = [read_json(path) for path in BATCHES_DIR.glob("*/job.json")]
+    return sorted((j for j in jobs if j), key=lambda j: j.get("created_at", ""), reverse=True)
+
+
+def create_job(kind: str, projects: list = None, thread_ids: list = None) -> dict:
+    """Write the pending requests to a JSONL batch file and submit it"""
+    if kind == "summaries":
+        lines, context = build_summary_requests(projects)
+    elif kind == "thread_analyses":
+        lines, context = build_thread_requests(thread_ids)
+    else:
+        raise ValueError(f"Unknown batch kind: {kind}")
+
+    job_id = f"{kind}_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    job = {
+        "job_id": job_id,
+        "kind": kind,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "request_count": len(lines),
+        "status": "empty" if not lines else "submitted",
+        "provider": None,
+        "batch_id": None,
+        "completed": 0,
+        "failed": 0,
+        "merged": 0,
+        "failed_ids": []
+    }
+    job_dir = _job_dir(job_id)
+    _write_jsonl(job_dir / "input.jsonl", lines)
+    write_json(job_dir / "context.json", context)
+
+    if lines:
+        client = get_batch_client()
+        job["provider"] = client.name
+        job["batch_id"] = client.submit(job_dir / "input.jsonl", {"job_id": job_id, "kind": kind})
+        print(f"📦 Submitted {kind} batch {job_id} with {len(lines)} requests ({client.name})")
+    _save_job(job)
+    return job
+
+
+def _parse_result(line: dict, schema):
+    """Validated model from one batch output line, or None"""
+    response = line.get("response") or {}
+    if line.get("error") or response.get("status_code") != 200:
+        return None
+    try:
+        content = response["body"]["choices"][0]["message"]["content"]
+        return schema.model_validate_json(content or "")
+    except (KeyError, IndexError, TypeError, ValidationError):
+        return None
+
+
+def _merge_results(job: dict, lines: list) -> None:
+    """Merge valid results into the output stores by custom_id"""
+    _, schema = JOB_KINDS[job["kind"]]
+    context = read_json(_job_dir(job["job_id"]) / "context.json", default={}) or {}
+
+    valid = {}
+    for line in lines:
+        result = _parse_result(line, schema)
+        if result is not None and line.get("custom_id") in context:
+            valid[line["custom_id"]] = result.model_dump()
+
+    if job["kind"] == "summaries":
+        by_project = {}
+        for custom_id, ai_data in valid.items():
+            item = context[custom_id]
+            by_project.setdefault(item["project"], []).append(summary_record(item["email"], ai_data))
+        for project, summaries in by_project.items():
+            merge_summaries(project, summaries)
+    else:
+        # Keyed by the thread the request was built for, not the subject the model echoed back
+        merge_thread_analyses([
+            {
+                **ai_data,
+                "thread_id": context[custom_id]["thread_id"],
+                "thread_subject": context[custom_id].get("thread_subject") or ai_data.get("thread_subject", "")
+            }
+            for custom_id, ai_data in valid.items()
+        ])
+
+    job["merged"] = len(valid)
+    job["failed_ids"] = sorted(set(context) - set(valid))
+    job["failed"] = len(job["failed_ids"])
+    print(f"📦 Merged {len(valid)} of {job['request_count']} results from batch {job['job_id']}")
+
+
+def refresh_job(job_id: str):
+    """Poll the provider once; when the batch has finished, merge its results
+
+    Runs under the job's file lock so the background poller and a GET on
+    the job (in any worker) never both merge the same results. A caller
+    that finds the lock held gets the stored state instead of waiting.
+    """
+    if not _job_dir(job_id).is_dir():
+        return None
+    with file_lock(_job_dir(job_id) / "job.json", blocking=False) as held:
+        job = load_job(job_id)
+        if not held or job is None or job["status"] in TERMINAL_STATUSES | {"merged", "empty"}:
+            return job
+
+        client = get_batch_client()
+        status = client.retrieve(job["batch_id"])
+        job["status"] = status["status"]
+        job["completed"] = status.get("completed", 0)
+        job["failed"] = status.get("failed", 0)
+
+        if status["status"] in TERMINAL_STATUSES:
+            lines = client.results(job["batch_id"], status)
+            if lines:
+                _merge_results(job, lines)
+                job["status"] = "merged"
+            job["finished_at"] = datetime.now(timezone.utc).isoformat()
+        _save_job(job)
+        return job
+
+
+def wait_for_job(job_id: str, poll_seconds: float = None, timeout: float = None):
+    """Poll until the job is merged or the batch ends without results"""
+    if poll_seconds is None:
+        # The local stand-in finishes in minutes, the Batch API in hours
+        poll_seconds = BATCH_POLL_SECONDS if get_batch_client().name == "openai" else 1.0
+    started = time.monotonic()
+    while True:
+        job = refresh_job(job_id)
+        if job is None or job["status"] in TERMINAL_STATUSES | {"merged", "empty"}:
+            return job
+        if timeout is not None and time.monotonic() - started > timeout:
+            return job
+        time.sleep(poll_seconds)
+
+
+def start_polling(job_id: str) -> None:
+    """Poll and merge a job in the background"""
+    threading.Thread(target=wait_for_job, args=(job_id,), name=f"batch-poll-{job_id}", daemon=True).start()
+
+
+def resume_pending_jobs() -> None:
+    """Restart background polling for jobs still in flight (e.g. after a server restart)"""
+    for job in list_jobs():
+        if job.get("status") not in TERMINAL_STATUSES | {"merged", "empty"}:
+            start_polling(job["job_id"])
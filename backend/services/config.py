@@ -1,15 +1,20 @@
 """Shared configuration and constants for services"""
 import os
 from pathlib import Path
-from dotenv import load_dotenv
-
-load_dotenv()
 
 # Base paths
 BASE_DIR = Path(__file__).parent.parent
-DATA_DIR = BASE_DIR / "data"
-OUTPUT_DIR = BASE_DIR / "output"
-OUTPUT_DIR.mkdir(exist_ok=True)
+
+# Load backend/.env directly instead of searching for it, and skip the dotenv
+# import entirely when there is no .env file
+if (BASE_DIR / ".env").exists():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / ".env")
+
+# Input data and generated output; DATA_DIR / OUTPUT_DIR point the app at
+# another tree (the pipeline benchmarks run against a generated corpus)
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
+OUTPUT_DIR = Path(os.getenv("OUTPUT_DIR", BASE_DIR / "output"))  # created by the first write (see services/storage.py)
 
 # Gmail API scopes
 GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
@@ -17,3 +22,105 @@ GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
 # OpenAI API Key (from .env or hardcoded fallback)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
+# OpenAI client: base URL override (e.g. a local mock server), default request
+# timeout in seconds, and retries for 429/5xx/connection errors
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+
+# Completion backend: "openai", "local" (an OpenAI-compatible server such as
+# Ollama or vLLM) or "fake" (in-process canned responses for offline load tests)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_LOCAL_BASE_URL = os.getenv("LLM_LOCAL_BASE_URL", "http://localhost:11434/v1")
+LLM_LOCAL_API_KEY = os.getenv("LLM_LOCAL_API_KEY", "")
+LLM_LOCAL_MODEL = os.getenv("LLM_LOCAL_MODEL", "llama3.1:8b")
+
+# Fake backend: mean latency and +/- jitter in seconds, share of calls that
+# fail with a timeout, and an optional random seed for repeatable runs
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.2"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.1"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED")) if os.getenv("FAKE_LLM_SEED") else None
+
+# Bulk batch jobs: "openai" uses the Batch API (cheaper, finishes within the
+# completion window), "local" runs the batch file through LLM_BACKEND in the
+# background; defaults to the Batch API only when LLM_BACKEND is openai
+BATCH_BACKEND = os.getenv("BATCH_BACKEND", "openai" if LLM_BACKEND == "openai" else "local")
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+
+# Process-wide LLM rate limits shared by all endpoints (0 disables), and the
+# share of each limit batch work must leave free for interactive calls. With
+# several uvicorn workers each process enforces its own limits, so divide the
+# account limits by the worker count
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.2"))
+
+# Circuit breaker: consecutive transient failures before failing fast, and
+# seconds before a probe request is let through again
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+# Interactive endpoints send a duplicate request when the first is slower than
+# this many seconds (0 disables hedging), and time out after LLM_INTERACTIVE_TIMEOUT
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "3"))
+LLM_INTERACTIVE_TIMEOUT = float(os.getenv("LLM_INTERACTIVE_TIMEOUT", "20"))
+
+# Identical background LLM requests can be shared across uvicorn workers through
+# a SQLite cache: results are kept for LLM_SHARED_CACHE_TTL seconds (0, the
+# default, disables it), and a worker computing a request holds it for at most
+# LLM_SHARED_CACHE_LEASE seconds. Interactive calls are never served from it.
+SHARED_CACHE_FILE = OUTPUT_DIR / "shared_cache.sqlite3"
+LLM_SHARED_CACHE_TTL = float(os.getenv("LLM_SHARED_CACHE_TTL", "0"))
+LLM_SHARED_CACHE_LEASE = float(os.getenv("LLM_SHARED_CACHE_LEASE", "180"))
+
+
+# Off-peak pre-generation of last week's reports (local hour, 0-23); set
+# WEEKLY_REPORT_SCHEDULER=0 to disable the in-process scheduler
+WEEKLY_REPORT_SCHEDULER = os.getenv("WEEKLY_REPORT_SCHEDULER", "1") != "0"
+WEEKLY_REPORT_HOUR = int(os.getenv("WEEKLY_REPORT_HOUR", "2"))
+
+# Maximum number of email threads analyzed concurrently by /api/emails/analyze
+ANALYZE_CONCURRENCY = int(os.getenv("ANALYZE_CONCURRENCY", "4"))
+
+# Our own email domains (comma-separated) for responsiveness tracking; when
+# empty, whoever opened a thread is taken as the side waiting for replies
+INTERNAL_EMAIL_DOMAINS = [d.strip().lower() for d in os.getenv("INTERNAL_EMAIL_DOMAINS", "").split(",") if d.strip()]
+
+# Email body cleaning: worker processes for bulk cleaning (1 = inline), the
+# smallest batch worth sending to the pool, and whether Gmail ingest drops
+# quoted reply history and signatures (off by default: stored bodies are kept
+# whole unless EMAIL_STRIP_QUOTES=1)
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+CLEAN_POOL_MIN_BATCH = int(os.getenv("CLEAN_POOL_MIN_BATCH", "200"))
+EMAIL_STRIP_QUOTES = os.getenv("EMAIL_STRIP_QUOTES", "0") == "1"
+
+# Tokenizer used for prompt token budgets: "auto" (tiktoken if its encoding is
+# available locally, else approximate) or "approx"
+TOKENIZER_BACKEND = os.getenv("TOKENIZER_BACKEND", "auto")
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+
+# Request tracing (TRACING=0 disables): traces kept for /api/debug/traces
+# (most recent and slowest), the span limit per trace, and an optional file
+# that finished traces are appended to as OTLP/JSON lines
+TRACING_ENABLED = os.getenv("TRACING", "1") != "0"
+TRACE_RECENT_KEEP = int(os.getenv("TRACE_RECENT_KEEP", "100"))
+TRACE_SLOW_KEEP = int(os.getenv("TRACE_SLOW_KEEP", "20"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))
+TRACE_EXPORT_FILE = Path(os.getenv("TRACE_EXPORT_FILE")) if os.getenv("TRACE_EXPORT_FILE") else None
+
+# Profiling: PROFILING=1 enables per-request profiles (X-Profile: 1 header or
+# ?profile=1) and the /api/debug/profile endpoints; samples are taken every
+# PROFILE_SAMPLE_INTERVAL seconds and the last PROFILE_KEEP profiles are kept
+PROFILING_ENABLED = os.getenv("PROFILING", "0") == "1"
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+# Event loop watchdog (LOOP_WATCHDOG=0 disables): the loop is pinged every
+# LOOP_WATCHDOG_INTERVAL seconds, and a ping late by more than
+# LOOP_BLOCK_THRESHOLD seconds is recorded with the stack that blocked it
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "1") != "0"
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.25"))
+LOOP_BLOCK_KEEP = int(os.getenv("LOOP_BLOCK_KEEP", "50"))
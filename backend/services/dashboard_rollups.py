@@ -0,0 +1,251 @@
+"""Incrementally maintained rollups behind /api/dashboard/summary
+
+Email rollups count emails by category, priority and due date per project,
+for all roles ("*") and per role in role_visibility. Thread rollups keep
+response-time histograms, follow-up/unanswered totals and the threads still
+awaiting a reply per project. Each email and thread remembers its previous
+contribution, so an update subtracts the old one and adds the new one instead
+of rescanning everything. Values that depend on the current time (overdue
+emails, risk levels) are derived from the rollups when they are read.
+
+Emails are fed by merge_summaries and threads by the responsiveness view; the
+rollups are rebuilt from those sources if output/dashboard_rollups.json is
+missing. Until any mail is indexed the thread rollups hold the bundled sample
+threads (data/non_responsive_subcontractors.json), the same fallback as
+/api/non-responsive-subcontractors; the first real threads replace them.
+"""
+from datetime import datetime
+from services.config import OUTPUT_DIR
+from services.storage import read_json, SharedJSON
+
+ROLLUP_FILE = OUTPUT_DIR / "dashboard_rollups.json"
+ALL = "*"
+SAMPLE_PREFIX = "sample:"
+
+# Upper bounds (hours) of the response-time histogram buckets; the last is open-ended
+RESPONSE_BUCKETS_HOURS = [1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720]
+
+def _project_key(project: str) -> str:
+    return (project or "Unknown").strip().lower()
+
+
+def _empty_email_totals() -> dict:
+    return {"total": 0, "by_category": {}, "by_priority": {}, "due_dates": {}}
+
+
+def _empty_thread_totals() -> dict:
+    return {
+        "threads": 0,
+        "follow_up_count": 0,
+        "unanswered_emails": 0,
+        "gap_days_sum": 0.0,
+        "gap_days_count": 0,
+        "response_histogram": [0] * (len(RESPONSE_BUCKETS_HOURS) + 1),
+        "awaiting": {}  # thread id -> [unanswered emails, waiting since (epoch seconds)]
+    }
+
+
+def _empty_state() -> dict:
+    return {
+        "emails": {},         # project -> email id -> contribution
+        "email_totals": {},   # project -> role -> totals
+        "threads": {},        # thread id -> contribution
+        "thread_totals": {},  # project -> totals
+        "built": False,
+        "sample": False,     # thread rollups hold the bundled sample threads
+        "updated_at": None
+    }
+
+
+_store = SharedJSON(ROLLUP_FILE, lambda data: data or _empty_state())
+
+
+def _is_built() -> bool:
+    with _store.read() as state:
+        return state["built"]
+
+
+def _bump(counts: dict, key: str, delta: int) -> None:
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def _apply_email(totals_by_role: dict, contribution: dict, sign: int) -> None:
+    for role in [ALL] + contribution["roles"]:
+        totals = totals_by_role.setdefault(role, _empty_email_totals())
+        totals["total"] += sign
+        _bump(totals["by_category"], contribution["category"], sign)
+        _bump(totals["by_priority"], contribution["priority"], sign)
+        if contribution["due_date"]:
+            _bump(totals["due_dates"], contribution["due_date"], sign)
+
+
+def _email_contribution(email: dict, previous: dict = None) -> dict:
+    roles = email.get("role_visibility")
+    if roles is None and previous:
+        # Summary records do not carry role_visibility; keep what the email had
+        roles = previous["roles"]
+    return {
+        "category": email.get("category") or "Uncategorized",
+        "priority": email.get("priority") or "Medium",
+        "due_date": (email.get("due_date") or "")[:10],
+        "roles": list(roles or [])
+    }
+
+
+def _email_id(email: dict) -> str:
+    return email.get("id") or email.get("from", "") + email.get("subject", "")
+
+
+def _update_emails(state: dict, project: str, emails: list) -> None:
+    key = _project_key(project)
+    contributions = state["emails"].setdefault(key, {})
+    totals = state["email_totals"].setdefault(key, {})
+    for email in emails:
+        email_id = _email_id(email)
+        previous = contributions.get(email_id)
+        if previous:
+            _apply_email(totals, previous, -1)
+        contribution = _email_contribution(email, previous)
+        _apply_email(totals, contribution, 1)
+        contributions[email_id] = contribution
+
+
+def update_emails(project: str, emails: list) -> None:
+    """Fold new or changed emails/summaries of a project into the email rollups"""
+    if not _is_built():
+        return  # the first rebuild reads every source anyway
+    with _store.update() as state:
+        _update_emails(state, project, emails)
+        state["updated_at"] = datetime.now().isoformat()
+
+
+def _response_bucket(hours: float) -> int:
+    for i, bound in enumerate(RESPONSE_BUCKETS_HOURS):
+        if hours <= bound:
+            return i
+    return len(RESPONSE_BUCKETS_HOURS)
+
+
+def _thread_contribution(record: dict) -> dict:
+    gaps = record["counts"]["total_emails"] - 1
+    return {
+        "project": _project_key(record.get("project_guess")),
+        "follow_up_count": record["counts"]["follow_up_count"],
+        "unanswered_emails": record["counts"]["unanswered_emails"],
+        "gap_days_sum": record["kpis"]["avg_gap_days"] * gaps if gaps > 0 else 0.0,
+        "gap_days_count": gaps if gaps > 0 else 0,
+        "response_buckets": [_response_bucket(h) for h in record.get("response_hours", [])],
+        "waiting_since": record.get("last_unanswered_ts")
+    }
+
+
+def _apply_thread(state: dict, thread_id: str, contribution: dict, sign: int) -> None:
+    for project in (contribution["project"], ALL):
+        totals = state["thread_totals"].setdefault(project, _empty_thread_totals())
+        totals["threads"] += sign
+        for field in ("follow_up_count", "unanswered_emails", "gap_days_sum", "gap_days_count"):
+            totals[field] += sign * contribution[field]
+        for bucket in contribution["response_buckets"]:
+            totals["response_histogram"][bucket] += sign
+        if contribution["unanswered_emails"]:
+            if sign > 0:
+                totals["awaiting"][thread_id] = [contribution["unanswered_emails"], contribution["waiting_since"]]
+            else:
+                totals["awaiting"].pop(thread_id, None)
+
+
+def _update_threads(state: dict, records: dict, removed_ids) -> None:
+    if records and state.get("sample"):
+        # Real threads arrived: drop the sample ones seeded while no mail was indexed
+        removed_ids = list(removed_ids) + [t for t in state["threads"] if t.startswith(SAMPLE_PREFIX)]
+        state["sample"] = False
+    for thread_id in list(removed_ids) + list(records):
+        previous = state["threads"].pop(thread_id, None)
+        if previous:
+            _apply_thread(state, thread_id, previous, -1)
+    for thread_id, record in records.items():
+        contribution = _thread_contribution(record)
+        _apply_thread(state, thread_id, contribution, 1)
+        state["threads"][thread_id] = contribution
+
+
+def update_threads(records: dict, removed_ids=()) -> None:
+    """Fold recomputed thread records ({thread id: responsiveness record}) into the thread rollups"""
+    if not _is_built():
+        return
+    with _store.update() as state:
+        _update_threads(state, records, removed_ids)
+        state["updated_at"] = datetime.now().isoformat()
+
+
+def rebuild() -> None:
+    """Rebuild all rollups from the demo emails, the summary files and the responsiveness view"""
+    from services.email_analysis import demo_project_names, load_project_emails, summaries_file_for
+    from services import responsiveness
+
+    if responsiveness.ensure_built():
+        records, sample = responsiveness.thread_records(), False
+    else:
+        # No mail indexed: show the bundled sample threads like /api/non-responsive-subcontractors
+        records = {f"{SAMPLE_PREFIX}{i}": r for i, r in enumerate(responsiveness.sample_threads())}
+        sample = bool(records)
+    with _store.update() as state:
+        state.clear()
+        state.update(_empty_state())
+        for project in demo_project_names():
+            _update_emails(state, project, load_project_emails(project))
+            _update_emails(state, project, read_json(summaries_file_for(project), default=[]) or [])
+        _update_threads(state, records, ())
+        state["sample"] = sample
+        state["built"] = True
+        state["updated_at"] = datetime.now().isoformat()
+
+
+def ensure_built() -> None:
+    """Build the rollups on first use"""
+    if not _is_built():
+        rebuild()
+
+
+def _merge_email_totals(parts: list) -> dict:
+    merged = _empty_email_totals()
+    for totals in parts:
+        merged["total"] += totals["total"]
+        for field in ("by_category", "by_priority", "due_dates"):
+            for key, count in totals[field].items():
+                merged[field][key] = merged[field].get(key, 0) + count
+    return merged
+
+
+def email_totals(project: str = None, role: str = None) -> dict:
+    """Email counts for one project (all projects by default), optionally as seen by one role"""
+    with _store.read() as state:
+        projects = [_project_key(project)] if project else list(state["email_totals"])
+        parts = [state["email_totals"].get(p, {}).get(role or ALL) for p in projects]
+        return _merge_email_totals([p for p in parts if p])
+
+
+def thread_totals(project: str = None) -> dict:
+    """Thread counters for one project (all projects by default)"""
+    with _store.read() as state:
+        totals = state["thread_totals"].get(_project_key(project) if project else ALL)
+        if not totals:
+            return _empty_thread_totals()
+        return {**totals, "response_histogram": list(totals["response_histogram"]), "awaiting": dict(totals["awaiting"])}
+
+
+def histogram_percentile(histogram: list, percentile: float):
+    """Upper bound (hours) of the bucket holding the given percentile, or None without samples"""
+    total = sum(histogram)
+    if not total:
+        return None
+    threshold = total * percentile / 100
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= threshold:
+            break
+    # Samples in the open-ended bucket report its lower bound
+    return RESPONSE_BUCKETS_HOURS[min(i, len(RESPONSE_BUCKETS_HOURS) - 1)]
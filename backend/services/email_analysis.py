@@ -0,0 +1,161 @@
+"""Prompt construction, fallbacks and output stores for email summaries and thread analyses
+
+Shared by the synchronous routes and the batch mode so both send identical
+requests and write results to the same files.
+"""
+from services.prompt_encoding import encode_records, truncate_text
+from services.tokenizer import truncate_to_tokens, pack_to_budget
+from services.config import DATA_DIR, OUTPUT_DIR
+from services.storage import read_json, update_json
+from services import dashboard_rollups
+
+# Thread analysis prompt: email fields sent, total input-token budget, and the
+# token budgets for the thread data and for each email body within it
+THREAD_PROMPT_FIELDS = ["id", "from", "to", "date", "subject", "body"]
+THREAD_PROMPT_TOKEN_BUDGET = 8000
+THREAD_DATA_TOKENS = 5000
+THREAD_BODY_TOKENS = 400
+
+# Token budget for the email body in the summary prompt
+SUMMARY_BODY_TOKENS = 1500
+
+# Completion parameters for each request type
+SUMMARY_PARAMS = {"model": "gpt-4o-mini", "temperature": 0.3, "max_tokens": 300}
+THREAD_ANALYSIS_PARAMS = {"model": "gpt-4o-mini", "temperature": 0.2, "max_tokens": 1000}
+
+ANALYSIS_FILE = OUTPUT_DIR / "ai_inbox_analysis.json"
+
+
+def demo_project_names() -> list:
+    """Project names in demo_emails.json"""
+    demo_data = read_json(DATA_DIR / "demo_emails.json", default={}) or {}
+    return [p.get("project_name") for p in demo_data.get("projects", []) if p.get("project_name")]
+
+
+def load_project_emails(project: str) -> list:
+    """A project's emails from demo_emails.json, falling back to the project-specific JSON file"""
+    demo_data = read_json(DATA_DIR / "demo_emails.json", default={}) or {}
+    project_data = next((p for p in demo_data.get("projects", []) if p.get("project_name") == project), None)
+    emails = project_data.get("emails", []) if project_data else []
+
+    if not emails:
+        emails = read_json(DATA_DIR / f"{project.lower().replace(' ', '_')}.json", default=[]) or []
+    return emails
+
+
+def summary_prompt(email: dict) -> str:
+    """User message for summarizing one email"""
+    return f"Subject: {email['subject']}\n\nBody: {truncate_to_tokens(email['body'], SUMMARY_BODY_TOKENS)}"
+
+
+def summary_fallback(email: dict, summary: str = "Unable to generate summary",
+                     action_required: str = "Review required") -> dict:
+    """Placeholder AI fields when an email could not be summarized"""
+    return {
+        "category": "General",
+        "summary": summary,
+        "action_required": action_required,
+        "priority": email.get("priority", "Medium"),
+        "due_date": email.get("due_date", "")
+    }
+
+
+def summary_record(email: dict, ai_data: dict) -> dict:
+    """Stored summary: the email's identifying fields plus the AI fields"""
+    return {
+        "id": email.get("id", ""),
+        "from": email.get("from", ""),
+        "to": email.get("to", ""),
+        "subject": email.get("subject", ""),
+        "body": email.get("body", ""),
+        **ai_data
+    }
+
+
+def summaries_file_for(project: str):
+    """Output file holding a project's summaries"""
+    return OUTPUT_DIR / f"{project.lower().replace(' ', '_')}_summarized.json"
+
+
+def merge_summaries(project: str, summaries: list) -> None:
+    """Merge new summaries into the project's summary file, replacing entries for the same email"""
+    def merge(existing_summaries):
+        if not isinstance(existing_summaries, list):
+            existing_summaries = []
+        existing_dict = {}
+        for s in existing_summaries + summaries:
+            email_id = s.get("id") or s.get("from", "") + s.get("subject", "")
+            existing_dict[email_id] = s
+        return list(existing_dict.values())
+
+    # Under the file lock, so concurrent merges from other workers are not lost
+    update_json(summaries_file_for(project), merge, default=[])
+    dashboard_rollups.update_emails(project, summaries)
+
+
+def thread_analysis_prompt(thread_emails: list) -> str:
+    """User message for analyzing one thread, packed to the thread data budget"""
+    rows = [
+        {**e, "body": truncate_text(e.get("body") or e.get("snippet", ""), THREAD_BODY_TOKENS)}
+        for e in thread_emails
+    ]
+    # Long threads: keep the opening email and the most recent ones that fit the budget
+    packed = pack_to_budget(
+        rows,
+        THREAD_DATA_TOKENS,
+        render=lambda row: encode_records([row], fields=THREAD_PROMPT_FIELDS),
+        priority=lambda i, _: (i == 0, i)
+    )
+    thread_data = encode_records(packed, fields=THREAD_PROMPT_FIELDS)
+    if len(packed) < len(rows):
+        thread_data = f"(Thread has {len(rows)} emails; {len(packed)} shown)\n" + thread_data
+    return "NOW ANALYZE THIS THREAD:\n" + thread_data
+
+
+def thread_analysis_fallback(thread_emails: list, issue: str, reason: str, action: str) -> dict:
+    """Placeholder analysis when a thread could not be analyzed"""
+    return {
+        "thread_subject": thread_emails[0].get("subject", "") if thread_emails else "",
+        "project_guess": "Unknown",
+        "participants": {},
+        "counts": {"total_emails": len(thread_emails), "follow_up_count": 0, "unanswered_emails": 0},
+        "timeline": {},
+        "response_detected": False,
+        "issue_detected": issue,
+        "impact_area": "Unknown",
+        "risk_level": "UNKNOWN",
+        "reason": reason,
+        "recommended_action": action,
+        "kpis": {"avg_gap_days": 0, "last_gap_days": 0}
+    }
+
+
+def _analysis_key(analysis: dict) -> str:
+    # Keyed by the thread index id; older results without one by subject
+    if analysis.get("thread_id"):
+        return "id:" + analysis["thread_id"]
+    return "subject:" + analysis.get("thread_subject", "")
+
+
+def merge_thread_analyses(analyses: list) -> list:
+    """Merge analyses into ai_inbox_analysis.json, replacing earlier results for the same thread
+
+    Analyses should carry the thread_id they were requested for; the model's
+    thread_subject is not unique (two threads can share a subject) and may
+    be reworded.
+    """
+    def merge(existing):
+        if not isinstance(existing, list):
+            existing = []
+        # A result with a thread_id supersedes a legacy subject-keyed one for the same subject
+        superseded = {"subject:" + a.get("thread_subject", "") for a in analyses if a.get("thread_id")}
+        merged = {}
+        for analysis in existing:
+            key = _analysis_key(analysis)
+            if key not in superseded:
+                merged[key] = analysis
+        for analysis in analyses:
+            merged[_analysis_key(analysis)] = analysis
+        return list(merged.values())
+
+    return update_json(ANALYSIS_FILE, merge, default=[])
@@ -0,0 +1,109 @@
+"""Time-indexed email store for window queries
+
+Emails are kept sorted by parsed epoch timestamp so a date window is two
+bisects plus a slice. A token inverted index narrows project matching to the
+emails that contain every word of the project name.
+"""
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta, timezone
+from services.email_service import parse_email_date
+from services.config import DATA_DIR
+from services.storage import read_json
+import re
+import threading
+
+EMAILS_FILE = DATA_DIR / "emails_cleaned.json"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> set:
+    """Lowercase word tokens used by the inverted index"""
+    return set(_TOKEN_RE.findall((text or "").lower()))
+
+
+def date_window(start_date: str, end_date: str) -> tuple:
+    """Convert inclusive YYYY-MM-DD dates into a [start, end) epoch-second window"""
+    start = datetime.combine(date.fromisoformat(start_date), time.min, tzinfo=timezone.utc)
+    end = datetime.combine(date.fromisoformat(end_date) + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    return start.timestamp(), end.timestamp()
+
+
+class EmailIndex:
+    """Emails sorted by timestamp with a per-project inverted index"""
+
+    def __init__(self, emails: list):
+        dated = []
+        for email in emails:
+            ts = parse_email_date(email.get("date", ""))
+            if ts is not None:
+                dated.append((ts, email))
+        dated.sort(key=lambda item: item[0])
+
+        self.timestamps = [ts for ts, _ in dated]
+        self.emails = [email for _, email in dated]
+        self.undated_count = len(emails) - len(dated)
+
+        self._postings = {}
+        self._texts = []
+        for position, email in enumerate(self.emails):
+            text = f"{email.get('subject', '')} {email.get('body', '')}".lower()
+            self._texts.append(text)
+            for token in tokenize(text):
+                self._postings.setdefault(token, []).append(position)
+
+        self._projects = {}
+        self._lock = threading.Lock()
+
+    def window(self, start_ts: float, end_ts: float) -> list:
+        """All emails with start_ts <= timestamp < end_ts"""
+        lo = bisect_left(self.timestamps, start_ts)
+        hi = bisect_left(self.timestamps, end_ts)
+        return self.emails[lo:hi]
+
+    def project_window(self, project_name: str, start_ts: float, end_ts: float) -> list:
+        """Emails mentioning the project within [start_ts, end_ts)"""
+        positions, timestamps = self._project_postings(project_name)
+        lo = bisect_left(timestamps, start_ts)
+        hi = bisect_left(timestamps, end_ts)
+        return [self.emails[p] for p in positions[lo:hi]]
+
+    def _project_postings(self, project_name: str) -> tuple:
+        """Sorted positions (and their timestamps) of emails mentioning a project"""
+        key = project_name.strip().lower()
+        with self._lock:
+            cached = self._projects.get(key)
+            if cached is not None:
+                return cached
+
+            tokens = tokenize(key)
+            if tokens:
+                # Intersect postings, starting from the rarest token
+                postings = sorted((self._postings.get(t, []) for t in tokens), key=len)
+                candidates = set(postings[0])
+                for other in postings[1:]:
+                    candidates.intersection_update(other)
+            else:
+                candidates = set()
+
+            # Confirm the full phrase appears, matching the original substring filter
+            positions = sorted(p for p in candidates if key in self._texts[p])
+            cached = (positions, [self.timestamps[p] for p in positions])
+            self._projects[key] = cached
+            return cached
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def get_email_index() -> EmailIndex:
+    """Return the index for emails_cleaned.json, rebuilding when the file changes"""
+    global _index, _index_mtime
+    mtime = EMAILS_FILE.stat().st_mtime if EMAILS_FILE.exists() else None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = EmailIndex(read_json(EMAILS_FILE, default=[]) or [])
+            _index_mtime = mtime
+        return _index
@@ -1,32 +1,44 @@
 """Email-related service functions"""
 from fastapi import HTTPException
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from bs4 import BeautifulSoup
-from services.openai_service import openai_client
-from services.prompts import FILTER_PROMPT
-from services.config import GMAIL_SCOPES, DATA_DIR, OUTPUT_DIR
+from fastapi.concurrency import run_in_threadpool
+from services.openai_service import chat_completion
+from services.prompts import SEMANTIC_FILTER_TEMPLATE
+from services.tokenizer import truncate_to_tokens
+from services.html_text import html_to_text, clean_bodies
+from services.config import GMAIL_SCOPES, DATA_DIR, OUTPUT_DIR, EMAIL_STRIP_QUOTES
+from services.storage import write_json, write_text_atomic
+from services.metrics import GMAIL_API_CALLS, GMAIL_API_SECONDS
+from services import tracing
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import html
 import json
 import base64
 import re
+import time
 from pathlib import Path
 
+# Token budget for the email body in the semantic filter prompt; relevance is
+# decided from the opening of the email, so this stays below the ~110 tokens
+# the old 500-character slice sent
+FILTER_BODY_TOKENS = 100
+
+# Reply/forward prefixes, optionally counted ("Re[2]:") or tagged ("Fwd [EXT]:")
+SUBJECT_PREFIX_RE = re.compile(r"^(re|fwd?|aw|sv|antw)\s*(\[[^\]]*\]|\(\d+\))?\s*:")
+
 
 async def ai_semantic_filter(email: dict, target_category: str) -> bool:
     """Use AI to determine if email semantically matches the target category"""
     try:
-        response = openai_client.chat.completions.create(
+        response = await run_in_threadpool(
+            chat_completion,
+            SEMANTIC_FILTER_TEMPLATE.name,
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": FILTER_PROMPT.format(
-                    category=target_category,
-                    subject=email.get("subject", ""),
-                    body=email.get("body", "")[:500]
-                )}
-            ],
+            messages=SEMANTIC_FILTER_TEMPLATE.messages(
+                f"Category to match: {target_category}\n\n"
+                f"Email subject: {email.get('subject', '')}\n"
+                f"Email body: {truncate_to_tokens(email.get('body', ''), FILTER_BODY_TOKENS)}"
+            ),
             temperature=0.1,
             max_tokens=10
         )
@@ -49,31 +61,11 @@ async def ai_semantic_filter(email: dict, target_category: str) -> bool:
         return False
 
 
-def clean_email_body(raw_body: str, max_length: int = 1000) -> str:
-    """Clean HTML email body to readable text"""
+def clean_email_body(raw_body: str, max_tokens: int = 250, strip_quotes: bool = False) -> str:
+    """Clean HTML email body to readable text, capped at max_tokens tokens"""
     if not raw_body:
         return ""
-    
-    try:
-        soup = BeautifulSoup(raw_body, "html.parser")
-        for tag in soup(["script", "style"]):
-            tag.extract()
-        
-        text = soup.get_text(separator=" ", strip=True)
-        text = html.unescape(text)
-        text = " ".join(text.split())
-        
-        if len(text) > max_length:
-            text = text[:max_length] + "..."
-        
-        return text
-    
-    except Exception as e:
-        # Fallback: basic HTML tag removal with regex
-        text = re.sub(r'<[^>]+>', ' ', raw_body)
-        text = html.unescape(text)
-        text = " ".join(text.split())
-        return text[:max_length] if len(text) > max_length else text
+    return truncate_to_tokens(html_to_text(raw_body, strip_quotes), max_tokens, suffix="...")
 
 
 def extract_email_address(sender: str) -> str:
@@ -88,44 +80,69 @@ def extract_email_address(sender: str) -> str:
     return sender.strip()
 
 
+def parse_email_date(value: str):
+    """Parse an email date (RFC 2822 or ISO 8601) into epoch seconds, or None"""
+    if not value:
+        return None
+
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
 def normalize_subject(subject: str) -> str:
-    """Normalize email subject by removing Re:/Fwd: prefixes for thread grouping"""
+    """Normalize email subject by repeatedly removing Re:/Fwd: prefixes for thread grouping"""
     if not subject:
         return ""
     
     normalized = subject.lower().strip()
-    prefixes = ["re:", "fwd:", "fw:", "re [", "fwd ["]
+    while True:
+        stripped = SUBJECT_PREFIX_RE.sub("", normalized, count=1).strip()
+        if stripped == normalized:
+            break
+        normalized = stripped
     
-    for prefix in prefixes:
-        if normalized.startswith(prefix):
-            normalized = normalized[len(prefix):].strip()
-    
-    return normalized
+    return " ".join(normalized.split())
 
 
 def group_emails_into_threads(emails: list) -> dict:
-    """Group emails by normalized subject to identify threads"""
-    threads = {}
-    
-    for email in emails:
-        subject = email.get("subject", "")
-        normalized = normalize_subject(subject)
-        key = normalized if normalized else subject
-        
-        if key not in threads:
-            threads[key] = []
-        
-        threads[key].append(email)
+    """Group emails into threads by Message-ID/In-Reply-To/References, falling back to subject"""
+    # Imported here: the thread index itself builds on the helpers in this module
+    from services.thread_index import ThreadIndex
     
-    # Sort each thread by date ascending
-    for thread_key in threads:
-        threads[thread_key].sort(key=lambda x: x.get("date", ""))
+    index = ThreadIndex()
+    touched = index.add_emails(emails)
     
-    return threads
+    # Each thread is sorted chronologically on the parsed date
+    return index.threads_for(touched)
+
+
+def extract_message_headers(headers: list) -> dict:
+    """Threading headers (Message-ID, In-Reply-To, References) from a Gmail payload"""
+    values = {h.get("name", "").lower(): h.get("value", "") for h in headers}
+    return {
+        "message_id": values.get("message-id", "").strip(),
+        "in_reply_to": values.get("in-reply-to", "").strip(),
+        "references": values.get("references", "").split()
+    }
 
 
 def get_gmail_service():
     """Get authenticated Gmail service - shared helper for all Gmail operations"""
+    # Google client libraries are heavy; load them only when Gmail is used
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+    from googleapiclient.discovery import build
+
     creds = None
     creds_path = Path(__file__).parent.parent / "credentials.json"
     token_path = Path(__file__).parent.parent / "token.json"
@@ -210,32 +227,47 @@ def get_gmail_service():
                 )
         
         # Save credentials for future use
-        with open(token_path, "w") as token:
-            token.write(creds.to_json())
+        write_text_atomic(token_path, creds.to_json())
 
     # Step 2: Connect to Gmail API
     service = build("gmail", "v1", credentials=creds)
     return service
 
 
+def gmail_execute(request, method: str):
+    """Run a Gmail API request, counting and timing it for /metrics and the request trace"""
+    started = time.perf_counter()
+    try:
+        with tracing.span(f"gmail.{method}"):
+            result = request.execute()
+    except Exception:
+        GMAIL_API_CALLS.inc(method=method, outcome="error")
+        raise
+    finally:
+        GMAIL_API_SECONDS.observe(time.perf_counter() - started, method=method)
+    GMAIL_API_CALLS.inc(method=method, outcome="ok")
+    return result
+
+
 def fetch_gmail_emails_internal():
     """Internal function to fetch Gmail emails - returns data without HTTP response"""
     service = get_gmail_service()
 
     try:
         # Step 3: Fetch recent messages
-        results = service.users().messages().list(userId="me", maxResults=10).execute()
+        results = gmail_execute(service.users().messages().list(userId="me", maxResults=10), "messages.list")
         messages = results.get("messages", [])
 
         emails = []
 
         # Step 4: Parse each email
         for msg in messages:
-            msg_data = service.users().messages().get(userId="me", id=msg["id"]).execute()
+            msg_data = gmail_execute(service.users().messages().get(userId="me", id=msg["id"]), "messages.get")
             payload = msg_data.get("payload", {})
             headers = payload.get("headers", [])
             subject = next((h["value"] for h in headers if h["name"] == "Subject"), "")
             sender = next((h["value"] for h in headers if h["name"] == "From"), "")
+            recipients = next((h["value"] for h in headers if h["name"] == "To"), "")
             date = next((h["value"] for h in headers if h["name"] == "Date"), "")
             snippet = msg_data.get("snippet", "")
 
@@ -263,9 +295,6 @@ def fetch_gmail_emails_internal():
                 if body_data:
                     raw_body = base64.urlsafe_b64decode(body_data).decode("utf-8", errors="ignore")
 
-            # Clean the email body
-            cleaned_body = clean_email_body(raw_body)
-            
             # Clean sender email address
             clean_sender = extract_email_address(sender)
             
@@ -276,17 +305,23 @@ def fetch_gmail_emails_internal():
             emails.append({
                 "id": msg["id"],
                 "from": clean_sender,
+                "to": recipients,
                 "subject": subject,
                 "date": date,
                 "snippet": clean_snippet,
-                "body": cleaned_body,
-                "clean_status": "ok"
+                "body": raw_body,
+                "clean_status": "ok",
+                **extract_message_headers(headers)
             })
 
+        # Clean all bodies in one batch (on the process pool for large fetches)
+        cleaned_bodies = clean_bodies([e["body"] for e in emails], strip_quotes=EMAIL_STRIP_QUOTES)
+        for email, cleaned_body in zip(emails, cleaned_bodies):
+            email["body"] = cleaned_body
+
         # Step 5: Save cleaned emails to JSON file
         emails_file = DATA_DIR / "emails_cleaned.json"
-        with open(emails_file, "w", encoding="utf-8") as f:
-            json.dump(emails, f, indent=2, ensure_ascii=False)
+        write_json(emails_file, emails)
 
         return emails
     
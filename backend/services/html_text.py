@@ -0,0 +1,143 @@
+"""Fast HTML-to-text conversion and quote/signature stripping for email bodies
+
+html_to_text tokenizes the markup with a handful of precompiled regexes
+instead of building a parse tree: script/style blocks and comments are
+dropped, every tag becomes a separator, and entities are decoded once at the
+end. The result matches BeautifulSoup's get_text(" ", strip=True) followed by
+whitespace collapsing on ordinary mail, at a fraction of the CPU cost.
+
+strip_quotes removes the quoted history and signature from a reply (Gmail
+and Outlook quote blocks in HTML, "On ... wrote:" / "Original Message"
+headers, ">" lines and "-- " signatures in text) so only the new content is
+kept. It never returns an empty body: if nothing would remain, the input is
+returned unchanged.
+
+clean_bodies converts many bodies at once on a process pool; small batches
+run inline because shipping them to workers costs more than converting them.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from services.config import CLEAN_WORKERS, CLEAN_POOL_MIN_BATCH
+from services.tokenizer import truncate_to_tokens
+import html
+import multiprocessing
+import re
+import threading
+
+_FLAGS = re.IGNORECASE | re.DOTALL
+
+# Elements whose content is never text (same as the BeautifulSoup path)
+_INVISIBLE_RE = re.compile(r"<(script|style)\b[^>]*>.*?</\1\s*>", _FLAGS)
+_COMMENT_RE = re.compile(r"<!--.*?(?:-->|$)|<!\[CDATA\[.*?\]\]>", re.DOTALL)
+# A tag is "<" followed by a letter, "/", "!" or "?"; quoted attribute values
+# may contain ">", and a bare "<" in text (e.g. "a < b") is left alone
+_TAG_RE = re.compile(r"</?[A-Za-z!?][^\"'>]*(?:(?:\"[^\"]*\"|'[^']*')[^\"'>]*)*>")
+# Tags that end a line of text, so line-based quote detection still works
+_BLOCK_TAG_RE = re.compile(
+    r"<(?:br|/?p|/?div|/?tr|/?li|/?h[1-6]|/?blockquote|/?table|hr)\b[^>]*>", re.IGNORECASE
+)
+_LOOKS_LIKE_HTML_RE = re.compile(r"<[A-Za-z!/]")
+
+# Where quoted history starts in HTML replies (Gmail, Outlook, Apple Mail, Yahoo)
+_HTML_QUOTE_START_RE = re.compile(
+    r"<(?:div|blockquote|span)\b[^>]*(?:"
+    r"class=[\"']?(?:gmail_quote|gmail_signature|yahoo_quoted|moz-cite-prefix)"
+    r"|id=[\"']?(?:divRplyFwdMsg|appendonsend|Signature)"
+    r"|type=[\"']?cite)"
+    r"|<hr\b[^>]*id=[\"']?stopSpelling",
+    re.IGNORECASE
+)
+
+# Lines that start quoted history or a signature in text bodies
+_REPLY_HEADER_RE = re.compile(
+    r"^\s*(?:On\s.{1,200}\swrote:|-{2,}\s*Original Message\s*-{2,}"
+    r"|_{10,}|Sent from my \w+|Get Outlook for \w+)\s*$",
+    re.IGNORECASE
+)
+_SIGNATURE_DELIMITER_RE = re.compile(r"^--\s?$")
+_OUTLOOK_FROM_RE = re.compile(r"^\s*From:\s.+", re.IGNORECASE)
+_OUTLOOK_SENT_RE = re.compile(r"^\s*(?:Sent|Date):\s.+", re.IGNORECASE)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def looks_like_html(text: str) -> bool:
+    """Whether the body contains markup"""
+    return bool(text) and _LOOKS_LIKE_HTML_RE.search(text) is not None
+
+
+def _markup_to_lines(raw: str) -> str:
+    """Markup to text with block elements as line breaks (entities decoded)"""
+    text = _COMMENT_RE.sub(" ", raw)
+    text = _INVISIBLE_RE.sub(" ", text)
+    text = _BLOCK_TAG_RE.sub("\n", text)
+    text = _TAG_RE.sub(" ", text)
+    return html.unescape(text)
+
+
+def _cut_html_quote(raw: str) -> str:
+    """HTML before the first quoted-history or signature block"""
+    match = _HTML_QUOTE_START_RE.search(raw)
+    if match and match.start() > 0:
+        return raw[:match.start()]
+    return raw
+
+
+def strip_quoted_lines(text: str) -> str:
+    """Text before the first reply header or signature, without ">" quoted lines"""
+    lines = text.splitlines()
+    kept = []
+    for i, line in enumerate(lines):
+        # "On <date>, <name> wrote:" is often wrapped over two lines
+        joined = f"{line} {lines[i + 1]}" if i + 1 < len(lines) else line
+        if _REPLY_HEADER_RE.match(line) or _REPLY_HEADER_RE.match(joined) or _SIGNATURE_DELIMITER_RE.match(line):
+            break
+        # Outlook header block: "From: ..." followed shortly by "Sent: ..."
+        if _OUTLOOK_FROM_RE.match(line) and any(_OUTLOOK_SENT_RE.match(l) for l in lines[i + 1:i + 4]):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        kept.append(line)
+    result = "\n".join(kept)
+    return result if result.strip() else text
+
+
+def html_to_text(raw: str, strip_quotes: bool = False) -> str:
+    """Visible text of an email body (HTML or plain) with whitespace collapsed"""
+    if not raw:
+        return ""
+    if looks_like_html(raw):
+        if strip_quotes:
+            raw = _cut_html_quote(raw)
+        text = _markup_to_lines(raw)
+    else:
+        text = html.unescape(raw)
+    if strip_quotes:
+        text = strip_quoted_lines(text)
+    return " ".join(text.split())
+
+
+def _clean_one(args: tuple) -> str:
+    raw, max_tokens, strip_quotes = args
+    return truncate_to_tokens(html_to_text(raw, strip_quotes), max_tokens, suffix="...")
+
+
+def _get_pool():
+    """Shared worker pool, started on first use with spawn (safe next to server threads)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=CLEAN_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def clean_bodies(raw_bodies: list, max_tokens: int = 250, strip_quotes: bool = False) -> list:
+    """Clean many bodies, on the process pool when the batch is large enough to pay for it"""
+    jobs = [(raw or "", max_tokens, strip_quotes) for raw in raw_bodies]
+    if CLEAN_WORKERS <= 1 or len(jobs) < CLEAN_POOL_MIN_BATCH:
+        return [_clean_one(job) for job in jobs]
+    chunksize = max(1, len(jobs) // (CLEAN_WORKERS * 4))
+    return list(_get_pool().map(_clean_one, jobs, chunksize=chunksize))
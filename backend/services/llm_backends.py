@@ -0,0 +1,323 @@
+"""Pluggable chat-completion backends
+
+LLM_BACKEND selects where completions come from:
+- "openai": the OpenAI API (default)
+- "local": any OpenAI-compatible server (Ollama, vLLM, llama.cpp) at LLM_LOCAL_BASE_URL
+- "fake": an in-process model with configurable latency, jitter and error rate
+  that returns canned, schema-valid responses derived from the prompt, for
+  offline load testing without network access or API spend
+"""
+from services.config import (
+    OPENAI_TIMEOUT,
+    LLM_LOCAL_BASE_URL,
+    LLM_LOCAL_API_KEY,
+    LLM_LOCAL_MODEL,
+    FAKE_LLM_LATENCY,
+    FAKE_LLM_JITTER,
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_SEED
+)
+from services.llm_schemas import (
+    EmailSummary,
+    ThreadAnalysis,
+    ProcurementAnalysis,
+    DaySummary,
+    WeeklyReport,
+    ReplySuggestions,
+    VendorReply
+)
+from services import prompts
+from services.tokenizer import count_tokens
+import csv
+import io
+import json
+import random
+import re
+import threading
+import time
+
+
+class OpenAIBackend:
+    """OpenAI or OpenAI-compatible server, optionally forcing a model name"""
+
+    def __init__(self, client, model: str = None):
+        self.client = client
+        self.model = model
+        self.name = "openai" if model is None else f"local:{model}"
+
+    def create(self, **kwargs):
+        if self.model:
+            kwargs["model"] = self.model
+            # Some local chat templates accept a single system message only
+            kwargs["messages"] = _join_leading_system(kwargs.get("messages", []))
+        return self.client.chat.completions.create(**kwargs)
+
+
+def _join_leading_system(messages: list) -> list:
+    """Merge the leading system messages into one (the joined text keeps the same prefix)"""
+    count = 0
+    while count < len(messages) and messages[count].get("role") == "system":
+        count += 1
+    if count < 2:
+        return messages
+    joined = "\n\n".join(m.get("content", "") for m in messages[:count])
+    return [{"role": "system", "content": joined}] + messages[count:]
+
+
+# Keywords the fake model uses to pick an email category
+_FAKE_CATEGORY_KEYWORDS = {
+    "RFI": ["rfi", "request for information", "clarif", "confirm"],
+    "Material Delay": ["delay", "shipment", "delivery", "backorder"],
+    "Schedule Update": ["schedule", "timeline", "milestone", "progress"],
+    "Submittal": ["submittal", "shop drawing", "product data", "sample"],
+    "Coordination": ["coordination", "conflict", "meeting", "clash"]
+}
+
+
+def _field(text: str, label: str, default: str = "") -> str:
+    """Value of a 'LABEL: value' line in a prompt"""
+    match = re.search(rf"^[-\s]*{re.escape(label)}:\s*(.*)$", text, re.MULTILINE)
+    return match.group(1).strip() if match else default
+
+
+def _csv_rows(text: str) -> list:
+    """Rows of the CSV block that starts at the first line containing a comma and ends at a blank line"""
+    lines = text.splitlines()
+    start = next((i for i, line in enumerate(lines) if "," in line), None)
+    if start is None:
+        return []
+    end = next((i for i in range(start, len(lines)) if not lines[i].strip()), len(lines))
+    return list(csv.DictReader(io.StringIO("\n".join(lines[start:end]))))
+
+
+def _fake_summary(user: str) -> EmailSummary:
+    text = user.lower()
+    category = next((c for c, words in _FAKE_CATEGORY_KEYWORDS.items() if any(w in text for w in words)), "General")
+    priority = "High" if any(w in text for w in ("urgent", "asap", "critical")) else "Medium"
+    subject = _field(user, "Subject", "the email")
+    return EmailSummary(
+        category=category,
+        summary=f"Email about {subject}.",
+        action_required="Review and respond.",
+        priority=priority,
+        due_date=""
+    )
+
+
+def _fake_filter(user: str) -> str:
+    category = _field(user, "Category to match").lower()
+    email_text = user.split("\n", 1)[-1].lower()
+    keywords = {c.lower(): words for c, words in _FAKE_CATEGORY_KEYWORDS.items()}
+    return "yes" if any(w in email_text for w in keywords.get(category, [category])) else "no"
+
+
+def _fake_thread_analysis(user: str) -> ThreadAnalysis:
+    rows = _csv_rows(user.split("NOW ANALYZE THIS THREAD:", 1)[-1])
+    senders = list(dict.fromkeys(r.get("from", "") for r in rows if r.get("from")))
+    receivers = list(dict.fromkeys(r.get("to", "") for r in rows if r.get("to")))
+    dates = [r.get("date", "")[:10] for r in rows if r.get("date")]
+    responded = len(senders) > 1
+    follow_ups = sum(1 for r in rows if r.get("from") == (senders[0] if senders else None))
+    risk = "LOW" if responded else ("HIGH" if follow_ups >= 3 else "MEDIUM")
+    return ThreadAnalysis(
+        thread_subject=rows[0].get("subject", "") if rows else "",
+        project_guess="Unknown",
+        participants={
+            "from_domain": senders[0].split("@")[-1] if senders else "",
+            "to_domain": receivers[0].split("@")[-1] if receivers else "",
+            "senders": senders,
+            "receivers": receivers
+        },
+        counts={
+            "total_emails": len(rows),
+            "follow_up_count": follow_ups,
+            "unanswered_emails": 0 if responded else len(rows)
+        },
+        timeline={
+            "first_email_date": dates[0] if dates else None,
+            "last_email_date": dates[-1] if dates else None
+        },
+        response_detected=responded,
+        issue_detected="Reply received" if responded else "Non-responsive recipient",
+        impact_area="Communication",
+        risk_level=risk,
+        reason=f"{len(senders)} distinct sender(s) across {len(rows)} email(s).",
+        recommended_action="No action needed." if responded else "Follow up with the recipient."
+    )
+
+
+def _fake_procurement(user: str) -> ProcurementAnalysis:
+    vendors = []
+    for block in user.split("FILE: ")[1:]:
+        header, _, data = block.partition("\n")
+        match = re.search(r"\| VENDOR: (.*?) \| ROWS:", header)
+        name = match.group(1) if match else header
+        rows = _csv_rows(data)
+        columns = list(rows[0].keys()) if rows else []
+        missing = [c for c in columns if any(not (r.get(c) or "").strip() for r in rows)]
+        if not missing:
+            completeness = "Complete"
+        elif len(missing) * 2 < len(columns):
+            completeness = "Partial"
+        else:
+            completeness = "Incomplete"
+        vendors.append({
+            "vendor_name": name,
+            "completeness": completeness,
+            "missing_fields": missing,
+            "remarks": f"{len(missing)} field(s) with missing values."
+        })
+    counts = {c: sum(1 for v in vendors if v["completeness"] == c) for c in ("Complete", "Partial", "Incomplete")}
+    return ProcurementAnalysis(vendors=vendors, ai_metadata={
+        "total_vendors": len(vendors),
+        "complete": counts["Complete"],
+        "partial": counts["Partial"],
+        "incomplete": counts["Incomplete"],
+        "confidence_score": 0.9
+    })
+
+
+def _fake_day_summary(user: str) -> DaySummary:
+    rows = _csv_rows(user.split("EMAILS (CSV):", 1)[-1])
+    return DaySummary(
+        date=_field(user, "DATE"),
+        email_count=len(rows),
+        progress_highlights=[r.get("subject", "") for r in rows[:3]],
+        active_issues=[r.get("subject", "") for r in rows if "delay" in (r.get("body") or "").lower()][:3]
+    )
+
+
+def _fake_merge(user: str) -> DaySummary:
+    try:
+        partials = json.loads(user.split("PARTIAL SUMMARIES:", 1)[-1])
+    except json.JSONDecodeError:
+        partials = []
+    merged = DaySummary(date=min((p.get("date") or "" for p in partials), default=""))
+    for partial in partials:
+        merged.email_count += partial.get("email_count") or 0
+        merged.change_orders += partial.get("change_orders") or 0
+        merged.progress_highlights.extend(partial.get("progress_highlights") or [])
+        merged.active_issues.extend(partial.get("active_issues") or [])
+    return merged
+
+
+def _fake_weekly_report(user: str) -> WeeklyReport:
+    return WeeklyReport(
+        project_name=_field(user, "PROJECT"),
+        week_range=_field(user, "DATE RANGE"),
+        progress_highlights=["Work progressed per the daily summaries."],
+        active_issues=[],
+        schedule_status={"overall": "On Track"},
+        ai_summary_metadata={"confidence_score": 0.9, "key_tags": ["fake"]}
+    )
+
+
+def _fake_replies(user: str) -> ReplySuggestions:
+    subject = _field(user, "Subject", "your email")
+    return ReplySuggestions(replies=[
+        f"Thank you for your email regarding {subject}. We will review and respond shortly.",
+        f"Received, thanks. Could you share any additional details on {subject}?",
+        f"Thanks for the update on {subject}. I have shared it with the team for action."
+    ])
+
+
+def _fake_vendor_reply(user: str) -> VendorReply:
+    subject = _field(user, "Subject", "Follow-up")
+    return VendorReply(
+        subject=f"Re: {subject}",
+        body=f"Hello,\n\nFollowing up on {subject}. Please send an update at your earliest convenience.\n\nThank you."
+    )
+
+
+class FakeBackend:
+    """In-process model: canned schema-valid responses with simulated latency and errors"""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.1, error_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._count = 0
+        self._seen_prefixes = set()
+        # Responders keyed by each template's static prefix (the last system message)
+        self._responders = {
+            prompts.EMAIL_SUMMARY_TEMPLATE.static_prefix: _fake_summary,
+            prompts.SEMANTIC_FILTER_TEMPLATE.static_prefix: _fake_filter,
+            prompts.THREAD_ANALYSIS_TEMPLATE.static_prefix: _fake_thread_analysis,
+            prompts.PROCUREMENT_TEMPLATE.static_prefix: _fake_procurement,
+            prompts.DAILY_SUMMARY_TEMPLATE.static_prefix: _fake_day_summary,
+            prompts.MERGE_SUMMARIES_TEMPLATE.static_prefix: _fake_merge,
+            prompts.WEEKLY_REPORT_TEMPLATE.static_prefix: _fake_weekly_report,
+            prompts.AI_REPLY_TEMPLATE.static_prefix: _fake_replies,
+            prompts.VENDOR_REPLY_TEMPLATE.static_prefix: _fake_vendor_reply
+        }
+
+    def create(self, **kwargs):
+        with self._lock:
+            self._count += 1
+            count = self._count
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+            systems = [m.get("content", "") for m in kwargs.get("messages", []) if m.get("role") == "system"]
+            prefix = "\n".join(systems)
+            prefix_seen = prefix in self._seen_prefixes
+            self._seen_prefixes.add(prefix)
+        time.sleep(delay)
+        if fail:
+            import httpx
+            from openai import APITimeoutError
+            raise APITimeoutError(request=httpx.Request("POST", "http://fake-llm/v1/chat/completions"))
+
+        messages = kwargs.get("messages", [])
+        user = next((m.get("content", "") for m in messages if m.get("role") == "user"), "")
+        responder = self._responders.get(systems[-1] if systems else "")
+        if responder is None:
+            content = "{}"
+        else:
+            result = responder(user)
+            content = result if isinstance(result, str) else result.model_dump_json()
+
+        prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = count_tokens(content)
+        # Mimic provider prompt caching: repeated system prefixes of 1024+ tokens are served from cache
+        system_tokens = sum(count_tokens(system) for system in systems)
+        cached_tokens = system_tokens if prefix_seen and system_tokens >= 1024 else 0
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate({
+            "id": f"chatcmpl-fake-{count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": kwargs.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }
+        })
+
+
+def create_backend(name: str, openai_client=None):
+    """Backend for an LLM_BACKEND name"""
+    if name == "openai":
+        return OpenAIBackend(openai_client)
+    if name == "local":
+        from openai import OpenAI
+        local_client = OpenAI(
+            api_key=LLM_LOCAL_API_KEY or "local",
+            base_url=LLM_LOCAL_BASE_URL,
+            timeout=OPENAI_TIMEOUT,
+            max_retries=0
+        )
+        return OpenAIBackend(local_client, model=LLM_LOCAL_MODEL)
+    if name == "fake":
+        return FakeBackend(FAKE_LLM_LATENCY, FAKE_LLM_JITTER, FAKE_LLM_ERROR_RATE, FAKE_LLM_SEED)
+    raise ValueError(f"Unknown LLM_BACKEND: {name} (expected openai, local or fake)")
@@ -0,0 +1,71 @@
+"""Per-call-site LLM usage metrics
+
+Records token usage from each completion's `usage` field, including the
+prompt tokens the provider served from its prefix cache, so the effect of
+static-prefix prompt ordering can be tracked per call site.
+"""
+from services.metrics import LLM_CALLS, LLM_CALL_SECONDS, LLM_TOKENS
+import threading
+
+_lock = threading.Lock()
+_stats = {}
+
+
+def _usage_value(usage, *path):
+    """Read a nested usage field from an SDK object or a plain dict"""
+    value = usage
+    for name in path:
+        if value is None:
+            return 0
+        value = value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+    return value or 0
+
+
+def record_llm_call(call_site: str, model: str, usage, latency_seconds: float,
+                    estimated_input_tokens: int = 0, error: bool = False) -> None:
+    """Add one completion's usage to the call site's totals"""
+    prompt_tokens = _usage_value(usage, "prompt_tokens")
+    cached_tokens = _usage_value(usage, "prompt_tokens_details", "cached_tokens")
+    completion_tokens = _usage_value(usage, "completion_tokens")
+
+    with _lock:
+        stats = _stats.setdefault((call_site, model), {
+            "call_site": call_site,
+            "model": model,
+            "calls": 0,
+            "errors": 0,
+            "estimated_input_tokens": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_latency_seconds": 0.0,
+            "last_cached_prompt_tokens": 0
+        })
+        stats["calls"] += 1
+        stats["errors"] += 1 if error else 0
+        stats["estimated_input_tokens"] += estimated_input_tokens
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_prompt_tokens"] += cached_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["total_latency_seconds"] += latency_seconds
+        stats["last_cached_prompt_tokens"] = cached_tokens
+
+    # Same numbers for /metrics
+    LLM_CALLS.inc(call_site=call_site, model=model, outcome="error" if error else "ok")
+    LLM_CALL_SECONDS.observe(latency_seconds, call_site=call_site, model=model)
+    for token_type, count in (("prompt", prompt_tokens), ("cached_prompt", cached_tokens), ("completion", completion_tokens)):
+        if count:
+            LLM_TOKENS.inc(count, call_site=call_site, model=model, type=token_type)
+
+
+def get_llm_metrics() -> list:
+    """Snapshot of per-call-site totals with derived averages and cache hit ratio"""
+    with _lock:
+        snapshot = [dict(s) for s in _stats.values()]
+    for stats in snapshot:
+        calls = stats["calls"] or 1
+        stats["avg_latency_seconds"] = round(stats["total_latency_seconds"] / calls, 3)
+        stats["cached_prompt_ratio"] = round(
+            stats["cached_prompt_tokens"] / stats["prompt_tokens"], 3
+        ) if stats["prompt_tokens"] else 0.0
+    return sorted(snapshot, key=lambda s: (s["call_site"], s["model"]))
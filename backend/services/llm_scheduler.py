@@ -0,0 +1,129 @@
+"""Process-wide LLM admission scheduler
+
+Every completion request is admitted through token buckets for requests per
+minute and tokens per minute (estimated input tokens plus max_tokens, which is
+how the provider counts TPM). Waiting requests form one priority queue:
+interactive calls always go ahead of batch work, and batch calls may not dip
+into a reserved share of each bucket, so a large summarize or analyze run soaks
+up spare capacity without delaying reply suggestions.
+"""
+from services.config import LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_INTERACTIVE_RESERVE
+import heapq
+import itertools
+import threading
+import time
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+
+class TokenBucket:
+    """Bucket refilled continuously at capacity per minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` in the bucket"""
+        needed = min(amount + reserve, self.capacity) - self.level
+        return max(0.0, needed / self.rate) if self.rate else 0.0
+
+
+class LLMScheduler:
+    """RPM/TPM token buckets with a priority queue of waiting requests"""
+
+    def __init__(self, rpm: int, tpm: int, interactive_reserve: float = 0.2):
+        self.enabled = rpm > 0 and tpm > 0
+        self.requests = TokenBucket(rpm or 1)
+        self.tokens = TokenBucket(tpm or 1)
+        self.interactive_reserve = interactive_reserve
+        self._queue = []  # (priority, sequence)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stats = {
+            name: {"queued": 0, "admitted": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for name in PRIORITIES
+        }
+
+    def _reserve(self, bucket: TokenBucket, priority: str) -> float:
+        """Capacity batch requests must leave untouched"""
+        return bucket.capacity * self.interactive_reserve if priority == BATCH else 0.0
+
+    def acquire(self, estimated_tokens: int, priority: str = BATCH) -> float:
+        """Block until the request is admitted; return the seconds spent waiting"""
+        if not self.enabled:
+            return 0.0
+        if priority not in PRIORITIES:
+            priority = BATCH
+
+        tokens = min(max(1, estimated_tokens), self.tokens.capacity)
+        entry = (PRIORITIES[priority], next(self._sequence))
+        started = time.monotonic()
+
+        with self._condition:
+            heapq.heappush(self._queue, entry)
+            self._stats[priority]["queued"] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    wait = 0.5
+                    if self._queue[0] == entry:
+                        wait = max(
+                            self.requests.wait_time(1, self._reserve(self.requests, priority)),
+                            self.tokens.wait_time(tokens, self._reserve(self.tokens, priority))
+                        )
+                        if wait == 0:
+                            self.requests.level -= 1
+                            self.tokens.level -= tokens
+                            break
+                    # Woken early when the queue head changes (e.g. an interactive call arrives)
+                    self._condition.wait(timeout=min(wait, 0.5))
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._stats[priority]["queued"] -= 1
+                self._condition.notify_all()
+
+            waited = time.monotonic() - started
+            stats = self._stats[priority]
+            stats["admitted"] += 1
+            stats["total_wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+        return waited
+
+    def status(self) -> dict:
+        """Queue depth, wait times and bucket levels"""
+        with self._condition:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            classes = {}
+            for name, stats in self._stats.items():
+                classes[name] = {
+                    "queue_depth": stats["queued"],
+                    "admitted": stats["admitted"],
+                    "avg_wait_seconds": round(stats["total_wait_seconds"] / stats["admitted"], 3) if stats["admitted"] else 0.0,
+                    "max_wait_seconds": round(stats["max_wait_seconds"], 3)
+                }
+            return {
+                "enabled": self.enabled,
+                "rpm_limit": int(self.requests.capacity) if self.enabled else 0,
+                "tpm_limit": int(self.tokens.capacity) if self.enabled else 0,
+                "interactive_reserve": self.interactive_reserve,
+                "requests_available": int(self.requests.level),
+                "tokens_available": int(self.tokens.level),
+                "classes": classes
+            }
+
+
+llm_scheduler = LLMScheduler(LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_INTERACTIVE_RESERVE)
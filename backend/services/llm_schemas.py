@@ -0,0 +1,136 @@
+"""Pydantic schemas for structured LLM outputs
+
+One model per prompt that returns JSON. Responses are validated against these
+instead of being hand-parsed, and fields the model may omit have defaults so
+only genuinely malformed output triggers a repair retry.
+"""
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+
+# Email summary (/api/summarize)
+class EmailSummary(BaseModel):
+    category: Literal["RFI", "Material Delay", "Schedule Update", "Submittal", "Coordination", "General"] = "General"
+    summary: str
+    action_required: str = ""
+    priority: Literal["High", "Medium", "Low"] = "Medium"
+    due_date: Optional[str] = ""
+
+
+# Email thread analysis (/api/emails/analyze)
+class ThreadParticipants(BaseModel):
+    from_domain: str = ""
+    to_domain: str = ""
+    senders: List[str] = Field(default_factory=list)
+    receivers: List[str] = Field(default_factory=list)
+
+
+class ThreadCounts(BaseModel):
+    total_emails: int = 0
+    follow_up_count: int = 0
+    unanswered_emails: int = 0
+
+
+class ThreadTimeline(BaseModel):
+    first_email_date: Optional[str] = None
+    last_email_date: Optional[str] = None
+    days_between_first_and_last: Optional[float] = None
+
+
+class ThreadKpis(BaseModel):
+    avg_gap_days: float = 0
+    last_gap_days: float = 0
+
+
+class ThreadAnalysis(BaseModel):
+    thread_subject: str
+    project_guess: str = "Unknown"
+    participants: ThreadParticipants = Field(default_factory=ThreadParticipants)
+    counts: ThreadCounts = Field(default_factory=ThreadCounts)
+    timeline: ThreadTimeline = Field(default_factory=ThreadTimeline)
+    response_detected: bool
+    issue_detected: str = ""
+    impact_area: str = ""
+    risk_level: Literal["LOW", "MEDIUM", "HIGH"]
+    reason: str = ""
+    recommended_action: str = ""
+    kpis: ThreadKpis = Field(default_factory=ThreadKpis)
+
+
+# Procurement completeness (/api/procurement/analyze)
+class VendorClassification(BaseModel):
+    vendor_name: str
+    completeness: Literal["Complete", "Partial", "Incomplete"]
+    missing_fields: List[str] = Field(default_factory=list)
+    remarks: str = ""
+
+
+class ProcurementMetadata(BaseModel):
+    total_vendors: int = 0
+    complete: int = 0
+    partial: int = 0
+    incomplete: int = 0
+    confidence_score: Optional[float] = None
+
+
+class ProcurementAnalysis(BaseModel):
+    vendors: List[VendorClassification]
+    ai_metadata: ProcurementMetadata = Field(default_factory=ProcurementMetadata)
+
+
+# Weekly report map/merge steps
+class DaySummary(BaseModel):
+    date: str = ""
+    email_count: int = 0
+    progress_highlights: List[str] = Field(default_factory=list)
+    active_issues: List[str] = Field(default_factory=list)
+    subcontractor_notes: List[str] = Field(default_factory=list)
+    milestones: List[str] = Field(default_factory=list)
+    change_orders: int = 0
+
+
+# Weekly report final step (/api/reports/weekly)
+class SubcontractorPerformance(BaseModel):
+    responsive: List[str] = Field(default_factory=list)
+    attention_needed: List[str] = Field(default_factory=list)
+    average_response_time_hours: Optional[float] = None
+
+
+class ScheduleStatus(BaseModel):
+    overall: str = "Unknown"
+    critical_path_float_days: Optional[float] = None
+    substantial_completion_date: Optional[str] = None
+
+
+class BudgetAndChanges(BaseModel):
+    change_orders_this_week: int = 0
+    contingency_remaining_percent: Optional[float] = None
+
+
+class ReportMetadata(BaseModel):
+    confidence_score: Optional[float] = None
+    key_tags: List[str] = Field(default_factory=list)
+    generated_at: Optional[str] = None
+
+
+class WeeklyReport(BaseModel):
+    project_name: str
+    week_range: str = ""
+    progress_highlights: List[str] = Field(default_factory=list)
+    active_issues: List[str] = Field(default_factory=list)
+    subcontractor_performance: SubcontractorPerformance = Field(default_factory=SubcontractorPerformance)
+    schedule_status: ScheduleStatus = Field(default_factory=ScheduleStatus)
+    upcoming_milestones: List[str] = Field(default_factory=list)
+    budget_and_changes: BudgetAndChanges = Field(default_factory=BudgetAndChanges)
+    ai_summary_metadata: ReportMetadata = Field(default_factory=ReportMetadata)
+
+
+# Reply suggestions (/api/ai/reply)
+class ReplySuggestions(BaseModel):
+    replies: List[str] = Field(min_length=1)
+
+
+# Subcontractor follow-up email (/api/vendors/generate-reply)
+class VendorReply(BaseModel):
+    subject: str
+    body: str
@@ -0,0 +1,181 @@
+"""Prometheus-style metrics
+
+A small in-process registry of counters and histograms with labels, rendered
+in the Prometheus text exposition format by GET /metrics. Values that already
+live elsewhere (scheduler queue depth, single-flight and shared cache
+counters, circuit breaker state) are read by collectors at scrape time as
+gauges instead of being copied on every change.
+
+Each uvicorn worker keeps its own registry; Prometheus adds them up across
+the scraped targets.
+"""
+from contextlib import contextmanager
+from services import tracing
+import threading
+import time
+
+# Histogram bucket upper bounds in seconds (+Inf is implicit)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+INF_LABEL = 'le="+Inf"'
+
+_registry = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((key, dict(series, buckets=list(series["buckets"]))) for key, series in self._values.items())
+        lines = self._header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, INF_LABEL)} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series['count']}")
+        return lines
+
+
+def register_collector(collect) -> None:
+    """Add a callable returning [(name, kind, help, [(labels dict, value), ...])] read at scrape time"""
+    _collectors.append(collect)
+
+
+def _render_collected(name: str, kind: str, help_text: str, samples: list) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    for collect in list(_collectors):
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"Metrics collector error: {str(e)}")
+            continue
+        for family in families:
+            lines.extend(_render_collected(*family))
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route", ["method", "route"])
+
+LLM_CALLS = Counter("llm_calls_total", "LLM completions by call site, model and outcome", ["call_site", "model", "outcome"])
+LLM_CALL_SECONDS = Histogram("llm_call_duration_seconds", "LLM completion latency", ["call_site", "model"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens by call site, model and type", ["call_site", "model", "type"])
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+
+GMAIL_API_CALLS = Counter("gmail_api_calls_total", "Gmail API requests by method and outcome", ["method", "outcome"])
+GMAIL_API_SECONDS = Histogram("gmail_api_duration_seconds", "Gmail API request latency", ["method"])
+
+EXCEL_PARSE_SECONDS = Histogram("excel_parse_duration_seconds", "Time to read one procurement Excel file")
+
+PIPELINE_STAGE_SECONDS = Histogram("pipeline_stage_duration_seconds", "Time spent per pipeline stage", ["pipeline", "stage"])
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str):
+    """Time one stage of a pipeline, as a histogram and as a trace span: `with stage_timer("summarize", "llm"): ...`"""
+    with tracing.span(f"{pipeline}.{stage}"), PIPELINE_STAGE_SECONDS.time(pipeline=pipeline, stage=stage):
+        yield
+
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    """Count cache hits/misses; the hit ratio is hit / (hit + miss) per cache"""
+    if count:
+        result = "hit" if hit else "miss"
+        CACHE_LOOKUPS.inc(count, cache=cache, result=result)
+        tracing.increment_attribute(f"cache.{cache}.{result}", count)
@@ -1,7 +1,340 @@
-"""OpenAI service client and utilities"""
-from openai import OpenAI
-from services.config import OPENAI_API_KEY
+"""OpenAI service client and utilities
 
-# Singleton OpenAI client
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+Calls go through a resilient layer: per-call timeouts, jittered exponential
+backoff on 429/5xx/connection errors, a circuit breaker that fails fast while
+the API is down (callers fall back to their local paths), and optional hedged
+duplicate requests for interactive endpoints. Set OPENAI_BASE_URL to point the
+client at a local mock server.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+from pydantic import ValidationError
+from services.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+    LLM_CIRCUIT_FAILURES,
+    LLM_CIRCUIT_RESET_SECONDS,
+    LLM_BACKEND,
+    LLM_SHARED_CACHE_TTL,
+    LLM_SHARED_CACHE_LEASE
+)
+from services.llm_backends import create_backend
+from services.llm_scheduler import llm_scheduler, BATCH, INTERACTIVE
+from services.single_flight import SingleFlight
+from services.prompt_encoding import estimate_message_tokens
+from services.llm_metrics import record_llm_call
+from services.shared_cache import shared_cache
+from services import tracing
+import hashlib
+import json
+import random
+import threading
+import time
 
+# The OpenAI SDK takes most of a second to import, so the client and backend
+# are created on first use rather than when the app starts
+_openai_client = None
+_llm_backend = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Singleton OpenAI client (None unless LLM_BACKEND is openai); retries are handled here, not by the SDK"""
+    global _openai_client
+    if LLM_BACKEND != "openai":
+        return None
+    with _client_lock:
+        if _openai_client is None:
+            from openai import OpenAI
+            _openai_client = OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL or None,
+                timeout=OPENAI_TIMEOUT,
+                max_retries=0
+            )
+        return _openai_client
+
+
+def get_llm_backend():
+    """Where completions actually come from (see services/llm_backends.py)"""
+    global _llm_backend
+    if _llm_backend is None:
+        client = get_openai_client()
+        with _client_lock:
+            if _llm_backend is None:
+                _llm_backend = create_backend(LLM_BACKEND, client)
+    return _llm_backend
+
+# Longest server-requested Retry-After we are willing to sleep for
+MAX_RETRY_AFTER_SECONDS = 30
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures; lets one probe through after the reset period"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if calls are currently being short-circuited"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError("LLM API circuit is open; using local fallback")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                print("🟢 LLM circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"🔴 LLM circuit opened after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """Free the half-open probe slot after a call that says nothing about API health"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_seconds": self.reset_seconds
+            }
+
+
+circuit_breaker = CircuitBreaker(LLM_CIRCUIT_FAILURES, LLM_CIRCUIT_RESET_SECONDS)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses are worth retrying"""
+    from openai import RateLimitError, APIConnectionError, APIStatusError
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _retry_delay(error: Exception, attempt: int, base_delay: float) -> float:
+    """Server-provided Retry-After when present, otherwise jittered exponential backoff"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None and float(retry_after) <= MAX_RETRY_AFTER_SECONDS:
+            return float(retry_after)
+    except ValueError:
+        pass
+    return base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def create_with_backoff(max_retries: int = OPENAI_MAX_RETRIES, base_delay: float = 1.0,
+                        priority: str = BATCH, estimated_tokens: int = 0, **kwargs):
+    """Chat completion behind the rate-limit scheduler and circuit breaker, retrying transient errors"""
+    # TPM is counted on prompt tokens plus the completion allowance
+    cost = estimated_tokens + (kwargs.get("max_tokens") or 0)
+    for attempt in range(max_retries + 1):
+        # Fail fast while the circuit is open instead of first queueing for rate-limit capacity
+        circuit_breaker.before_call()
+        llm_scheduler.acquire(cost, priority)
+        try:
+            completion = get_llm_backend().create(**kwargs)
+        except Exception as e:
+            if not _is_transient(e):
+                # Client errors (bad request, auth) do not indicate an outage
+                circuit_breaker.release_probe()
+                raise
+            circuit_breaker.record_failure()
+            if attempt == max_retries:
+                raise
+            tracing.increment_attribute("llm.retries")
+            time.sleep(_retry_delay(e, attempt, base_delay))
+            continue
+        circuit_breaker.record_success()
+        return completion
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+
+def _hedged_create(hedge_after: float, **kwargs):
+    """Send a duplicate request if the first has not answered within hedge_after seconds"""
+    # Pool threads run in a copy of the caller's context, so retries count on the caller's span
+    primary = _hedge_executor.submit(tracing.in_current_context(create_with_backoff), **kwargs)
+    try:
+        return primary.result(timeout=hedge_after)
+    except FutureTimeout:
+        pass
+
+    tracing.set_attribute("llm.hedged", True)
+    backup = _hedge_executor.submit(tracing.in_current_context(create_with_backoff), **kwargs)
+    done, _ = wait([primary, backup], return_when=FIRST_COMPLETED)
+    for future in done:
+        if future.exception() is None:
+            return future.result()
+    # The first to finish failed; the other one is the last chance
+    remaining = backup if primary in done else primary
+    return remaining.result()
+
+
+class PromptBudgetError(Exception):
+    """Raised when a prompt's estimated input tokens exceed the call site's budget"""
+
+
+llm_flight = SingleFlight("llm")
+
+
+def _completion_key(call_site: str, kwargs: dict) -> str:
+    """Single-flight key for a completion request; the timeout does not change the result"""
+    params = {k: v for k, v in kwargs.items() if k != "timeout"}
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{call_site}|{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def chat_completion(call_site: str, max_input_tokens: int = None, hedge_after: float = None,
+                    priority: str = BATCH, **kwargs):
+    """Chat completion that reports (and optionally enforces) estimated input tokens before calling
+
+    Pass timeout= for a per-call timeout, hedge_after= to hedge slow calls, and
+    priority=INTERACTIVE for user-facing calls that must not queue behind batch work.
+    """
+    estimated = estimate_message_tokens(kwargs.get("messages", []))
+    if max_input_tokens and estimated > max_input_tokens:
+        raise PromptBudgetError(
+            f"{call_site}: estimated {estimated} input tokens exceeds budget of {max_input_tokens}"
+        )
+    
+    def run():
+        started = time.perf_counter()
+        try:
+            if hedge_after:
+                completion = _hedged_create(hedge_after, priority=priority, estimated_tokens=estimated, **kwargs)
+            else:
+                completion = create_with_backoff(priority=priority, estimated_tokens=estimated, **kwargs)
+        except Exception:
+            record_llm_call(call_site, kwargs.get("model", ""), None, time.perf_counter() - started, estimated, error=True)
+            raise
+        usage = getattr(completion, "usage", None)
+        record_llm_call(call_site, kwargs.get("model", ""), usage, time.perf_counter() - started, estimated)
+        tracing.set_attribute("llm.cache_hit", False)
+        tracing.set_attribute("llm.prompt_tokens", getattr(usage, "prompt_tokens", None))
+        tracing.set_attribute("llm.completion_tokens", getattr(usage, "completion_tokens", None))
+        tracing.set_attribute(
+            "llm.cached_prompt_tokens", getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        )
+        return completion
+    
+    key = _completion_key(call_site, kwargs)
+    if LLM_SHARED_CACHE_TTL > 0 and priority != INTERACTIVE:
+        # Other uvicorn workers sending the same request wait for this one's result;
+        # interactive calls (sampled reply drafts) must return a fresh completion
+        local_run = run
+        run = lambda: shared_cache.do(
+            f"llm|{key}", local_run, ttl=LLM_SHARED_CACHE_TTL, lease_seconds=LLM_SHARED_CACHE_LEASE,
+            serialize=lambda completion: completion.model_dump_json(), deserialize=_completion_from_json
+        )
+    
+    attributes = {
+        "llm.call_site": call_site,
+        "llm.model": kwargs.get("model", ""),
+        "llm.priority": priority,
+        "llm.estimated_input_tokens": estimated
+    }
+    with tracing.span("llm.chat_completion", **attributes) as span:
+        # Identical concurrent requests (same model, messages and sampling params) share one call
+        completion = llm_flight.do(key, run)
+        if span and "llm.cache_hit" not in span.attributes:
+            # run() did not call the API here: an identical call in flight or the shared cache answered
+            span.set_attribute("llm.cache_hit", True)
+        return completion
+
+
+def _completion_from_json(payload: str):
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate_json(payload)
+
+
+class StructuredOutputError(Exception):
+    """Raised when a response still fails schema validation after the repair retry"""
+
+
+def _validate_response(content: str, schema):
+    """Parse a JSON-mode response into the schema, or return (None, error message)"""
+    try:
+        return schema.model_validate_json(content or ""), None
+    except ValidationError as e:
+        return None, str(e)
+
+
+def structured_completion(template, user_prompt: str, schema, max_input_tokens: int = None,
+                          max_repairs: int = 1, hedge_after: float = None, priority: str = BATCH, **kwargs):
+    """JSON-mode completion validated against a Pydantic schema, with a bounded repair retry
+
+    A malformed or schema-violating response is sent back once with the
+    validation errors so the model can correct it, instead of falling back to
+    a placeholder and re-running the whole request.
+    """
+    messages = template.messages(user_prompt)
+    completion = chat_completion(
+        template.name,
+        max_input_tokens=max_input_tokens,
+        hedge_after=hedge_after,
+        priority=priority,
+        messages=messages,
+        response_format={"type": "json_object"},
+        **kwargs
+    )
+    content = completion.choices[0].message.content
+    result, error = _validate_response(content, schema)
+
+    for _ in range(max_repairs):
+        if result is not None:
+            break
+        tracing.increment_attribute("llm.repairs")
+        messages = messages + [
+            {"role": "assistant", "content": content or ""},
+            {"role": "user", "content": (
+                f"Your response did not match the required JSON schema:\n{error}\n\n"
+                "Return only the corrected JSON object."
+            )}
+        ]
+        completion = chat_completion(
+            f"{template.name}_repair",
+            hedge_after=hedge_after,
+            priority=priority,
+            messages=messages,
+            response_format={"type": "json_object"},
+            **kwargs
+        )
+        content = completion.choices[0].message.content
+        result, error = _validate_response(content, schema)
+
+    if result is None:
+        raise StructuredOutputError(f"{template.name}: invalid response after repair: {error}")
+    return result
@@ -0,0 +1,171 @@
+"""Per-vendor procurement classification store
+
+Vendor rows from each Excel log are normalized and hashed so that re-running
+the analysis only sends vendors whose rows actually changed to the AI.
+"""
+from datetime import datetime
+from services.config import OUTPUT_DIR
+from services.storage import read_json, write_json
+import hashlib
+import json
+
+STORE_FILE = OUTPUT_DIR / "procurement_vendors.json"
+
+# Column names (lowercased) that identify the vendor in a procurement log
+VENDOR_COLUMNS = ["vendor", "vendor name", "vendor_name", "supplier", "subcontractor", "company"]
+
+
+def detect_vendor_column(columns: list) -> str:
+    """Pick the column that names the vendor for each row"""
+    lowered = {str(c).strip().lower(): c for c in columns}
+    for name in VENDOR_COLUMNS:
+        if name in lowered:
+            return lowered[name]
+    for key, column in lowered.items():
+        if "vendor" in key or "supplier" in key:
+            return column
+    return columns[0] if columns else ""
+
+
+def normalize_row(row: dict) -> dict:
+    """Normalize a record so cosmetic differences do not change its hash"""
+    normalized = {}
+    for key, value in row.items():
+        if isinstance(value, str):
+            value = " ".join(value.split())
+        elif value is None:
+            value = ""
+        elif not isinstance(value, (int, float, bool)):
+            value = str(value)
+        normalized[str(key).strip()] = value
+    return normalized
+
+
+def group_rows_by_vendor(records: list, vendor_column: str) -> dict:
+    """Group normalized records by vendor name"""
+    vendors = {}
+    for record in records:
+        row = normalize_row(record)
+        vendor_name = str(row.get(str(vendor_column).strip(), "")).strip()
+        if not vendor_name:
+            continue
+        vendors.setdefault(vendor_name, []).append(row)
+    return vendors
+
+
+def hash_rows(rows: list) -> str:
+    """Order-insensitive SHA-256 of a vendor's normalized rows"""
+    serialized = sorted(json.dumps(row, sort_keys=True, ensure_ascii=False) for row in rows)
+    return hashlib.sha256("\n".join(serialized).encode("utf-8")).hexdigest()
+
+
+def vendor_key(filename: str, vendor_name: str) -> str:
+    """Store key for a vendor within a given file (case-sensitive: "ABC Supply" and "Abc Supply" are kept apart)"""
+    return f"{filename}::{vendor_name}"
+
+
+def load_store() -> dict:
+    """Load the vendor store, initializing an empty one if needed"""
+    store = read_json(STORE_FILE, default=None) or {}
+    store.setdefault("files", {})
+    store.setdefault("vendors", {})
+    return store
+
+
+def save_store(store: dict) -> None:
+    """Persist the vendor store"""
+    write_json(STORE_FILE, store)
+
+
+def find_changed_vendors(store: dict, filename: str, vendor_rows: dict) -> dict:
+    """Return {vendor_name: rows_hash} for vendors that are new or whose rows changed"""
+    changed = {}
+    for vendor_name, rows in vendor_rows.items():
+        rows_hash = hash_rows(rows)
+        existing = store["vendors"].get(vendor_key(filename, vendor_name))
+        if not existing or existing.get("rows_hash") != rows_hash or not existing.get("classification"):
+            changed[vendor_name] = rows_hash
+    return changed
+
+
+def update_file(store: dict, filename: str, columns: list, vendor_column: str, vendor_rows: dict,
+                sha256: str = None) -> None:
+    """Record file metadata and drop vendors no longer present in the file"""
+    current = [vendor_key(filename, name) for name in vendor_rows]
+    # Every stored entry of this file, including ones under older key formats
+    keep = set(current)
+    for key in [k for k, e in store["vendors"].items() if e.get("file") == filename and k not in keep]:
+        del store["vendors"][key]
+
+    store["files"][filename] = {
+        "filename": filename,
+        "columns": [str(c) for c in columns],
+        "vendor_column": str(vendor_column),
+        "row_count": sum(len(rows) for rows in vendor_rows.values()),
+        "vendors": current,
+        "sha256": sha256,
+        "parsed_at": datetime.now().isoformat()
+    }
+
+
+def prune_files(store: dict, filenames) -> list:
+    """Drop files (and their vendors) not in `filenames`; returns the removed filenames"""
+    keep = set(filenames)
+    removed = [f for f in store["files"] if f not in keep]
+    for filename in removed:
+        del store["files"][filename]
+    for key in [k for k, e in store["vendors"].items() if e.get("file") not in keep]:
+        del store["vendors"][key]
+    return removed
+
+
+def record_classification(store: dict, filename: str, vendor_name: str, rows: list,
+                          rows_hash: str, classification: dict, confidence_score=None) -> None:
+    """Store the latest AI classification for one vendor"""
+    store["vendors"][vendor_key(filename, vendor_name)] = {
+        "vendor_name": vendor_name,
+        "file": filename,
+        "rows_hash": rows_hash,
+        "row_count": len(rows),
+        "classification": classification,
+        "confidence_score": confidence_score,
+        "evaluated_at": datetime.now().isoformat()
+    }
+
+
+def list_vendors(store: dict, filename: str = None) -> list:
+    """All stored vendor entries, optionally restricted to one file"""
+    entries = store["vendors"].values()
+    if filename:
+        entries = [e for e in entries if e.get("file") == filename]
+    return sorted(entries, key=lambda e: (e.get("file", ""), e.get("vendor_name", "").lower()))
+
+
+def build_analysis(entries: list) -> dict:
+    """Aggregate stored vendor entries into the analysis output schema"""
+    vendors = []
+    counts = {"complete": 0, "partial": 0, "incomplete": 0}
+    confidences = []
+
+    for entry in entries:
+        classification = entry.get("classification") or {}
+        vendors.append({
+            **classification,
+            "vendor_name": entry.get("vendor_name"),
+            "source_file": entry.get("file"),
+            "evaluated_at": entry.get("evaluated_at")
+        })
+        completeness = str(classification.get("completeness", "")).lower()
+        if completeness in counts:
+            counts[completeness] += 1
+        if isinstance(entry.get("confidence_score"), (int, float)):
+            confidences.append(entry["confidence_score"])
+
+    return {
+        "vendors": vendors,
+        "ai_metadata": {
+            "total_vendors": len(vendors),
+            **counts,
+            "confidence_score": round(sum(confidences) / len(confidences), 2) if confidences else None
+        }
+    }
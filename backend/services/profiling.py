@@ -0,0 +1,258 @@
+"""On-demand profiling and event loop blocking detection
+
+SamplingProfiler records the Python stacks of the worker's threads every
+PROFILE_SAMPLE_INTERVAL seconds and aggregates them into per-function
+self/total sample counts and folded stacks ("a;b;c 12" lines, the input of
+flamegraph.pl and speedscope). Only stacks that run backend code and are
+not parked in a threading wait are kept, which drops idle pool threads,
+background schedulers and the bare event loop; requests running at
+the same time on the same worker do show up, so profile on a quiet worker.
+With PROFILING=1 a request is profiled when sent with `X-Profile: 1` or
+`?profile=1`; its profile id comes back in the X-Profile-Id header.
+
+LoopWatchdog pings the asyncio event loop every LOOP_WATCHDOG_INTERVAL
+seconds. A watcher thread notices when the ping is overdue and captures the
+event loop thread's stack while it is still blocked, so blocking calls made
+directly inside `async def` routes (file I/O, synchronous SDK calls) show up
+with the line that blocked.
+"""
+from collections import Counter, deque
+from datetime import datetime
+from services.config import (
+    BASE_DIR,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_KEEP,
+    LOOP_WATCHDOG_INTERVAL,
+    LOOP_BLOCK_THRESHOLD,
+    LOOP_BLOCK_KEEP
+)
+from services.metrics import Counter as MetricCounter, Histogram
+import os
+import sys
+import threading
+import time
+import uuid
+
+BACKEND_DIR = str(BASE_DIR) + os.sep
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "Delay of the event loop watchdog ping past its due time",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+EVENT_LOOP_BLOCKED = MetricCounter("event_loop_blocked_total", "Times the event loop was blocked past LOOP_BLOCK_THRESHOLD")
+
+_profiles = deque(maxlen=max(1, PROFILE_KEEP))
+_profiles_lock = threading.Lock()
+
+
+def _short_file(filename: str) -> str:
+    if filename.startswith(BACKEND_DIR):
+        return filename[len(BACKEND_DIR):]
+    return "/".join(filename.replace("\\", "/").split("/")[-2:])
+
+
+def _is_app_frame(frame) -> bool:
+    filename = frame.f_code.co_filename
+    return (
+        filename.startswith(BACKEND_DIR)
+        and "site-packages" not in filename  # a virtualenv inside backend/
+        and not filename.endswith("profiling.py")
+    )
+
+
+def _is_parked(frame) -> bool:
+    return frame.f_code.co_filename == threading.__file__ and frame.f_code.co_name == "wait"
+
+
+def _function_label(frame) -> str:
+    return f"{frame.f_code.co_name} ({_short_file(frame.f_code.co_filename)})"
+
+
+def _stack(frame, label=_function_label) -> list:
+    """Frames from outermost to innermost"""
+    stack = []
+    while frame is not None:
+        stack.append(label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _line_label(frame) -> str:
+    return f"{_short_file(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads running backend code until stopped"""
+
+    def __init__(self, name: str, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.name = name
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.started_at = None
+        self.duration = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.time() - self.started_at
+        return self.result()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                # Threads parked on a lock or event (idle schedulers, callers waiting on a pool) are
+                # skipped; the threads they wait for are sampled themselves
+                if thread_id == own_id or _is_parked(frame):
+                    continue
+                # Skip threads that are not running backend code (idle pools, the bare event loop)
+                app = frame
+                while app is not None and not _is_app_frame(app):
+                    app = app.f_back
+                if app is None:
+                    continue
+                self.stacks[tuple(_stack(frame))] += 1
+
+    def result(self, top: int = 30) -> dict:
+        """Per-function sample counts (self = innermost frame) and folded stacks"""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for function in set(stack):
+                total_counts[function] += count
+        seconds = lambda count: round(count * self.interval, 3)
+        return {
+            "name": self.name,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            "duration_seconds": round(self.duration, 3),
+            "interval_seconds": self.interval,
+            "samples": self.samples,
+            "top_total": [
+                {"function": f, "samples": c, "seconds": seconds(c)} for f, c in total_counts.most_common(top)
+            ],
+            "top_self": [
+                {"function": f, "samples": c, "seconds": seconds(c)} for f, c in self_counts.most_common(top)
+            ],
+            "folded": "\n".join(
+                f"{';'.join(stack)} {count}" for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])
+            )
+        }
+
+
+def save_profile(profile: dict) -> str:
+    """Keep a finished profile for /api/debug/profiles and return its id"""
+    profile_id = uuid.uuid4().hex[:12]
+    with _profiles_lock:
+        _profiles.append({"id": profile_id, **profile})
+    return profile_id
+
+
+def list_profiles() -> list:
+    with _profiles_lock:
+        profiles = list(reversed(_profiles))
+    return [
+        {k: p[k] for k in ("id", "name", "started_at", "duration_seconds", "samples")} for p in profiles
+    ]
+
+
+def get_profile(profile_id: str):
+    with _profiles_lock:
+        return next((p for p in _profiles if p["id"] == profile_id), None)
+
+
+class LoopWatchdog:
+    """Detects event loop stalls and records the stack that caused them"""
+
+    def __init__(self, interval: float = LOOP_WATCHDOG_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.events = deque(maxlen=max(1, LOOP_BLOCK_KEEP))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loop = None
+        self._loop_thread_id = None
+        self._handle = None
+        self._beat = 0
+        self._due = 0.0
+        self._captured = None  # (beat, stack, culprit) captured by the watcher while the loop was blocked
+
+    def start(self, loop) -> None:
+        """Start pinging `loop`; call from the loop's own thread"""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._due = time.monotonic() + self.interval
+        self._handle = loop.call_later(self.interval, self._tick)
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._handle:
+            self._handle.cancel()
+
+    def _tick(self) -> None:
+        """Runs on the event loop; lateness of this call is the time the loop was blocked"""
+        now = time.monotonic()
+        lag = max(0.0, now - self._due)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        with self._lock:
+            beat, self._beat = self._beat, self._beat + 1
+            captured = self._captured if self._captured and self._captured[0] == beat else None
+            self._captured = None
+            self._due = now + self.interval
+        if lag >= self.threshold:
+            EVENT_LOOP_BLOCKED.inc()
+            event = {
+                "at": datetime.now().isoformat(),
+                "blocked_ms": round(lag * 1000, 1),
+                # Innermost backend line, usually the blocking call
+                "culprit": captured[2] if captured else None,
+                "stack": captured[1] if captured else []
+            }
+            with self._lock:
+                self.events.append(event)
+            print(f"🐢 Event loop blocked for {event['blocked_ms']} ms at {event['culprit'] or 'unknown'}")
+        if not self._stop.is_set():
+            self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def _watch(self) -> None:
+        """Captures the loop thread's stack once per stall, while it is still blocked"""
+        while not self._stop.wait(self.interval / 2):
+            with self._lock:
+                overdue = time.monotonic() - self._due
+                beat = self._beat
+                already = self._captured is not None and self._captured[0] == beat
+            if overdue < self.threshold / 2 or already:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = _stack(frame, _line_label)
+            app = frame
+            while app is not None and not _is_app_frame(app):
+                app = app.f_back
+            culprit = _line_label(app) if app is not None else None
+            with self._lock:
+                if self._beat == beat:
+                    self._captured = (beat, stack, culprit)
+
+    def blocking_events(self, limit: int = None) -> list:
+        """Recorded stalls, newest first"""
+        with self._lock:
+            events = list(reversed(self.events))
+        return events[:limit]
+
+
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,76 @@
+"""Compact serialization of records for LLM prompts
+
+Records are rendered as CSV with the header written once instead of indented
+JSON that repeats every key, columns that are empty in every record are
+dropped, and long text fields are truncated to a token budget.
+"""
+from services.tokenizer import count_tokens, truncate_to_tokens
+import csv
+import io
+import json
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count for a prompt string"""
+    return count_tokens(text or "")
+
+
+def estimate_message_tokens(messages: list) -> int:
+    """Input tokens for a chat messages list (content plus per-message overhead)"""
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages) + 2
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Collapse whitespace and cut text to max_tokens, marking the cut with an ellipsis"""
+    return truncate_to_tokens(" ".join(str(text or "").split()), max_tokens)
+
+
+def _cell(value) -> str:
+    """Render one value as a single-line CSV cell"""
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return " ".join(str(value).split())
+
+
+def encode_records(records: list, fields: list = None, text_fields: tuple = ("body", "snippet"),
+                   max_text_tokens: int = None, drop_empty: bool = True) -> str:
+    """Render records as header-once CSV, dropping all-empty columns and truncating text fields
+
+    Pass drop_empty=False when an empty column is itself meaningful (e.g. missing data checks).
+    """
+    if not records:
+        return ""
+
+    if fields is None:
+        fields = []
+        for record in records:
+            for key in record:
+                if key not in fields:
+                    fields.append(key)
+
+    rows = []
+    for record in records:
+        row = []
+        for field in fields:
+            value = _cell(record.get(field))
+            if max_text_tokens and field in text_fields:
+                value = truncate_text(value, max_text_tokens)
+            row.append(value)
+        rows.append(row)
+
+    # Drop columns that carry no information in any record
+    keep = [i for i in range(len(fields)) if not drop_empty or any(row[i] for row in rows)]
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([str(fields[i]) for i in keep])
+    for row in rows:
+        writer.writerow([row[i] for i in keep])
+    return buffer.getvalue().rstrip("\n")
+
+
+def compact_json(data) -> str:
+    """JSON without indentation or spaces after separators"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,77 @@
+"""In-process scheduler that pre-generates last week's reports off-peak"""
+from datetime import date, datetime, timedelta
+from fastapi import HTTPException
+from services.report_service import get_or_generate_weekly_report
+from services.config import DATA_DIR, WEEKLY_REPORT_HOUR
+from services.storage import read_json
+import threading
+
+
+def last_week_range(today: date = None) -> tuple:
+    """Monday-Sunday of the previous calendar week as YYYY-MM-DD strings"""
+    today = today or date.today()
+    start = today - timedelta(days=today.weekday() + 7)
+    end = start + timedelta(days=6)
+    return start.isoformat(), end.isoformat()
+
+
+def project_names() -> list:
+    """Project names listed in demo_emails.json"""
+    data = read_json(DATA_DIR / "demo_emails.json", default={}) or {}
+    return [p.get("project_name") for p in data.get("projects", []) if p.get("project_name")]
+
+
+def pregenerate_last_week() -> dict:
+    """Generate (or confirm cached) last week's report for every project"""
+    start_date, end_date = last_week_range()
+    results = {}
+    for project_name in project_names():
+        try:
+            _, _, cached = get_or_generate_weekly_report(project_name, start_date, end_date)
+            results[project_name] = "cached" if cached else "generated"
+        except HTTPException as e:
+            results[project_name] = f"skipped: {e.detail}"
+        except Exception as e:
+            results[project_name] = f"failed: {str(e)}"
+    print(f"🗓️ Weekly reports {start_date} - {end_date}: {results}")
+    return results
+
+
+class WeeklyReportScheduler:
+    """Daemon thread that runs pregenerate_last_week once a day at a fixed hour"""
+
+    def __init__(self, hour: int = WEEKLY_REPORT_HOUR):
+        self.hour = hour
+        self._stop = threading.Event()
+        self._thread = None
+
+    def seconds_until_next_run(self, now: datetime = None) -> float:
+        """Seconds from now until the next scheduled hour"""
+        now = now or datetime.now()
+        next_run = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    def start(self) -> None:
+        """Start the scheduler thread if it is not already running"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weekly-report-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Signal the scheduler thread to exit"""
+        self._stop.set()
+
+    def _run(self) -> None:
+        """Sleep until the scheduled hour, generate, repeat"""
+        while not self._stop.wait(self.seconds_until_next_run()):
+            try:
+                pregenerate_last_week()
+            except Exception as e:
+                print(f"Weekly report scheduler error: {str(e)}")
+
+
+scheduler = WeeklyReportScheduler()
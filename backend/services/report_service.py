@@ -0,0 +1,338 @@
+"""Weekly report generation as a hierarchical map-reduce over the email window
+
+Map: each day's emails (split into chunks when a day exceeds the token budget)
+are summarized concurrently, and each day summary is cached on disk by a hash
+of its emails so overlapping weeks reuse it (only the latest one per day is kept).
+Reduce: day summaries are merged in budget-sized groups until they fit in the
+final report prompt.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from services.openai_service import structured_completion, StructuredOutputError
+from services.llm_schemas import DaySummary, WeeklyReport
+from services.prompt_encoding import estimate_tokens, encode_records, compact_json, truncate_text
+from services.email_service import parse_email_date
+from services.email_index import get_email_index, date_window, EMAILS_FILE
+from services.prompts import (
+    PromptTemplate,
+    DAILY_SUMMARY_TEMPLATE,
+    MERGE_SUMMARIES_TEMPLATE,
+    WEEKLY_REPORT_TEMPLATE
+)
+from services.config import OUTPUT_DIR
+from services.storage import read_json, write_json, file_lock
+from services.metrics import stage_timer, record_cache
+from services import tracing
+from services.single_flight import SingleFlight, request_key
+import hashlib
+import json
+import re
+
+WEEKLY_REPORTS_DIR = OUTPUT_DIR / "weekly_reports"
+DAILY_CACHE_DIR = WEEKLY_REPORTS_DIR / "daily_summaries"
+
+# Bump when the map prompt changes so stale day summaries are not reused
+DAILY_SUMMARY_VERSION = "3"
+# Bump when the report prompt changes so stored reports are regenerated
+REPORT_VERSION = "3"
+
+MAP_INPUT_TOKENS = 3000      # email tokens per map call
+REDUCE_INPUT_TOKENS = 6000   # partial-summary tokens per reduce call
+MAP_CONCURRENCY = 4
+
+report_flight = SingleFlight("weekly_report")
+
+def safe_name(name: str) -> str:
+    """Filesystem-safe version of a project name"""
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', name)
+
+
+def _email_for_prompt(email: dict) -> dict:
+    """Fields of an email that matter for the report, with the body capped to the map budget"""
+    return {
+        "from": email.get("from", ""),
+        "to": email.get("to", ""),
+        "date": email.get("date", ""),
+        "subject": email.get("subject", ""),
+        "body": truncate_text(email.get("body") or email.get("snippet") or "", MAP_INPUT_TOKENS // 2)
+    }
+
+
+def group_emails_by_day(emails: list) -> dict:
+    """Group emails by their UTC calendar day, in chronological order"""
+    days = {}
+    for email in emails:
+        ts = parse_email_date(email.get("date", ""))
+        if ts is None:
+            continue
+        day = datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat()
+        days.setdefault(day, []).append(email)
+    return dict(sorted(days.items()))
+
+
+def chunk_by_tokens(items: list, budget: int) -> list:
+    """Split serialized items into consecutive chunks of at most `budget` tokens"""
+    chunks = []
+    current = []
+    used = 0
+    for item in items:
+        cost = estimate_tokens(compact_json(item))
+        if current and used + cost > budget:
+            chunks.append(current)
+            current = []
+            used = 0
+        current.append(item)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _day_cache_file(project_name: str, day: str, emails: list):
+    """Cache path for a day summary, keyed by the day's email content"""
+    digest = hashlib.sha256()
+    digest.update(DAILY_SUMMARY_VERSION.encode("utf-8"))
+    for email in sorted(emails, key=lambda e: (e.get("date", ""), e.get("id", ""))):
+        digest.update(json.dumps(_email_for_prompt(email), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return DAILY_CACHE_DIR / safe_name(project_name) / f"{day}_{digest.hexdigest()[:16]}.json"
+
+
+def _call_json(template: PromptTemplate, user_prompt: str, schema, max_tokens: int) -> dict:
+    """Run one schema-validated JSON completion"""
+    return structured_completion(
+        template,
+        user_prompt,
+        schema,
+        model="gpt-4o-mini",
+        temperature=0.2,
+        max_tokens=max_tokens
+    ).model_dump()
+
+
+def _fallback_partial(day: str, emails: list) -> dict:
+    """Keep a failed chunk represented by its subjects rather than dropping it"""
+    return {
+        "date": day,
+        "email_count": len(emails),
+        "progress_highlights": [],
+        "active_issues": [f"Unsummarized email: {e.get('subject', '')}" for e in emails],
+        "subcontractor_notes": [],
+        "milestones": [],
+        "change_orders": 0
+    }
+
+
+def _combine_locally(partials: list) -> dict:
+    """Deterministic merge used when the AI merge call fails"""
+    combined = _fallback_partial(min(p.get("date") or "" for p in partials), [])
+    for partial in partials:
+        combined["email_count"] += partial.get("email_count") or 0
+        combined["change_orders"] += partial.get("change_orders") or 0
+        for key in ("progress_highlights", "active_issues", "subcontractor_notes", "milestones"):
+            combined[key].extend(partial.get(key) or [])
+    return combined
+
+
+def _merge_partials(partials: list) -> dict:
+    """Reduce several partial summaries into one"""
+    try:
+        return _call_json(
+            MERGE_SUMMARIES_TEMPLATE,
+            f"PARTIAL SUMMARIES:\n{compact_json(partials)}",
+            DaySummary,
+            max_tokens=600
+        )
+    except Exception as e:
+        print(f"Summary merge failed, combining locally: {str(e)}")
+        return _combine_locally(partials)
+
+
+def _reduce_to_budget(partials: list, budget: int) -> list:
+    """Merge partial summaries in groups until together they fit in `budget` tokens"""
+    while len(partials) > 1 and estimate_tokens(compact_json(partials)) > budget:
+        groups = chunk_by_tokens(partials, budget // 2)
+        if len(groups) == len(partials):
+            # Each partial fills a group on its own; pair them up to make progress
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        partials = [group[0] if len(group) == 1 else _merge_partials(group) for group in groups]
+    return partials
+
+
+def summarize_day(project_name: str, day: str, emails: list) -> dict:
+    """Summarize one day of emails, reusing the cached summary when the emails are unchanged"""
+    with tracing.span("weekly_report.day", **{"report.day": day, "report.emails": len(emails)}):
+        return _summarize_day(project_name, day, emails)
+
+
+def _summarize_day(project_name: str, day: str, emails: list) -> dict:
+    cache_file = _day_cache_file(project_name, day, emails)
+    cached = read_json(cache_file)
+    record_cache("report_day", cached is not None)
+    if cached is not None:
+        return cached
+
+    partials = []
+    failed = False
+    for chunk in chunk_by_tokens([_email_for_prompt(e) for e in emails], MAP_INPUT_TOKENS):
+        try:
+            partials.append(_call_json(
+                DAILY_SUMMARY_TEMPLATE,
+                f"PROJECT: {project_name}\nDATE: {day}\n\nEMAILS (CSV):\n{encode_records(chunk)}",
+                DaySummary,
+                max_tokens=500
+            ))
+        except Exception as e:
+            print(f"Daily summary failed for {project_name} {day}: {str(e)}")
+            partials.append(_fallback_partial(day, chunk))
+            failed = True
+
+    if len(partials) > 1:
+        partials = _reduce_to_budget(partials, REDUCE_INPUT_TOKENS)
+    summary = partials[0] if len(partials) == 1 else _merge_partials(partials)
+    summary["date"] = day
+    summary["email_count"] = len(emails)
+
+    if not failed:
+        write_json(cache_file, summary)
+        _prune_day_cache(cache_file, day)
+    return summary
+
+
+def _prune_day_cache(cache_file, day: str) -> None:
+    """Delete the day's older summaries (other email content or summary version)"""
+    for stale in cache_file.parent.glob(f"{day}_*.json"):
+        if stale != cache_file:
+            stale.unlink(missing_ok=True)
+
+
+def generate_weekly_report_data(project_name: str, start_date: str, end_date: str, emails: list) -> dict:
+    """Map emails to per-day summaries, reduce them, and produce the weekly report JSON"""
+    days = group_emails_by_day(emails)
+
+    # Map: summarize each day concurrently
+    with stage_timer("weekly_report", "map"), ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(tracing.in_current_context(summarize_day), project_name, day, day_emails)
+            for day, day_emails in days.items()
+        ]
+        partials = [future.result() for future in futures]
+
+    # Reduce: merge until the day summaries fit the final prompt budget
+    with stage_timer("weekly_report", "reduce"):
+        partials = _reduce_to_budget(partials, REDUCE_INPUT_TOKENS)
+
+    # Only the per-call data goes in the user message; instructions live in the cached prefix
+    user_prompt = f"""PROJECT: {project_name}
+DATE RANGE: {start_date} - {end_date}
+TOTAL EMAILS: {len(emails)}
+
+DAILY SUMMARIES (covering every email in the date range):
+{compact_json(partials)}
+
+NOW ANALYZE AND OUTPUT JSON FOR PROJECT: {project_name}"""
+
+    try:
+        with stage_timer("weekly_report", "final"):
+            return _call_json(WEEKLY_REPORT_TEMPLATE, user_prompt, WeeklyReport, max_tokens=1500)
+    except StructuredOutputError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to parse AI response: {str(e)}")
+
+
+def select_window_emails(project_name: str, start_date: str, end_date: str) -> list:
+    """Exactly the project's emails inside the inclusive date window"""
+    if not EMAILS_FILE.exists():
+        raise HTTPException(status_code=404, detail="Emails file not found. Please fetch emails first using /api/emails/fetch")
+
+    try:
+        start_ts, end_ts = date_window(start_date, end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date and end_date must be in YYYY-MM-DD format")
+
+    if start_ts >= end_ts:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    emails = get_email_index().project_window(project_name, start_ts, end_ts)
+    if not emails:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No emails found for {project_name} between {start_date} and {end_date}"
+        )
+    return emails
+
+
+def window_fingerprint(project_name: str, start_date: str, end_date: str, emails: list) -> str:
+    """Content hash of the report inputs; unchanged emails give the same fingerprint"""
+    digest = hashlib.sha256()
+    digest.update(f"{REPORT_VERSION}|{project_name}|{start_date}|{end_date}".encode("utf-8"))
+    for email in sorted(emails, key=lambda e: (e.get("date", ""), e.get("id", ""))):
+        digest.update(json.dumps(_email_for_prompt(email), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def report_file_for(project_name: str, start_date: str, end_date: str):
+    """Path of the stored report for a project and window"""
+    return WEEKLY_REPORTS_DIR / f"{safe_name(project_name)}_{start_date}_{end_date}.json"
+
+
+def _meta_file_for(report_file):
+    """Sidecar file holding the fingerprint a stored report was generated from"""
+    return report_file.with_name(report_file.stem + ".meta.json")
+
+
+def get_or_generate_weekly_report(project_name: str, start_date: str, end_date: str) -> tuple:
+    """Read-through cache: return (report, report_file, cached) for the window
+
+    Concurrent requests for the same window (including the scheduler's
+    pre-generation) share one generation.
+    """
+    return report_flight.do(
+        request_key(project_name, start_date, end_date),
+        _get_or_generate_weekly_report, project_name, start_date, end_date
+    )
+
+
+def _get_or_generate_weekly_report(project_name: str, start_date: str, end_date: str) -> tuple:
+    """Serve the stored report when its fingerprint matches, otherwise generate and store it"""
+    with stage_timer("weekly_report", "select_emails"):
+        emails = select_window_emails(project_name, start_date, end_date)
+        fingerprint = window_fingerprint(project_name, start_date, end_date, emails)
+
+    report_file = report_file_for(project_name, start_date, end_date)
+    meta_file = _meta_file_for(report_file)
+    # Other workers asking for the same window wait here and then read the stored report
+    with file_lock(report_file):
+        meta = read_json(meta_file) or {}
+        if meta.get("fingerprint") == fingerprint:
+            report_data = read_json(report_file)
+            if report_data is not None:
+                record_cache("weekly_report", True)
+                return report_data, report_file, True
+
+        record_cache("weekly_report", False)
+        report_data = generate_weekly_report_data(project_name, start_date, end_date, emails)
+        write_json(report_file, report_data)
+        write_json(meta_file, {
+            "project_name": project_name,
+            "start_date": start_date,
+            "end_date": end_date,
+            "fingerprint": fingerprint,
+            "email_count": len(emails),
+            "generated_at": datetime.now(timezone.utc).isoformat()
+        })
+        return report_data, report_file, False
+
+
+def latest_stored_report(project_name: str):
+    """Most recent stored report for a project as (report, report_file), or None"""
+    metas = []
+    for meta_file in WEEKLY_REPORTS_DIR.glob(f"{safe_name(project_name)}_*.meta.json"):
+        meta = read_json(meta_file) or {}
+        if meta.get("project_name") == project_name:
+            metas.append((meta.get("end_date", ""), meta.get("start_date", ""), meta_file))
+    for _, _, meta_file in sorted(metas, reverse=True):
+        report_file = meta_file.with_name(meta_file.name.replace(".meta.json", ".json"))
+        report_data = read_json(report_file)
+        if report_data is not None:
+            return report_data, report_file
+    return None
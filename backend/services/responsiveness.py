@@ -0,0 +1,349 @@
+"""Non-responsive subcontractor detection from the thread index
+
+Each thread is scanned without any LLM call: the party that opened it is the
+side waiting for answers (or any domain in INTERNAL_EMAIL_DOMAINS), and every
+other address is the counterparty. Follow-ups, trailing unanswered emails and
+gaps between emails are counted per thread, and per-vendor (counterparty
+domain) counters are rolled up from the thread records.
+
+The results are a materialized view in output/responsiveness.json, updated by
+the thread index for just the threads new mail touched. Risk levels depend on
+how long a request has been waiting, so they are derived when the view is
+read rather than stored.
+"""
+from datetime import datetime, timezone
+from email.utils import getaddresses
+from services.email_service import parse_email_date
+from services.email_analysis import demo_project_names
+from services.config import DATA_DIR, OUTPUT_DIR, INTERNAL_EMAIL_DOMAINS
+from services.storage import SharedJSON, read_json
+from services import dashboard_rollups
+import time
+
+VIEW_FILE = OUTPUT_DIR / "responsiveness.json"
+
+# Bundled sample threads shown until any mail has been indexed
+SAMPLE_FILE = DATA_DIR / "non_responsive_subcontractors.json"
+
+# Unanswered emails / days waiting at which a thread becomes MEDIUM or HIGH risk
+MEDIUM_RISK_UNANSWERED = 2
+HIGH_RISK_UNANSWERED = 3
+MEDIUM_RISK_DAYS = 3
+HIGH_RISK_DAYS = 7
+RISK_ORDER = {"HIGH": 0, "MEDIUM": 1, "LOW": 2}
+
+# First matching keyword group decides the impact area
+IMPACT_KEYWORDS = [
+    ("Procurement/Schedule", ["ship", "delivery", "deliver", "lead time", "fabricat", "order", "procure", "delay"]),
+    ("Design/RFI", ["rfi", "clarif", "spec", "drawing", "detail"]),
+    ("Submittals", ["submittal", "shop drawing", "product data", "sample"]),
+    ("Cost/Billing", ["invoice", "payment", "change order", "quote", "pricing", "cost"]),
+    ("Safety", ["safety", "incident", "osha", "hazard"])
+]
+
+
+def _empty_view() -> dict:
+    return {"threads": {}, "vendors": {}, "updated_at": None}
+
+
+_store = SharedJSON(VIEW_FILE, lambda data: data or _empty_view())
+
+
+def _addresses(value) -> list:
+    if isinstance(value, list):
+        value = ", ".join(value)
+    return [addr.strip().lower() for _, addr in getaddresses([value or ""]) if "@" in addr]
+
+
+def _domain(address: str) -> str:
+    return address.rsplit("@", 1)[-1] if "@" in address else ""
+
+
+def _date(ts) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).date().isoformat() if ts is not None else ""
+
+
+def _guess_project(thread_emails: list, project_names: list) -> str:
+    for email in thread_emails:
+        if email.get("project"):
+            return email["project"]
+    text = " ".join(f"{e.get('subject', '')} {e.get('body', '')}" for e in thread_emails).lower()
+    for name in project_names:
+        if name.lower() in text:
+            return name
+    return "Unknown"
+
+
+def _impact_area(thread_emails: list) -> str:
+    text = " ".join(f"{e.get('subject', '')} {e.get('body', '')}" for e in thread_emails).lower()
+    for area, keywords in IMPACT_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return area
+    return "General"
+
+
+def analyze_thread(thread_emails: list, project_names: list = None) -> dict:
+    """Responsiveness counters for one chronologically sorted thread
+
+    project_names: names to guess the project from (read from
+    demo_emails.json when not given; pass them when analyzing many threads).
+    """
+    if project_names is None:
+        project_names = demo_project_names()
+    first_sender = (_addresses(thread_emails[0].get("from", "")) or [""])[0]
+    internal = set(INTERNAL_EMAIL_DOMAINS) or {_domain(first_sender)}
+
+    senders, receivers = [], []
+    outbound_ts = []
+    response_hours = []
+    waiting_since = None
+    follow_ups = 0
+    unanswered = 0
+    responded = False
+    seen_outbound = False
+    previous_outbound = False
+    timestamps = []
+    for email in thread_emails:
+        sender = (_addresses(email.get("from", "")) or [""])[0]
+        if sender and sender not in senders:
+            senders.append(sender)
+        for receiver in _addresses(email.get("to", "")):
+            if receiver not in receivers:
+                receivers.append(receiver)
+        ts = parse_email_date(email.get("date", ""))
+        if ts is not None:
+            timestamps.append(ts)
+
+        if _domain(sender) in internal:
+            # Another request before the counterparty answered the previous one
+            if previous_outbound:
+                follow_ups += 1
+            unanswered += 1
+            seen_outbound = previous_outbound = True
+            if ts is not None:
+                outbound_ts.append(ts)
+                if waiting_since is None:
+                    waiting_since = ts
+        else:
+            if seen_outbound:
+                responded = True
+            # Time from the first unanswered request to this reply
+            if waiting_since is not None and ts is not None and ts >= waiting_since:
+                response_hours.append(round((ts - waiting_since) / 3600, 2))
+            waiting_since = None
+            unanswered = 0
+            previous_outbound = False
+
+    counterparties = [r for r in receivers + senders if _domain(r) not in internal]
+    to_domain = _domain(counterparties[0]) if counterparties else _domain(receivers[0]) if receivers else ""
+    gaps = [(b - a) / 86400 for a, b in zip(timestamps, timestamps[1:])]
+
+    return {
+        "thread_subject": thread_emails[0].get("subject", ""),
+        "project_guess": _guess_project(thread_emails, project_names),
+        "participants": {
+            "from_domain": _domain(first_sender),
+            "to_domain": to_domain,
+            "senders": senders,
+            "receivers": receivers
+        },
+        "counts": {
+            "total_emails": len(thread_emails),
+            "follow_up_count": follow_ups,
+            "unanswered_emails": unanswered
+        },
+        "timeline": {
+            "first_email_date": _date(min(timestamps)) if timestamps else "",
+            "last_email_date": _date(max(timestamps)) if timestamps else "",
+            "days_between_first_and_last": int((max(timestamps) - min(timestamps)) // 86400) if timestamps else 0
+        },
+        "response_detected": responded,
+        "impact_area": _impact_area(thread_emails),
+        "kpis": {
+            "avg_gap_days": round(sum(gaps) / len(gaps), 1) if gaps else 0.0,
+            "last_gap_days": round(gaps[-1], 1) if gaps else 0.0
+        },
+        "response_hours": response_hours,
+        "last_unanswered_ts": outbound_ts[-1] if unanswered and outbound_ts else None
+    }
+
+
+def _vendor_counters(records: list) -> dict:
+    """Per counterparty domain rollup of thread records"""
+    vendors = {}
+    for record in records:
+        domain = record["participants"]["to_domain"] or "unknown"
+        vendor = vendors.setdefault(domain, {
+            "vendor_domain": domain,
+            "threads": 0,
+            "awaiting_reply_threads": 0,
+            "unanswered_emails": 0,
+            "follow_up_count": 0,
+            "last_email_date": "",
+            "projects": []
+        })
+        vendor["threads"] += 1
+        vendor["awaiting_reply_threads"] += 1 if record["counts"]["unanswered_emails"] else 0
+        vendor["unanswered_emails"] += record["counts"]["unanswered_emails"]
+        vendor["follow_up_count"] += record["counts"]["follow_up_count"]
+        vendor["last_email_date"] = max(vendor["last_email_date"], record["timeline"]["last_email_date"])
+        if record["project_guess"] not in vendor["projects"]:
+            vendor["projects"].append(record["project_guess"])
+    return vendors
+
+
+def _update_view(view: dict, threads: dict, live_thread_ids):
+    """Apply recomputed threads to the view; returns (changed records, removed thread ids)"""
+    live = set(live_thread_ids)
+    affected = set()
+    removed = [t for t in view["threads"] if t not in live]
+    changed = {}
+    # Read once per update rather than once per thread
+    project_names = demo_project_names()
+    for thread_id in removed:
+        affected.add(view["threads"].pop(thread_id)["participants"]["to_domain"] or "unknown")
+    for thread_id, thread_emails in threads.items():
+        if not thread_emails:
+            continue
+        old = view["threads"].get(thread_id)
+        if old:
+            affected.add(old["participants"]["to_domain"] or "unknown")
+        record = analyze_thread(thread_emails, project_names)
+        view["threads"][thread_id] = record
+        changed[thread_id] = record
+        affected.add(record["participants"]["to_domain"] or "unknown")
+
+    # Only the vendors whose threads changed are re-rolled
+    rolled = _vendor_counters([
+        r for r in view["threads"].values() if (r["participants"]["to_domain"] or "unknown") in affected
+    ])
+    for domain in affected:
+        if domain in rolled:
+            view["vendors"][domain] = rolled[domain]
+        else:
+            view["vendors"].pop(domain, None)
+    view["updated_at"] = datetime.now().isoformat()
+    return changed, removed
+
+
+def update_threads(threads: dict, live_thread_ids) -> None:
+    """Recompute the given threads ({thread id: emails}) and drop threads merged away"""
+    with _store.update() as view:
+        changed, removed = _update_view(view, threads, live_thread_ids)
+    dashboard_rollups.update_threads(changed, removed)
+
+
+def rebuild(index) -> None:
+    """Recompute the whole view from a thread index (first run or after deleting the view file)"""
+    with _store.update() as view:
+        view.clear()
+        view.update(_empty_view())
+        changed, removed = _update_view(view, index.threads_for(list(index.threads)), index.threads)
+    dashboard_rollups.update_threads(changed, removed)
+
+
+def ensure_built() -> bool:
+    """Build the view from the thread index if it has never been built; False when no mail is indexed"""
+    if has_data():
+        return True
+    from services.thread_index import get_thread_index
+    index = get_thread_index()
+    if not index.threads:
+        return False
+    rebuild(index)
+    return True
+
+
+def thread_records() -> dict:
+    """Copy of the per-thread records, keyed by thread id"""
+    with _store.read() as view:
+        return dict(view["threads"])
+
+
+def days_waiting_since(waiting_since, now: float) -> float:
+    return round((now - waiting_since) / 86400, 1) if waiting_since else 0.0
+
+
+def risk_level(unanswered: int, days_waiting: float) -> str:
+    """HIGH / MEDIUM / LOW from unanswered emails and days the last one has waited"""
+    if unanswered >= HIGH_RISK_UNANSWERED or (unanswered and days_waiting >= HIGH_RISK_DAYS):
+        return "HIGH"
+    if unanswered >= MEDIUM_RISK_UNANSWERED or (unanswered and days_waiting >= MEDIUM_RISK_DAYS):
+        return "MEDIUM"
+    return "LOW"
+
+
+def _with_risk(record: dict, now: float) -> dict:
+    """Thread record plus the time-dependent days waiting, risk level, issue and recommendation"""
+    unanswered = record["counts"]["unanswered_emails"]
+    days_waiting = days_waiting_since(record.get("last_unanswered_ts"), now)
+    risk = risk_level(unanswered, days_waiting)
+
+    if unanswered >= MEDIUM_RISK_UNANSWERED:
+        issue = "Non-responsive recipient"
+        reason = f"{unanswered} emails with no reply from recipient, the last one {days_waiting:g} days ago."
+    elif unanswered:
+        issue = "Awaiting response"
+        reason = f"Last email has gone unanswered for {days_waiting:g} days."
+    else:
+        issue = "None"
+        reason = "Recipient has replied to the latest request."
+    action = {
+        "HIGH": "Escalate to project management and ensure timely response.",
+        "MEDIUM": "Send a follow-up or call the recipient to confirm status.",
+        "LOW": "Monitor the thread."
+    }[risk]
+
+    result = {k: v for k, v in record.items() if k not in ("last_unanswered_ts", "response_hours")}
+    result.update({
+        "issue_detected": issue,
+        "risk_level": risk,
+        "reason": reason,
+        "recommended_action": action,
+        "kpis": {**record["kpis"], "days_waiting": days_waiting}
+    })
+    return result
+
+
+def sample_threads(project: str = None) -> list:
+    """The bundled sample records, optionally for one project"""
+    records = read_json(SAMPLE_FILE, default=[]) or []
+    if project:
+        records = [r for r in records if r.get("project_guess", "").lower() == project.lower()]
+    return records
+
+
+def has_data() -> bool:
+    """Whether any thread has been scanned"""
+    with _store.read() as view:
+        return bool(view["threads"])
+
+
+def non_responsive_threads(project: str = None) -> list:
+    """Threads waiting on the counterparty, highest risk first, optionally for one project"""
+    now = time.time()
+    with _store.read() as view:
+        records = list(view["threads"].items())
+    results = []
+    for thread_id, record in records:
+        if not record["counts"]["unanswered_emails"]:
+            continue
+        if project and record["project_guess"].lower() != project.lower():
+            continue
+        results.append({"thread_id": thread_id, **_with_risk(record, now)})
+    results.sort(key=lambda r: (
+        RISK_ORDER[r["risk_level"]], -r["counts"]["unanswered_emails"], -r["kpis"]["days_waiting"]
+    ))
+    return results
+
+
+def vendor_summary(project: str = None) -> list:
+    """Per-vendor counters, most unanswered first; rolled up on the fly when filtered by project"""
+    with _store.read() as view:
+        if project:
+            vendors = _vendor_counters([
+                r for r in view["threads"].values() if r["project_guess"].lower() == project.lower()
+            ])
+        else:
+            vendors = dict(view["vendors"])
+    return sorted(vendors.values(), key=lambda v: (-v["unanswered_emails"], -v["awaiting_reply_threads"]))
@@ -0,0 +1,123 @@
+"""Cross-worker result cache in SQLite
+
+With `uvicorn --workers N` each process has its own memory, so in-process
+single-flight only coalesces calls inside one worker. This cache lives in a
+SQLite file (WAL mode) that every worker opens: the first worker to ask for
+a key claims it with a lease and computes the value; workers asking for the
+same key meanwhile wait for the result instead of repeating the work, and
+later calls within the TTL get the stored value. If the owner dies, its lease
+expires and the next caller takes over.
+"""
+from services.config import SHARED_CACHE_FILE
+import sqlite3
+import threading
+import time
+import uuid
+
+PENDING = "pending"
+DONE = "done"
+
+# Expired rows are purged every this many writes
+PURGE_EVERY = 200
+
+
+class SharedCache:
+    """Key/value cache with per-key leases, shared by all processes using the same file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {"hits": 0, "computed": 0, "waited": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT, state TEXT NOT NULL, owner TEXT, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """Stored value, or None if missing, expired or still being computed"""
+        row = self._conn().execute(
+            "SELECT value FROM entries WHERE key = ? AND state = ? AND expires_at > ?", (key, DONE, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, state, owner, expires_at) VALUES (?, ?, ?, NULL, ?)",
+            (key, value, DONE, time.time() + ttl)
+        )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        if purge:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+
+    def claim(self, key: str, lease_seconds: float):
+        """Owner token if this caller should compute the key, or None if another has it / it is done"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row and row[1] > now:
+                conn.execute("COMMIT")
+                return None
+            owner = uuid.uuid4().hex
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, state, owner, expires_at) VALUES (?, NULL, ?, ?, ?)",
+                (key, PENDING, owner, now + lease_seconds)
+            )
+            conn.execute("COMMIT")
+            return owner
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release(self, key: str, owner: str) -> None:
+        """Give up a claim after a failed computation so others retry immediately"""
+        self._conn().execute("DELETE FROM entries WHERE key = ? AND owner = ? AND state = ?", (key, owner, PENDING))
+
+    def do(self, key: str, fn, ttl: float, lease_seconds: float, serialize, deserialize, poll_seconds: float = 0.1):
+        """Cached value for key, computing it with fn() in exactly one worker at a time"""
+        waited = False
+        while True:
+            value = self.get(key)
+            if value is not None:
+                with self._lock:
+                    self._stats["waited" if waited else "hits"] += 1
+                return deserialize(value)
+
+            owner = self.claim(key, lease_seconds)
+            if owner:
+                try:
+                    result = fn()
+                except BaseException:
+                    self.release(key, owner)
+                    raise
+                self.set(key, serialize(result), ttl)
+                with self._lock:
+                    self._stats["computed"] += 1
+                return result
+
+            # Another worker is computing it (or its lease has not expired yet)
+            waited = True
+            time.sleep(poll_seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+shared_cache = SharedCache(SHARED_CACHE_FILE)
@@ -0,0 +1,98 @@
+"""Request coalescing (single-flight)
+
+Concurrent calls with the same key share one in-flight computation: the first
+caller runs it and the others wait for its result (or exception) instead of
+repeating the work. Nothing is cached once the computation finishes, so later
+calls always see fresh data. Results are shared objects and must be treated
+as read-only by callers.
+"""
+import asyncio
+import threading
+
+# Every SingleFlight created, for /metrics
+flights = []
+
+
+def request_key(*parts) -> str:
+    """Key from request parameters with surrounding and repeated whitespace removed"""
+    normalized = []
+    for part in parts:
+        if part is None:
+            normalized.append("")
+        else:
+            normalized.append(" ".join(str(part).split()))
+    return "|".join(normalized)
+
+
+class _Call:
+    """One in-flight computation"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls, for threads and for asyncio coroutines"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._stats = {"executed": 0, "coalesced": 0}
+        flights.append(self)
+
+    def do(self, key: str, fn, *args, **kwargs):
+        """Run fn once for all threads calling with the same key at the same time"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["executed"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: str, fn, *args, **kwargs):
+        """Await one shared task for all coroutines calling with the same key at the same time"""
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._tasks[key] = task
+                self._stats["executed"] += 1
+                task.add_done_callback(lambda _: self._forget(key, task))
+            else:
+                self._stats["coalesced"] += 1
+        # A disconnecting client must not cancel the work the others are waiting on
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task) -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def stats(self) -> dict:
+        """Executed vs coalesced call counts and current in-flight keys"""
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._calls) + len(self._tasks)}
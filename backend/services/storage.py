@@ -0,0 +1,172 @@
+"""JSON file persistence helpers shared by the output stores
+
+Safe with several uvicorn workers on the same data directory:
+
+- every write goes to a temporary file in the same directory and is renamed
+  over the target, so readers never see a torn file;
+- file_lock takes an advisory lock on "<file>.lock" (flock on POSIX, msvcrt
+  on Windows) that serializes read-modify-write cycles across processes;
+- SharedJSON keeps a per-process copy of a JSON store and reloads it when
+  another worker has replaced the file since it was last read.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from services import tracing
+import json
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def read_json(path: Path, default=None):
+    """Load a JSON file, returning `default` if it is missing or unreadable"""
+    if not path.exists():
+        return default
+    with tracing.span("file.read", **{"file.path": str(path)}) as span:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            if span:
+                span.set_attribute("file.chars", len(text))
+            return json.loads(text)
+        except (json.JSONDecodeError, OSError):
+            return default
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    """Replace a file's contents in one step (temporary file + rename)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tracing.span("file.write", **{"file.path": str(path), "file.chars": len(text)}):
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+
+def write_json(path: Path, data) -> None:
+    """Write data to a JSON file atomically, creating parent directories as needed"""
+    write_text_atomic(path, json.dumps(data, indent=2, ensure_ascii=False))
+
+
+@contextmanager
+def file_lock(path: Path, blocking: bool = True):
+    """Exclusive advisory lock shared by all processes using the same file
+
+    Yields True once the lock is held, or False if blocking=False and another
+    process holds it.
+    """
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a+b') as f:
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def update_json(path: Path, update, default=None):
+    """Read, modify and write a JSON file under its lock; `update(data)` returns the new data"""
+    with file_lock(path):
+        data = update(read_json(path, default=default))
+        write_json(path, data)
+        return data
+
+
+def append_text(path: Path, text: str) -> None:
+    """Append to a log file without interleaving with other processes"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with file_lock(path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(text)
+
+
+def _stamp(path: Path):
+    try:
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    except FileNotFoundError:
+        return None
+
+
+class SharedJSON:
+    """Per-process cache of a JSON store that follows writes made by other workers"""
+
+    def __init__(self, path: Path, factory):
+        self.path = path
+        self.factory = factory  # builds the in-memory value from the loaded JSON (or None)
+        self._value = None
+        self._stamp = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _refresh(self) -> None:
+        stamp = _stamp(self.path)
+        if not self._loaded or stamp != self._stamp:
+            self._value = self.factory(read_json(self.path, default=None))
+            self._stamp = stamp
+            self._loaded = True
+
+    def get(self):
+        """Current value, reloaded if the file changed since the last read"""
+        with self._lock:
+            self._refresh()
+            return self._value
+
+    @contextmanager
+    def read(self):
+        """Current value, kept from changing in this process until the block exits"""
+        with self._lock:
+            self._refresh()
+            yield self._value
+
+    @contextmanager
+    def update(self, serialize=None):
+        """Lock across processes, yield the freshest value, then write it back atomically
+
+        If the block raises, nothing is written and the partly modified value
+        is dropped, so the next access reloads the file.
+        """
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            try:
+                yield self._value
+            except BaseException:
+                self._loaded = False
+                raise
+            write_json(self.path, serialize(self._value) if serialize else self._value)
+            self._stamp = _stamp(self.path)
+
+    def reset(self, value) -> None:
+        """Replace the value without reading the file (the next update writes it)"""
+        with self._lock:
+            self._value = value
+            self._stamp = _stamp(self.path)
+            self._loaded = True
@@ -0,0 +1,169 @@
+"""Persistent email thread index
+
+Emails are linked into threads by their Message-ID / In-Reply-To / References
+headers, falling back to the normalized subject when no header resolves.
+The index is saved to output/thread_index.json and updated incrementally, so
+new mail is attached to existing threads without regrouping the mailbox.
+"""
+from datetime import datetime
+from services.email_service import normalize_subject, parse_email_date
+from services.config import OUTPUT_DIR
+from services.storage import SharedJSON
+from services import responsiveness
+
+THREAD_INDEX_FILE = OUTPUT_DIR / "thread_index.json"
+
+
+def _email_key(email: dict) -> str:
+    """Stable identifier for an email (Gmail id, Message-ID, or sender+subject+date)"""
+    return (
+        email.get("id")
+        or email.get("message_id")
+        or f"{email.get('from', '')}|{email.get('subject', '')}|{email.get('date', '')}"
+    )
+
+
+def _linked_message_ids(email: dict) -> list:
+    """Message-IDs this email points at, nearest parent first"""
+    linked = []
+    if email.get("in_reply_to"):
+        linked.append(email["in_reply_to"].strip())
+    references = email.get("references") or []
+    if isinstance(references, str):
+        references = references.split()
+    linked.extend(ref.strip() for ref in reversed(references) if ref.strip())
+    return linked
+
+
+def _sort_key(email: dict) -> tuple:
+    """Chronological sort key on the parsed date, undated emails first"""
+    ts = parse_email_date(email.get("date", ""))
+    return (ts if ts is not None else float("-inf"), _email_key(email))
+
+
+class ThreadIndex:
+    """Message-ID/subject thread linking with incremental updates"""
+
+    def __init__(self, data: dict = None):
+        data = data or {}
+        self.emails = data.get("emails", {})            # email key -> email
+        self.message_ids = data.get("message_ids", {})  # Message-ID (seen or referenced) -> thread id
+        self.subjects = data.get("subjects", {})        # normalized subject -> thread id
+        self.threads = data.get("threads", {})          # thread id -> {"key", "email_ids", "updated_at"}
+        self.email_threads = data.get("email_threads", {})  # email key -> thread id
+
+    def to_dict(self) -> dict:
+        """Serializable form of the index"""
+        return {
+            "emails": self.emails,
+            "message_ids": self.message_ids,
+            "subjects": self.subjects,
+            "threads": self.threads,
+            "email_threads": self.email_threads
+        }
+
+    def add_emails(self, emails: list) -> set:
+        """Index emails not seen before; return the ids of threads they touched"""
+        touched = set()
+        for email in emails:
+            key = _email_key(email)
+            if key in self.emails:
+                continue
+            thread_id = self._assign(email, key)
+            self.emails[key] = email
+            touched.add(thread_id)
+        # A reply linking two threads folds one into the other (see _merge); the
+        # surviving thread is touched too, so drop ids that no longer exist
+        touched = {thread_id for thread_id in touched if thread_id in self.threads}
+
+        now = datetime.now().isoformat()
+        for thread_id in touched:
+            thread = self.threads[thread_id]
+            thread["email_ids"].sort(key=lambda k: _sort_key(self.emails[k]))
+            thread["updated_at"] = now
+        return touched
+
+    def _assign(self, email: dict, key: str) -> str:
+        """Attach an email to its thread, creating or merging threads as needed"""
+        subject_key = normalize_subject(email.get("subject", "")) or email.get("subject", "")
+
+        # Step 1: Header links (the email itself may already be referenced by a later reply)
+        candidates = []
+        for message_id in [email.get("message_id", "")] + _linked_message_ids(email):
+            thread_id = self.message_ids.get(message_id) if message_id else None
+            if thread_id and thread_id not in candidates:
+                candidates.append(thread_id)
+
+        # Step 2: Fall back to the normalized subject
+        if not candidates and subject_key in self.subjects:
+            candidates.append(self.subjects[subject_key])
+
+        if candidates:
+            thread_id = candidates[0]
+            for other in candidates[1:]:
+                self._merge(thread_id, other)
+        else:
+            thread_id = email.get("message_id") or key
+            self.threads[thread_id] = {"key": subject_key, "email_ids": [], "updated_at": None}
+
+        self.threads[thread_id]["email_ids"].append(key)
+        self.email_threads[key] = thread_id
+        for message_id in [email.get("message_id", "")] + _linked_message_ids(email):
+            if message_id:
+                self.message_ids[message_id] = thread_id
+        if subject_key:
+            self.subjects.setdefault(subject_key, thread_id)
+        return thread_id
+
+    def _merge(self, target: str, source: str) -> None:
+        """Fold thread `source` into `target` when a reply links both"""
+        moved = self.threads.pop(source, None)
+        if not moved:
+            return
+        self.threads[target]["email_ids"].extend(moved["email_ids"])
+        for mapping in (self.message_ids, self.subjects, self.email_threads):
+            for name, thread_id in mapping.items():
+                if thread_id == source:
+                    mapping[name] = target
+
+    def thread_emails(self, thread_id: str) -> list:
+        """Emails of a thread in chronological order"""
+        thread = self.threads.get(thread_id, {})
+        return [self.emails[k] for k in thread.get("email_ids", []) if k in self.emails]
+
+    def thread_of(self, email: dict):
+        """Thread id containing an email, or None"""
+        return self.email_threads.get(_email_key(email))
+
+    def threads_for(self, thread_ids) -> dict:
+        """{thread id: chronologically sorted emails} for the given threads"""
+        return {thread_id: self.thread_emails(thread_id) for thread_id in thread_ids if thread_id in self.threads}
+
+
+_store = SharedJSON(THREAD_INDEX_FILE, lambda data: ThreadIndex(data or {}))
+
+
+def get_thread_index() -> ThreadIndex:
+    """Thread index, loaded from disk on first use and reloaded after other workers update it"""
+    return _store.get()
+
+
+def index_new_emails(emails: list) -> dict:
+    """Fold newly fetched emails into the persistent index and return the threads they belong to"""
+    # Holds the index file lock, so workers fetching mail at the same time apply their updates in turn
+    with _store.update(serialize=lambda index: index.to_dict()) as index:
+        touched = index.add_emails(emails)
+        thread_ids = []
+        for email in emails:
+            thread_id = index.thread_of(email)
+            if thread_id and thread_id not in thread_ids:
+                thread_ids.append(thread_id)
+        touched_threads = index.threads_for(touched)
+        result = index.threads_for(thread_ids)
+
+    # Keep the responsiveness view current for the threads this mail touched
+    if responsiveness.has_data():
+        responsiveness.update_threads(touched_threads, index.threads)
+    else:
+        responsiveness.rebuild(index)
+    return result
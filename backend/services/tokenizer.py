@@ -0,0 +1,108 @@
+"""Token counting and token-budget truncation for prompts
+
+Uses tiktoken's encoding for the chat model when tiktoken is installed and the
+encoding file is available locally (point TIKTOKEN_CACHE_DIR at a directory
+containing the cached .tiktoken file to run fully offline). Otherwise falls
+back to a regex approximation of the same pre-tokenization, which stays
+within a few percent of tiktoken on English email text.
+"""
+from services.config import TOKENIZER_BACKEND, TOKENIZER_ENCODING
+import re
+import threading
+
+# Pieces the BPE tokenizers almost never merge across: words (with their
+# leading space), digit runs of up to 3, punctuation runs, and newlines
+_PIECE_RE = re.compile(r" ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d]+|\s*\n|\s+")
+# Longest letter run the approximation treats as a single token
+_MAX_WORD_PIECE = 8
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken encoding, or None when unavailable (loaded once)"""
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_loaded:
+            if TOKENIZER_BACKEND != "approx":
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:
+                    print(f"tiktoken unavailable ({type(e).__name__}); using approximate tokenizer")
+                    _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+
+def _approx_pieces(text: str) -> list:
+    """Split text into approximate tokens; joining the pieces gives back the text"""
+    pieces = []
+    for match in _PIECE_RE.finditer(text):
+        piece = match.group(0)
+        if len(piece) > _MAX_WORD_PIECE and piece.strip().isalpha():
+            pieces.extend(piece[i:i + _MAX_WORD_PIECE] for i in range(0, len(piece), _MAX_WORD_PIECE))
+        else:
+            pieces.append(piece)
+    return pieces
+
+
+def tokenizer_name() -> str:
+    """Which tokenizer is in use"""
+    return f"tiktoken:{TOKENIZER_ENCODING}" if _get_encoding() else "approx"
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_approx_pieces(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """Cut text to at most max_tokens tokens (suffix included) on a token boundary"""
+    if not text or max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        keep = max(0, max_tokens - count_tokens(suffix))
+        return encoding.decode(tokens[:keep]).rstrip("�").rstrip() + suffix
+
+    pieces = _approx_pieces(text)
+    if len(pieces) <= max_tokens:
+        return text
+    keep = max(0, max_tokens - count_tokens(suffix))
+    return "".join(pieces[:keep]).rstrip() + suffix
+
+
+def pack_to_budget(items: list, budget: int, render=str, priority=None) -> list:
+    """Most relevant items whose rendered text fits in `budget` tokens, in their original order
+
+    `priority(index, item)` returns a sort key (higher first); by default items
+    are taken in their original order until the budget is used up.
+    """
+    order = list(range(len(items)))
+    if priority is not None:
+        order.sort(key=lambda i: priority(i, items[i]), reverse=True)
+
+    selected = []
+    used = 0
+    for i in order:
+        cost = count_tokens(render(items[i]))
+        if used + cost > budget:
+            if priority is None:
+                break
+            continue
+        selected.append(i)
+        used += cost
+    return [items[i] for i in sorted(selected)]
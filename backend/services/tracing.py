@@ -0,0 +1,274 @@
+"""Lightweight in-process request tracing
+
+Each HTTP request gets a trace: a tree of spans for the pipeline stages, LLM
+calls, Gmail requests and JSON file reads/writes it made, with attributes
+such as tokens, email ids and cache hits. Span and trace ids follow the W3C
+trace context format (an incoming `traceparent` header is continued), and
+finished traces are exported as OTLP/JSON, so they can be written to a local
+file (TRACE_EXPORT_FILE) or posted to any OpenTelemetry collector.
+
+Finished traces are kept in memory for /api/debug/traces: the most recent
+ones in a ring buffer and the slowest ones in a bounded heap. Spans opened
+outside a request (scheduler, batch polling) are not recorded unless they
+start their own trace with root=True.
+
+The current span is a context variable: it follows awaits and
+run_in_threadpool, and work submitted to a ThreadPoolExecutor keeps its
+parent when wrapped with in_current_context.
+"""
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from services.config import TRACING_ENABLED, TRACE_RECENT_KEEP, TRACE_SLOW_KEEP, TRACE_MAX_SPANS, TRACE_EXPORT_FILE
+import heapq
+import json
+import os
+import threading
+import time
+
+SERVICE_NAME = "carma-backend"
+
+_current_span = ContextVar("current_span", default=None)
+
+_lock = threading.Lock()
+_recent = deque(maxlen=max(1, TRACE_RECENT_KEEP))
+_slowest = []  # min-heap of (duration_ns, sequence, trace)
+_sequence = 0
+
+
+class Trace:
+    """Spans of one request; complete when its root span ends"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans = []
+        self.dropped_spans = 0
+        self.root = None
+        self._lock = threading.Lock()
+
+    def add(self, span) -> bool:
+        with self._lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped_spans += 1
+                return False
+            self.spans.append(span)
+            return True
+
+    @property
+    def duration_ms(self) -> float:
+        return round((self.root.end_ns - self.root.start_ns) / 1e6, 1) if self.root and self.root.end_ns else 0.0
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    def __init__(self, trace: Trace, name: str, parent_id: str = None, attributes: dict = None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._lock = threading.Lock()
+
+    def set_attribute(self, key: str, value) -> None:
+        if value is None:
+            return
+        with self._lock:
+            self.attributes[key] = value
+
+    def increment_attribute(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = "error"
+        self.error = f"{type(error).__name__}: {str(error)[:300]}"
+
+
+def _parse_traceparent(header: str):
+    """(trace id, parent span id) from a W3C traceparent header, or None"""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+
+def traceparent(span: Span) -> str:
+    """W3C traceparent header value for a span"""
+    return f"00-{span.trace.trace_id}-{span.span_id}-01"
+
+
+@contextmanager
+def span(name: str, root: bool = False, parent_header: str = None, **attributes):
+    """Record a span under the current one; with root=True, start a new trace when there is none
+
+    Yields the Span, or None when nothing is being recorded.
+    """
+    parent = _current_span.get()
+    if not TRACING_ENABLED or (parent is None and not root):
+        yield None
+        return
+
+    if parent is not None:
+        current = Span(parent.trace, name, parent.span_id, attributes)
+        recorded = parent.trace.add(current)
+    else:
+        remote = _parse_traceparent(parent_header)
+        trace = Trace(remote[0] if remote else os.urandom(16).hex())
+        current = Span(trace, name, remote[1] if remote else None, attributes)
+        trace.root = current
+        recorded = trace.add(current)
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        if recorded and current.trace.root is current:
+            _finish(current.trace)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_attribute(key: str, value) -> None:
+    """Set an attribute on the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(key, value)
+
+
+def increment_attribute(key: str, amount: int = 1) -> None:
+    current = _current_span.get()
+    if current is not None:
+        current.increment_attribute(key, amount)
+
+
+def in_current_context(fn):
+    """Wrap fn so it runs with this thread's context (and current span) in a pool thread"""
+    context = copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def _finish(trace: Trace) -> None:
+    global _sequence
+    with _lock:
+        _sequence += 1
+        _recent.append(trace)
+        entry = (trace.root.end_ns - trace.root.start_ns, _sequence, trace)
+        if len(_slowest) < TRACE_SLOW_KEEP:
+            heapq.heappush(_slowest, entry)
+        elif entry[0] > _slowest[0][0]:
+            heapq.heapreplace(_slowest, entry)
+    if TRACE_EXPORT_FILE:
+        try:
+            from services.storage import append_text
+            append_text(TRACE_EXPORT_FILE, json.dumps(to_otlp(trace), ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"Trace export failed: {str(e)}")
+
+
+def _summary(trace: Trace) -> dict:
+    root = trace.root
+    return {
+        "trace_id": trace.trace_id,
+        "name": root.name,
+        "start_time": root.start_ns / 1e9,
+        "duration_ms": trace.duration_ms,
+        "status": root.status,
+        "span_count": len(trace.spans),
+        "dropped_spans": trace.dropped_spans,
+        "attributes": dict(root.attributes)
+    }
+
+
+def slowest_traces(limit: int = None) -> list:
+    """Summaries of the slowest kept traces, slowest first"""
+    with _lock:
+        traces = [entry[2] for entry in sorted(_slowest, key=lambda e: (-e[0], e[1]))]
+    return [_summary(t) for t in traces[:limit]]
+
+
+def recent_traces(limit: int = None) -> list:
+    """Summaries of the most recent traces, newest first"""
+    with _lock:
+        traces = list(reversed(_recent))
+    return [_summary(t) for t in traces[:limit]]
+
+
+def get_trace(trace_id: str):
+    with _lock:
+        for trace in list(_recent) + [entry[2] for entry in _slowest]:
+            if trace.trace_id == trace_id:
+                return trace
+    return None
+
+
+def to_tree(trace: Trace) -> dict:
+    """Nested span tree with durations in milliseconds and offsets from the start of the request"""
+    with trace._lock:
+        spans = list(trace.spans)
+    start = trace.root.start_ns
+    nodes = {
+        s.span_id: {
+            "name": s.name,
+            "span_id": s.span_id,
+            "offset_ms": round((s.start_ns - start) / 1e6, 1),
+            "duration_ms": round((s.end_ns - s.start_ns) / 1e6, 1) if s.end_ns else None,
+            "status": s.status,
+            **({"error": s.error} if s.error else {}),
+            "attributes": dict(s.attributes),
+            "children": []
+        }
+        for s in spans
+    }
+    for s in spans:
+        if s is not trace.root and s.parent_id in nodes:
+            nodes[s.parent_id]["children"].append(nodes[s.span_id])
+    return {**_summary(trace), "root": nodes[trace.root.span_id]}
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: Trace) -> dict:
+    """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+    with trace._lock:
+        spans = list(trace.spans)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{
+            "scope": {"name": "services.tracing"},
+            "spans": [{
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                "name": s.name,
+                "kind": 2 if s is trace.root else 1,  # SERVER / INTERNAL
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns or s.start_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 2, "message": s.error} if s.status == "error" else {"code": 1}
+            } for s in spans]
+        }]
+    }]}
@@ -0,0 +1,31 @@
+"""Shared test setup
+
+The services read their configuration at import time, so the environment is
+set here, before any test module imports them: data and output go to
+temporary directories (the tracked files in data/ and output/ are never
+touched), completions come from the fake LLM backend and the rate limiter is off.
+"""
+from pathlib import Path
+import os
+import shutil
+import sys
+import tempfile
+
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+WORK_DIR = Path(tempfile.mkdtemp(prefix="carma-tests-"))
+shutil.copytree(BACKEND_DIR / "data", WORK_DIR / "data", ignore=shutil.ignore_patterns("attachments"))
+
+os.environ.update({
+    "DATA_DIR": str(WORK_DIR / "data"),
+    "OUTPUT_DIR": str(WORK_DIR / "output"),
+    "LLM_BACKEND": "fake",
+    "FAKE_LLM_LATENCY": "0",
+    "FAKE_LLM_JITTER": "0",
+    "FAKE_LLM_ERROR_RATE": "0",
+    "LLM_RPM_LIMIT": "0",
+    "LLM_TPM_LIMIT": "0",
+    "LLM_SHARED_CACHE_TTL": "0"
+})
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,89 @@
+"""Validating and merging batch results in services/batch_service.py"""
+import json
+
+import pytest
+
+from services import batch_service, email_analysis
+from services.storage import read_json, write_json
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_service, "BATCHES_DIR", tmp_path / "batches")
+    monkeypatch.setattr(email_analysis, "ANALYSIS_FILE", tmp_path / "ai_inbox_analysis.json")
+    monkeypatch.setattr(email_analysis, "OUTPUT_DIR", tmp_path)
+    return tmp_path
+
+
+def _job(kind: str, context: dict) -> dict:
+    job_id = f"{kind}_test"
+    write_json(batch_service._job_dir(job_id) / "context.json", context)
+    return {"job_id": job_id, "kind": kind, "request_count": len(context)}
+
+
+def _line(custom_id: str, content, status_code: int = 200) -> dict:
+    body = {"choices": [{"message": {"content": json.dumps(content) if isinstance(content, dict) else content}}]}
+    return {"custom_id": custom_id, "response": {"status_code": status_code, "body": body}, "error": None}
+
+
+def _analysis(subject: str, risk: str = "HIGH") -> dict:
+    return {"thread_subject": subject, "response_detected": False, "risk_level": risk}
+
+
+def test_thread_results_merge_by_thread_id_not_model_subject(stores):
+    job = _job("thread_analyses", {
+        "thread-0": {"thread_id": "<a@x>", "thread_subject": "Ship date"},
+        "thread-1": {"thread_id": "<b@x>", "thread_subject": "Ship date"}
+    })
+    # Both threads share a subject and the model rewords it
+    batch_service._merge_results(job, [_line("thread-0", _analysis("Ship Date?")),
+                                       _line("thread-1", _analysis("Ship Date?", "LOW"))])
+
+    stored = {a["thread_id"]: a for a in read_json(email_analysis.ANALYSIS_FILE)}
+    assert set(stored) == {"<a@x>", "<b@x>"}
+    assert stored["<a@x>"]["thread_subject"] == "Ship date"
+    assert stored["<b@x>"]["risk_level"] == "LOW"
+    assert job["merged"] == 2 and job["failed_ids"] == []
+
+
+def test_rerun_replaces_the_thread_and_keeps_the_others(stores):
+    email_analysis.merge_thread_analyses([
+        {**_analysis("Ship date"), "thread_id": "<a@x>"},
+        {**_analysis("Other"), "thread_id": "<c@x>"},
+        _analysis("Legacy subject-keyed")
+    ])
+    job = _job("thread_analyses", {"thread-0": {"thread_id": "<a@x>", "thread_subject": "Ship date"}})
+    batch_service._merge_results(job, [_line("thread-0", _analysis("Ship date", "LOW"))])
+
+    stored = {a.get("thread_id"): a for a in read_json(email_analysis.ANALYSIS_FILE)}
+    assert stored["<a@x>"]["risk_level"] == "LOW"
+    assert set(stored) == {"<a@x>", "<c@x>", None}
+
+
+def test_failed_and_invalid_results_are_not_merged(stores):
+    job = _job("thread_analyses", {
+        "thread-0": {"thread_id": "<a@x>", "thread_subject": "A"},
+        "thread-1": {"thread_id": "<b@x>", "thread_subject": "B"},
+        "thread-2": {"thread_id": "<c@x>", "thread_subject": "C"},
+        "thread-3": {"thread_id": "<d@x>", "thread_subject": "D"}
+    })
+    batch_service._merge_results(job, [
+        _line("thread-0", _analysis("A")),
+        _line("thread-1", "not json"),
+        _line("thread-2", {"thread_subject": "C", "risk_level": "SEVERE"}),
+        {"custom_id": "thread-3", "response": None, "error": {"message": "boom"}},
+        _line("thread-9", _analysis("Unknown request"))
+    ])
+
+    assert [a["thread_id"] for a in read_json(email_analysis.ANALYSIS_FILE)] == ["<a@x>"]
+    assert job["merged"] == 1
+    assert job["failed_ids"] == ["thread-1", "thread-2", "thread-3"]
+
+
+def test_summaries_merge_into_each_project_file(stores):
+    email = {"id": "e1", "from": "a@gc.com", "to": "b@vendor.com", "subject": "RFI 12", "body": "Please confirm"}
+    job = _job("summaries", {"summary-0": {"project": "Test Project", "email": email}})
+    batch_service._merge_results(job, [_line("summary-0", {"summary": "Confirm ceiling type", "category": "RFI"})])
+
+    (stored,) = read_json(stores / "test_project_summarized.json")
+    assert stored["id"] == "e1" and stored["category"] == "RFI" and stored["summary"] == "Confirm ceiling type"
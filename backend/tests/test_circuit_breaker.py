@@ -0,0 +1,80 @@
+"""State transitions of the LLM circuit breaker in services/openai_service.py"""
+import pytest
+
+from services.openai_service import CircuitBreaker, CircuitOpenError
+
+
+def _open_breaker(threshold: int = 3) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=threshold, reset_seconds=30)
+    for _ in range(threshold):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def _expire(breaker: CircuitBreaker) -> None:
+    breaker.opened_at -= breaker.reset_seconds
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.before_call()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.status()["consecutive_failures"] == 1
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = _open_breaker()
+    _expire(breaker)
+
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_successful_probe_closes_the_circuit():
+    breaker = _open_breaker()
+    _expire(breaker)
+    breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = _open_breaker()
+    _expire(breaker)
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_released_probe_frees_the_slot():
+    breaker = _open_breaker()
+    _expire(breaker)
+    breaker.before_call()
+    breaker.release_probe()
+
+    assert breaker.state == "half_open"
+    breaker.before_call()
@@ -0,0 +1,7 @@
+"""Startup must not import the dependencies that are loaded on first use"""
+from benchmarks import import_time
+
+
+def test_deferred_modules_are_not_imported_at_startup():
+    measurement = import_time.measure_once()
+    assert measurement["deferred_loaded"] == []
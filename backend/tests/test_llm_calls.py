@@ -0,0 +1,28 @@
+"""create_with_backoff and hedged calls in services/openai_service.py"""
+import pytest
+
+from services import openai_service, tracing
+from services.openai_service import CircuitBreaker, CircuitOpenError
+
+
+def test_open_circuit_fails_before_queueing_for_capacity(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    monkeypatch.setattr(openai_service, "circuit_breaker", breaker)
+    acquired = []
+    monkeypatch.setattr(openai_service.llm_scheduler, "acquire", lambda *args: acquired.append(args))
+
+    with pytest.raises(CircuitOpenError):
+        openai_service.create_with_backoff(model="gpt-4o-mini", messages=[])
+    assert acquired == []
+
+
+def test_hedged_calls_record_on_the_callers_span(monkeypatch):
+    def create(**kwargs):
+        tracing.increment_attribute("llm.retries")
+        return "completion"
+
+    monkeypatch.setattr(openai_service, "create_with_backoff", create)
+    with tracing.span("test", root=True) as span:
+        assert openai_service._hedged_create(5, model="gpt-4o-mini", messages=[]) == "completion"
+    assert span.attributes["llm.retries"] == 1
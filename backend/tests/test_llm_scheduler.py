@@ -0,0 +1,77 @@
+"""Token buckets and priority admission in services/llm_scheduler.py"""
+import threading
+import time
+
+from services.llm_scheduler import TokenBucket, LLMScheduler, INTERACTIVE, BATCH
+
+
+def test_bucket_starts_full_and_refills_at_its_rate():
+    bucket = TokenBucket(600)  # 10 per second
+    assert bucket.wait_time(600) == 0
+
+    bucket.level = 0
+    bucket.refill(bucket.updated + 0.5)
+    assert abs(bucket.level - 5) < 1e-6
+
+    bucket.refill(bucket.updated + 3600)
+    assert bucket.level == bucket.capacity
+
+
+def test_bucket_wait_time_accounts_for_reserve():
+    bucket = TokenBucket(600)
+    bucket.level = 100
+    assert bucket.wait_time(50) == 0
+    # Taking 50 while leaving 100 needs 50 more units at 10/s
+    assert abs(bucket.wait_time(50, reserve=100) - 5.0) < 1e-6
+    # Never asks for more than the bucket can hold
+    assert bucket.wait_time(10_000) == bucket.wait_time(600)
+
+
+def test_disabled_scheduler_admits_immediately():
+    scheduler = LLMScheduler(rpm=0, tpm=0)
+    assert not scheduler.enabled
+    assert scheduler.acquire(1_000_000) == 0.0
+
+
+def test_admission_takes_from_both_buckets():
+    scheduler = LLMScheduler(rpm=100, tpm=10_000, interactive_reserve=0)
+    assert scheduler.acquire(2_500, priority=INTERACTIVE) < 0.05
+    assert scheduler.requests.level <= 99 + 1e-3
+    assert scheduler.tokens.level <= 7_500 + 1
+    assert scheduler.status()["classes"][INTERACTIVE]["admitted"] == 1
+
+
+def test_batch_leaves_the_interactive_reserve():
+    scheduler = LLMScheduler(rpm=600, tpm=1_000_000, interactive_reserve=0.5)
+    scheduler.requests.level = 299  # just under the 300 reserved for interactive calls
+
+    # A batch call would have to wait for the bucket to refill above the reserve...
+    started = time.monotonic()
+    scheduler.acquire(1, priority=BATCH)
+    assert time.monotonic() - started >= 0.1
+
+    # ...while an interactive call may use the reserve right away
+    scheduler.requests.level = 299
+    started = time.monotonic()
+    scheduler.acquire(1, priority=INTERACTIVE)
+    assert time.monotonic() - started < 0.05
+
+
+def test_waiting_interactive_call_goes_before_queued_batch_work():
+    scheduler = LLMScheduler(rpm=600, tpm=1_000_000, interactive_reserve=0)
+    scheduler.requests.level = 0
+    admitted = []
+
+    def call(priority):
+        scheduler.acquire(1, priority=priority)
+        admitted.append(priority)
+
+    batch = threading.Thread(target=call, args=(BATCH,))
+    batch.start()
+    time.sleep(0.02)  # the batch call is queued first
+    interactive = threading.Thread(target=call, args=(INTERACTIVE,))
+    interactive.start()
+    batch.join(timeout=5)
+    interactive.join(timeout=5)
+
+    assert admitted == [INTERACTIVE, BATCH]
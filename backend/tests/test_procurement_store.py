@@ -0,0 +1,77 @@
+"""Per-vendor hashing, keys and pruning in services/procurement_store.py"""
+from services import procurement_store as ps
+from routes.procurement_analyze import _match_classifications
+
+
+def _store() -> dict:
+    return {"files": {}, "vendors": {}}
+
+
+def _classify(store: dict, filename: str, vendor_rows: dict) -> None:
+    ps.update_file(store, filename, ["Vendor", "Item"], "Vendor", vendor_rows)
+    for name, rows_hash in ps.find_changed_vendors(store, filename, vendor_rows).items():
+        ps.record_classification(store, filename, name, vendor_rows[name], rows_hash, {"completeness": "Complete"})
+
+
+def test_rows_hash_ignores_order_and_whitespace():
+    rows = ps.group_rows_by_vendor([
+        {"Vendor": "Steel Co", "Item": "W12x26  beams"},
+        {"Vendor": "Steel Co", "Item": "Rebar"}
+    ], "Vendor")
+    reordered = ps.group_rows_by_vendor([
+        {"Vendor": " Steel Co", "Item": "Rebar"},
+        {"Vendor": "Steel Co", "Item": "W12x26 beams "}
+    ], "Vendor")
+    assert ps.hash_rows(rows["Steel Co"]) == ps.hash_rows(reordered["Steel Co"])
+
+
+def test_only_changed_vendors_are_reclassified():
+    store = _store()
+    _classify(store, "log.xlsx", {"Steel Co": [{"Item": "Beams"}], "Glass Co": [{"Item": "Panels"}]})
+
+    changed = ps.find_changed_vendors(store, "log.xlsx", {
+        "Steel Co": [{"Item": "Beams"}],
+        "Glass Co": [{"Item": "Panels", "Status": "Backordered"}]
+    })
+    assert list(changed) == ["Glass Co"]
+
+
+def test_vendors_differing_only_by_case_are_kept_apart():
+    store = _store()
+    _classify(store, "log.xlsx", {"ABC Supply": [{"Item": "Beams"}], "Abc Supply": [{"Item": "Panels"}]})
+
+    assert sorted(e["vendor_name"] for e in ps.list_vendors(store)) == ["ABC Supply", "Abc Supply"]
+    assert ps.find_changed_vendors(store, "log.xlsx", {"ABC Supply": [{"Item": "Beams"}]}) == {}
+
+
+def test_rewriting_a_file_drops_its_removed_vendors():
+    store = _store()
+    _classify(store, "log.xlsx", {"Steel Co": [{"Item": "Beams"}], "Glass Co": [{"Item": "Panels"}]})
+    # An entry under the old lowercased key format
+    store["vendors"]["log.xlsx::steel co"] = {"vendor_name": "Steel Co", "file": "log.xlsx"}
+
+    ps.update_file(store, "log.xlsx", ["Vendor", "Item"], "Vendor", {"Steel Co": [{"Item": "Beams"}]})
+    assert list(store["vendors"]) == ["log.xlsx::Steel Co"]
+
+
+def test_prune_files_drops_logs_no_longer_present():
+    store = _store()
+    _classify(store, "old.xlsx", {"Steel Co": [{"Item": "Beams"}]})
+    _classify(store, "new.xlsx", {"Glass Co": [{"Item": "Panels"}]})
+
+    assert ps.prune_files(store, ["new.xlsx"]) == ["old.xlsx"]
+    assert list(store["files"]) == ["new.xlsx"]
+    assert [e["file"] for e in ps.list_vendors(store)] == ["new.xlsx"]
+
+
+def test_classifications_match_exact_names_before_case_insensitive_ones():
+    batch = [("log.xlsx", "ABC Supply", [], "h1"), ("log.xlsx", "Abc Supply", [], "h2"), ("log.xlsx", "Steel Co", [], "h3")]
+    matched = _match_classifications(batch, [
+        {"vendor_name": "Abc Supply", "completeness": "Partial"},
+        {"vendor_name": "ABC SUPPLY", "completeness": "Complete"},
+        {"vendor_name": "steel co", "completeness": "Complete"}
+    ])
+    assert matched["Abc Supply"]["completeness"] == "Partial"
+    # "ABC Supply" has no exact match and its case-insensitive match is ambiguous
+    assert "ABC Supply" not in matched
+    assert matched["Steel Co"]["completeness"] == "Complete"
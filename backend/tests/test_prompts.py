@@ -0,0 +1,33 @@
+"""Prompt layout in services/prompts.py and its handling by the LLM backends"""
+from services import prompts
+from services.llm_backends import FakeBackend, _join_leading_system
+
+
+def test_shared_system_message_comes_before_each_template_prefix():
+    for template in prompts.TEMPLATES:
+        messages = template.messages("data")
+        assert messages[-2] == {"role": "system", "content": template.static_prefix}
+        assert messages[-1] == {"role": "user", "content": "data"}
+        if template is not prompts.SEMANTIC_FILTER_TEMPLATE:
+            assert messages[0] == {"role": "system", "content": prompts.SHARED_SYSTEM_PROMPT}
+
+
+def test_thread_analysis_prefix_reaches_provider_cache_minimum():
+    assert prompts.THREAD_ANALYSIS_TEMPLATE.prefix_tokens() >= prompts.PROMPT_CACHE_MIN_TOKENS
+
+
+def test_fake_backend_answers_by_template_and_caches_repeated_prefix():
+    backend = FakeBackend(latency=0, jitter=0)
+    messages = prompts.THREAD_ANALYSIS_TEMPLATE.messages("Thread: Steel delivery\n")
+    first = backend.create(model="fake", messages=messages)
+    second = backend.create(model="fake", messages=messages)
+
+    assert first.choices[0].message.content != "{}"
+    assert first.usage.prompt_tokens_details.cached_tokens == 0
+    assert second.usage.prompt_tokens_details.cached_tokens == prompts.THREAD_ANALYSIS_TEMPLATE.prefix_tokens()
+
+
+def test_local_servers_get_one_system_message():
+    messages = _join_leading_system(prompts.AI_REPLY_TEMPLATE.messages("data"))
+    assert [m["role"] for m in messages] == ["system", "user"]
+    assert messages[0]["content"].startswith(prompts.SHARED_SYSTEM_PROMPT)
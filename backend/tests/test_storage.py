@@ -0,0 +1,18 @@
+"""SharedJSON in services/storage.py"""
+import pytest
+
+from services.storage import SharedJSON, read_json
+
+
+def test_failed_update_writes_nothing_and_drops_the_modified_value(tmp_path):
+    store = SharedJSON(tmp_path / "store.json", lambda data: data or {"count": 0})
+    with store.update() as value:
+        value["count"] = 1
+
+    with pytest.raises(RuntimeError):
+        with store.update() as value:
+            value["count"] = 2
+            raise RuntimeError("update failed halfway")
+
+    assert read_json(tmp_path / "store.json") == {"count": 1}
+    assert store.get() == {"count": 1}
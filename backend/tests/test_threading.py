@@ -0,0 +1,80 @@
+"""Thread grouping in services/email_service.py and the incremental index"""
+from services.email_service import group_emails_into_threads
+from services.thread_index import ThreadIndex
+
+
+def _email(id, subject, date, message_id="", in_reply_to="", references=None, sender="a@gc.com"):
+    return {
+        "id": id, "from": sender, "to": "b@vendor.com", "subject": subject, "date": date,
+        "body": "", "message_id": message_id, "in_reply_to": in_reply_to, "references": references or []
+    }
+
+
+def _ids_by_thread(threads: dict) -> list:
+    return sorted([e["id"] for e in emails] for emails in threads.values())
+
+
+def test_replies_join_their_thread_by_headers():
+    threads = group_emails_into_threads([
+        _email("1", "Ship date", "Mon, 06 Oct 2025 09:00:00 +0000", message_id="<m1@x>"),
+        _email("2", "Different wording", "Tue, 07 Oct 2025 09:00:00 +0000", message_id="<m2@x>",
+               in_reply_to="<m1@x>", references=["<m1@x>"]),
+        _email("3", "Unrelated", "Tue, 07 Oct 2025 10:00:00 +0000", message_id="<m3@x>")
+    ])
+    assert _ids_by_thread(threads) == [["1", "2"], ["3"]]
+
+
+def test_subject_fallback_ignores_reply_prefixes():
+    threads = group_emails_into_threads([
+        _email("1", "RFI 12 - Ceiling", "Mon, 06 Oct 2025 09:00:00 +0000"),
+        _email("2", "RE: Fwd: RFI 12 - Ceiling", "Tue, 07 Oct 2025 09:00:00 +0000"),
+        _email("3", "RFI 13 - Ceiling", "Tue, 07 Oct 2025 10:00:00 +0000")
+    ])
+    assert _ids_by_thread(threads) == [["1", "2"], ["3"]]
+
+
+def test_threads_are_sorted_by_parsed_date():
+    threads = group_emails_into_threads([
+        _email("late", "Submittal", "Wed, 08 Oct 2025 09:00:00 +0000"),
+        _email("early", "Re: Submittal", "Mon, 06 Oct 2025 23:00:00 -0500"),
+        _email("middle", "Re: Submittal", "Tue, 07 Oct 2025 12:00:00 +0000")
+    ])
+    (emails,) = threads.values()
+    assert [e["id"] for e in emails] == ["early", "middle", "late"]
+
+
+def test_reply_referencing_two_threads_merges_them():
+    index = ThreadIndex()
+    index.add_emails([
+        _email("1", "Steel", "Mon, 06 Oct 2025 09:00:00 +0000", message_id="<a@x>"),
+        _email("2", "Glass", "Mon, 06 Oct 2025 10:00:00 +0000", message_id="<b@x>")
+    ])
+    assert len(index.threads) == 2
+
+    touched = index.add_emails([
+        _email("3", "Steel and glass", "Tue, 07 Oct 2025 09:00:00 +0000", message_id="<c@x>",
+               in_reply_to="<a@x>", references=["<b@x>", "<a@x>"])
+    ])
+    assert len(index.threads) == 1
+    (thread_id,) = touched
+    assert [e["id"] for e in index.thread_emails(thread_id)] == ["1", "2", "3"]
+
+
+def test_already_indexed_emails_are_skipped():
+    index = ThreadIndex()
+    email = _email("1", "Steel", "Mon, 06 Oct 2025 09:00:00 +0000", message_id="<a@x>")
+    assert index.add_emails([email])
+    assert index.add_emails([email]) == set()
+
+
+def test_merge_within_one_batch():
+    index = ThreadIndex()
+    touched = index.add_emails([
+        _email("1", "Steel", "Mon, 06 Oct 2025 09:00:00 +0000", message_id="<a>"),
+        _email("2", "Glass", "Mon, 06 Oct 2025 10:00:00 +0000", message_id="<b>"),
+        _email("3", "Steel and glass", "Tue, 07 Oct 2025 09:00:00 +0000", message_id="<c>",
+               in_reply_to="<a>", references=["<a>", "<b>"])
+    ])
+    assert touched == set(index.threads)
+    (thread_id,) = touched
+    assert [e["id"] for e in index.thread_emails(thread_id)] == ["1", "2", "3"]
@@ -0,0 +1,54 @@
+"""POST /api/reports/weekly with the fake LLM backend"""
+from fastapi.testclient import TestClient
+
+from main import app
+from services import prompts, report_service
+from services.config import DATA_DIR
+from services.llm_schemas import WeeklyReport
+from services.openai_service import get_llm_backend
+from services.storage import write_json
+
+
+def _emails() -> list:
+    return [{
+        "id": f"m{day}",
+        "from": "pm@gc.com",
+        "to": "steel@vendor.com",
+        "subject": f"Hospital Expansion - steel delivery update {day}",
+        "date": f"Tue, {day:02d} Oct 2025 09:00:00 +0000",
+        "body": "Steel for level 3 ships Friday."
+    } for day in (7, 8, 9)]
+
+
+def test_report_without_a_confidence_score(monkeypatch):
+    write_json(DATA_DIR / "emails_cleaned.json", _emails())
+    # The model leaves confidence_score out of ai_summary_metadata
+    monkeypatch.setitem(
+        get_llm_backend()._responders, prompts.WEEKLY_REPORT_TEMPLATE.static_prefix,
+        lambda user: WeeklyReport(project_name="Hospital Expansion", ai_summary_metadata={"key_tags": ["steel"]})
+    )
+    request = {"project_name": "Hospital Expansion", "start_date": "2025-10-06", "end_date": "2025-10-12"}
+
+    client = TestClient(app)
+    first = client.post("/api/reports/weekly", json=request)
+    # The second request is served from the stored report
+    second = client.post("/api/reports/weekly", json=request)
+
+    assert first.status_code == 200, first.text
+    assert first.json()["ai_confidence"] == 0
+    assert "**AI Confidence:** 0.00" in first.json()["report_summary"]
+    assert second.status_code == 200 and second.json()["cached"] is True
+
+
+def test_day_summary_cache_keeps_latest_per_day():
+    emails = _emails()[:1]
+    report_service.summarize_day("Hospital Expansion", "2025-10-07", emails)
+    edited = [dict(emails[0], body="Steel for level 3 now ships Monday.")]
+    report_service.summarize_day("Hospital Expansion", "2025-10-07", edited)
+    report_service.summarize_day("Hospital Expansion", "2025-10-08", _emails()[1:2])
+
+    cache_dir = report_service.DAILY_CACHE_DIR / report_service.safe_name("Hospital Expansion")
+    assert [f.name for f in cache_dir.glob("2025-10-07_*.json")] == [
+        report_service._day_cache_file("Hospital Expansion", "2025-10-07", edited).name
+    ]
+    assert len(list(cache_dir.glob("2025-10-08_*.json"))) == 1
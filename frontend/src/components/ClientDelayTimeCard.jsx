@@ -1,17 +1,6 @@
 import { FaExclamationTriangle, FaCalendarAlt } from 'react-icons/fa';
 
-function ClientDelayTimeCard({ data = [] }) {
-  // Calculate average delay time from KPI data
-  const delays = data
-    .map(item => item.kpis?.avg_gap_days || item.kpis?.last_gap_days || 0)
-    .filter(d => d > 0);
-  
-  const avgDelay = delays.length > 0 
-    ? (delays.reduce((a, b) => a + b, 0) / delays.length).toFixed(1)
-    : 0;
-  
-  const highRiskItems = data.filter(item => item.risk_level === 'HIGH').length;
-
+function ClientDelayTimeCard({ avgDelay = 0, highRiskItems = 0 }) {
   return (
     <div className="bg-white rounded-xl border border-gray-200 shadow-sm p-6">
       <h3 className="text-sm font-semibold text-gray-700 mb-4">Client Delay Time</h3>
@@ -1,8 +1,6 @@
 import { FaEnvelope, FaClock } from 'react-icons/fa';
 
-function EmailFollowupsCard({ data = [] }) {
-  const totalFollowups = data.reduce((sum, item) => sum + (item.counts?.follow_up_count || 0), 0);
-  const totalUnanswered = data.reduce((sum, item) => sum + (item.counts?.unanswered_emails || 0), 0);
+function EmailFollowupsCard({ totalFollowups = 0, totalUnanswered = 0 }) {
 
   return (
     <div className="bg-white rounded-xl border border-gray-200 shadow-sm p-6">
@@ -7,7 +7,7 @@ import ClientDelayTimeCard from '../components/ClientDelayTimeCard.jsx';
 
 function Dashboard() {
   const [project, setProject] = useState('');
-  const [nonResponsiveData, setNonResponsiveData] = useState([]);
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(false);
 
   useEffect(() => {
@@ -15,14 +15,14 @@ function Dashboard() {
       setLoading(true);
       try {
         const url = project
-          ? `http://localhost:5000/api/non-responsive-subcontractors?project=${encodeURIComponent(project)}`
-          : 'http://localhost:5000/api/non-responsive-subcontractors';
+          ? `http://localhost:5000/api/dashboard/summary?project=${encodeURIComponent(project)}`
+          : 'http://localhost:5000/api/dashboard/summary';
         const res = await fetch(url);
         const data = await res.json();
-        setNonResponsiveData(data || []);
+        setSummary(data || null);
       } catch (e) {
-        console.error('Failed to load non-responsive data:', e);
-        setNonResponsiveData([]);
+        console.error('Failed to load dashboard summary:', e);
+        setSummary(null);
       } finally {
         setLoading(false);
       }
@@ -30,12 +30,10 @@ function Dashboard() {
     loadData();
   }, [project]);
 
-  // Calculate project status from non-responsive data
-  const projectStatus = {
-    onTrack: project && nonResponsiveData.length === 0 ? 1 : 0,
-    atRisk: nonResponsiveData.filter(item => item.risk_level === 'MEDIUM').length,
-    delayed: nonResponsiveData.filter(item => item.risk_level === 'HIGH').length
-  };
+  // Counts are precomputed by /api/dashboard/summary
+  const projectStatus = summary?.project_status || {};
+  const responsiveness = summary?.responsiveness || {};
+  const awaitingReply = responsiveness.awaiting_reply || 0;
 
   return (
     <div className="min-h-screen bg-gray-50">
@@ -59,10 +57,16 @@ function Dashboard() {
                   <ProjectStatusPie data={projectStatus} />
                 </div>
                 <div className="md:col-span-1">
-                  <EmailFollowupsCard data={nonResponsiveData} />
+                  <EmailFollowupsCard
+                    totalFollowups={responsiveness.follow_up_count || 0}
+                    totalUnanswered={responsiveness.unanswered_emails || 0}
+                  />
                 </div>
                 <div className="md:col-span-1">
-                  <ClientDelayTimeCard data={nonResponsiveData} />
+                  <ClientDelayTimeCard
+                    avgDelay={responsiveness.avg_gap_days || 0}
+                    highRiskItems={responsiveness.by_risk?.HIGH || 0}
+                  />
                 </div>
               </div>
 
@@ -73,7 +77,7 @@ function Dashboard() {
                 </div>
               )}
 
-              {!loading && nonResponsiveData.length === 0 && (
+              {!loading && awaitingReply === 0 && (
                 <div className="mt-4 p-6 bg-gray-50 rounded-xl border border-dashed border-gray-300 text-center">
                   <p className="text-sm text-gray-500">No non-responsive subcontractors found.</p>
                 </div>